@@ -107,12 +107,18 @@ DJANGO_MIDDLEWARE = [
 ]
 
 ITOU_MIDDLEWARE = [
+    # Before other middlewares using `request.user`, to also profile its queries.
+    "itou.utils.profiling.middleware.QueryProfilingMiddleware",
     "itou.utils.new_dns.middleware.NewDnsRedirectMiddleware",
     "itou.utils.perms.middleware.ItouCurrentOrganizationMiddleware",
 ]
 
 MIDDLEWARE = DJANGO_MIDDLEWARE + ITOU_MIDDLEWARE
 
+# Log the SQL queries of each request and send a `Server-Timing` header.
+# See `itou.utils.profiling.middleware.QueryProfilingMiddleware`.
+ITOU_QUERY_PROFILING = os.environ.get("ITOU_QUERY_PROFILING") == "True"
+
 # URLs.
 # ------------------------------------------------------------------------------
 
@@ -161,12 +167,20 @@ FORM_RENDERER = "django.forms.renderers.TemplatesSetting"
 DATABASES = {
     "default": {
         "ATOMIC_REQUESTS": False,  # We handle transactions manually in the code.
-        "ENGINE": "django.contrib.gis.db.backends.postgis",
+        # PostGIS with health checks of persistent connections and connection metrics.
+        "ENGINE": "itou.utils.db.postgis",
         "HOST": os.environ.get("POSTGRES_HOST", "127.0.0.1"),
         "PORT": os.environ.get("POSTGRES_PORT", "5432"),
         "NAME": os.environ.get("ITOU_POSTGRES_DATABASE_NAME", "itou"),
         "USER": os.environ.get("ITOU_POSTGRES_USER", "itou"),
         "PASSWORD": os.environ.get("ITOU_POSTGRES_PASSWORD", "mdp"),
+        # Keep connections open between requests (and Huey tasks), instead of opening one each time.
+        # There is one connection per web or Huey worker (thread or process): the number of connections
+        # is bounded by the number of workers, keep it under the server's `max_connections`.
+        # https://docs.djangoproject.com/en/3.2/ref/databases/#persistent-connections
+        "CONN_MAX_AGE": int(os.environ.get("ITOU_POSTGRES_CONN_MAX_AGE", 600)),
+        # Check persistent connections before reusing them, see `itou.utils.db.postgis`.
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -322,6 +336,11 @@ API_ENTREPRISE_BASE_URL = "https://entreprise.api.gouv.fr/v2"
 API_ENTREPRISE_CONTEXT = "emplois.inclusion.beta.gouv.fr"
 API_ENTREPRISE_RECIPIENT = os.environ.get("API_ENTREPRISE_RECIPIENT")
 API_ENTREPRISE_TOKEN = os.environ.get("API_ENTREPRISE_TOKEN")
+# Maximum number of calls per minute and per process (see `itou.utils.apis.api_entreprise`):
+# keep it under the quota of API Entreprise divided by the number of web processes.
+API_ENTREPRISE_RATE_LIMIT = int(os.environ.get("API_ENTREPRISE_RATE_LIMIT", 60))
+# Number of calls that can be made at once before the rate limit applies.
+API_ENTREPRISE_RATE_LIMIT_BURST = 10
 
 # Pôle emploi's Emploi Store Dev aka ESD.
 # https://www.emploi-store-dev.fr/portail-developpeur/catalogueapi
@@ -352,6 +371,28 @@ SOCIALACCOUNT_ADAPTER = "itou.allauth_adapters.peamu.adapter.PEAMUSocialAccountA
 PDFSHIFT_API_KEY = os.environ.get("PDFSHIFT_API_KEY")
 PDFSHIFT_SANDBOX_MODE = os.environ.get("DJANGO_DEBUG")
 
+# PDF documents are rendered once, by a Huey task of the "exports" queue, and stored (see `itou.utils.pdf`).
+PDF_RENDERER = "itou.utils.pdf.PdfShiftRenderer"
+# The storage must be shared by web and worker instances: a local directory in development,
+# an S3 bucket of the Cellar add-on in deployed environments (see `PDF_S3_STORAGE_OPTIONS`).
+PDF_STORAGE_CLASS = "django.core.files.storage.FileSystemStorage"
+PDF_STORAGE_OPTIONS = {"location": os.environ.get("PDF_STORAGE_DIR", f"{ROOT_DIR}/pdfs")}
+PDF_S3_STORAGE_OPTIONS = {
+    "bucket_name": os.environ.get("PDF_STORAGE_BUCKET"),
+    "endpoint_url": f"https://{os.environ.get('CELLAR_ADDON_HOST')}",
+    "access_key": os.environ.get("CELLAR_ADDON_KEY_ID"),
+    "secret_key": os.environ.get("CELLAR_ADDON_KEY_SECRET"),
+    # Documents contain personal data.
+    "default_acl": "private",
+    "file_overwrite": True,
+}
+# Documents contain personal data: they're deleted after this number of days
+# by the `delete_old_pdfs` command (and rendered again if needed).
+PDF_RETENTION_DAYS = 30
+# Maximum duration (in seconds) of a rendering, time spent in the queue included.
+# Meanwhile, requests for the document get a page which reloads itself.
+PDF_RENDERING_TIMEOUT = 120
+
 # Typeform
 # ------------------------------------------------------------------------------
 
@@ -460,7 +501,8 @@ ADVANCED_STATS_DASHBOARD_ID = 43
 DIRECCTE_STATS_DASHBOARD_ID = 36
 
 # Huey / async
-# Workers are run in prod via `CC_WORKER_COMMAND = django-admin run_huey`.
+# Workers are run in prod via `CC_WORKER_COMMAND = django-admin run_huey_workers`,
+# which consumes the default queue and all the named queues of `HUEY_QUEUES`.
 # ------------------------------------------------------------------------------
 
 # Redis server URL:
@@ -476,6 +518,8 @@ REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
 # Parameter `immediate` means `synchronous` (async here)
 HUEY = {
     "name": "ITOU",
+    # Records metrics of tasks, see `itou.utils.queues`.
+    "huey_class": "itou.utils.queues.ItouHuey",
     "url": REDIS_URL + f"/?db={REDIS_DB}",
     "consumer": {
         "workers": 2,
@@ -484,6 +528,41 @@ HUEY = {
     "immediate": False,
 }
 
+# Named Huey queues, with their own consumer options.
+# Their consumers are started by `django-admin run_huey_workers`, or one by one
+# with `django-admin run_huey_queue <name>`.
+# Other options (storage, `immediate`…) are the ones of `HUEY`.
+HUEY_QUEUES = {
+    # Email delivery (with up to 24 hours of retries).
+    "emails": {"workers": 2, "worker_type": "thread"},
+    # Calls to external APIs (PE Connect…).
+    "external_data": {"workers": 4, "worker_type": "thread"},
+    # CPU-bound tasks (exports…).
+    "exports": {"workers": 2, "worker_type": "process"},
+}
+
+# Cache.
+# https://github.com/jazzband/django-redis
+# ------------------------------------------------------------------------------
+
+# Shared by all web and Huey workers, see also `itou.utils.cache`.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        # Same Redis database as Huey, whose keys don't have this prefix.
+        "LOCATION": REDIS_URL + f"/?db={REDIS_DB}",
+        "KEY_PREFIX": "cache",
+        "OPTIONS": {
+            # The cache is not a source of truth: if Redis is unavailable, keys are considered missing.
+            "IGNORE_EXCEPTIONS": True,
+        },
+    }
+}
+
+# Keep referentials (administrative criteria, ASP communes…) in the memory of workers.
+# See `itou.utils.referentials`.
+ITOU_REFERENTIALS_CACHE = True
+
 # Email.
 # https://anymail.readthedocs.io/en/stable/esps/mailjet/
 # ------------------------------------------------------------------------------
@@ -5,7 +5,8 @@ ALLOWED_HOSTS = ["127.0.0.1", ".cleverapps.io", "demo.inclusion.beta.gouv.fr", "
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.contrib.gis.db.backends.postgis",
+        # Engine and persistent connections options.
+        **DATABASES["default"],
         "HOST": os.environ.get("POSTGRESQL_ADDON_HOST"),
         "PORT": os.environ.get("POSTGRESQL_ADDON_PORT"),
         "NAME": os.environ.get("DEMO_APP_DB_NAME"),
@@ -20,6 +21,10 @@ ITOU_FQDN = "demo.emplois.inclusion.beta.gouv.fr"
 ITOU_EMAIL_CONTACT = "contact+demo@inclusion.beta.gouv.fr"
 DEFAULT_FROM_EMAIL = "noreply+demo@inclusion.beta.gouv.fr"
 
+# PDF documents are rendered by workers and served by web instances.
+PDF_STORAGE_CLASS = "storages.backends.s3boto3.S3Boto3Storage"
+PDF_STORAGE_OPTIONS = PDF_S3_STORAGE_OPTIONS
+
 sentry_init(dsn=os.environ["SENTRY_DSN_DEMO"])
 
 ASP_ITOU_PREFIX = "XXXXX"
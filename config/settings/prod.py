@@ -11,7 +11,8 @@ ALLOWED_HOSTS = [
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.contrib.gis.db.backends.postgis",
+        # Engine and persistent connections options.
+        **DATABASES["default"],
         "HOST": os.environ.get("POSTGRESQL_ADDON_DIRECT_HOST"),
         "PORT": os.environ.get("POSTGRESQL_ADDON_DIRECT_PORT"),
         "NAME": os.environ.get("POSTGRESQL_ADDON_DB"),
@@ -26,6 +27,10 @@ ITOU_FQDN = "emplois.inclusion.beta.gouv.fr"
 ITOU_EMAIL_CONTACT = "contact@inclusion.beta.gouv.fr"
 DEFAULT_FROM_EMAIL = "noreply@inclusion.beta.gouv.fr"
 
+# PDF documents are rendered by workers and served by web instances.
+PDF_STORAGE_CLASS = "storages.backends.s3boto3.S3Boto3Storage"
+PDF_STORAGE_OPTIONS = PDF_S3_STORAGE_OPTIONS
+
 sentry_init(dsn=os.environ["SENTRY_DSN_PROD"])
 
 ALLOW_POPULATING_METABASE = True
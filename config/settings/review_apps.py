@@ -5,7 +5,8 @@ ALLOWED_HOSTS = ["127.0.0.1", ".cleverapps.io"]
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.contrib.gis.db.backends.postgis",
+        # Engine and persistent connections options.
+        **DATABASES["default"],
         "HOST": os.environ.get("POSTGRESQL_ADDON_HOST"),
         "PORT": os.environ.get("POSTGRESQL_ADDON_PORT"),
         "NAME": os.environ.get("REVIEW_APP_DB_NAME"),
@@ -23,6 +24,11 @@ DEFAULT_FROM_EMAIL = "noreply+staging@inclusion.beta.gouv.fr"
 # Use a sync email backend.
 EMAIL_BACKEND = "anymail.backends.mailjet.EmailBackend"
 
+# PDF documents are rendered by workers and served by web instances.
+# Review apps share a bucket: one folder per review app.
+PDF_STORAGE_CLASS = "storages.backends.s3boto3.S3Boto3Storage"
+PDF_STORAGE_OPTIONS = {**PDF_S3_STORAGE_OPTIONS, "location": os.environ.get("REVIEW_APP_DB_NAME", "")}
+
 sentry_init(dsn=os.environ["SENTRY_DSN_STAGING"])
 
 SHOW_TEST_ACCOUNTS_BANNER = True
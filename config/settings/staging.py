@@ -5,7 +5,8 @@ ALLOWED_HOSTS = ["127.0.0.1", "staging.inclusion.beta.gouv.fr", "staging.emplois
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.contrib.gis.db.backends.postgis",
+        # Engine and persistent connections options.
+        **DATABASES["default"],
         "HOST": os.environ.get("POSTGRESQL_ADDON_DIRECT_HOST"),
         "PORT": os.environ.get("POSTGRESQL_ADDON_DIRECT_PORT"),
         "NAME": os.environ.get("POSTGRESQL_ADDON_DB"),
@@ -20,6 +21,10 @@ ITOU_FQDN = "staging.emplois.inclusion.beta.gouv.fr"
 ITOU_EMAIL_CONTACT = "contact+staging@inclusion.beta.gouv.fr"
 DEFAULT_FROM_EMAIL = "noreply+staging@inclusion.beta.gouv.fr"
 
+# PDF documents are rendered by workers and served by web instances.
+PDF_STORAGE_CLASS = "storages.backends.s3boto3.S3Boto3Storage"
+PDF_STORAGE_OPTIONS = PDF_S3_STORAGE_OPTIONS
+
 sentry_init(dsn=os.environ["SENTRY_DSN_STAGING"])
 
 ASP_ITOU_PREFIX = "YYYYY"
@@ -1,4 +1,5 @@
 import logging
+import tempfile
 
 from .base import *
 
@@ -20,3 +21,16 @@ ITOU_PROTOCOL = "http"
 ITOU_FQDN = "testserver"
 
 ASP_FS_KNOWN_HOSTS = None
+
+# Run Huey tasks synchronously, with an in-memory storage.
+HUEY = {**HUEY, "immediate": True}
+
+# In-memory cache, cleared by tests needing it.
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Rows created by tests are rolled back without sending signals: referentials would be stale.
+ITOU_REFERENTIALS_CACHE = False
+
+# Render PDF documents locally, in a temporary directory.
+PDF_RENDERER = "itou.utils.pdf.LocalRenderer"
+PDF_STORAGE_OPTIONS = {"location": tempfile.mkdtemp(prefix="itou-pdfs-")}
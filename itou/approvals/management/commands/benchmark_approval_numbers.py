@@ -0,0 +1,92 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from itou.approvals.models import Approval
+
+
+class Command(BaseCommand):
+    """
+    Measure the throughput of PASS IAE number allocation under concurrency.
+
+    Each allocation runs in its own transaction which is kept open for
+    `--hold-ms` milliseconds to simulate the rest of `JobApplication.accept()`
+    (emails, approval save, job application save…).
+
+    Two strategies can be compared:
+    - `sequence`: `Approval.get_next_number()` (PostgreSQL sequence)
+    - `lock`: the former `select_for_update()` on the last PASS IAE, which
+      serialises concurrent transactions until they commit
+
+    Numbers taken from the sequence are consumed: never run this in production.
+
+    To run the benchmark:
+        django-admin benchmark_approval_numbers --workers=8 --count=200
+        django-admin benchmark_approval_numbers --workers=8 --count=200 --strategy=lock
+    """
+
+    help = "Measure the throughput of concurrent PASS IAE number allocation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", dest="workers", type=int, default=8, help="Number of concurrent threads")
+        parser.add_argument("--count", dest="count", type=int, default=200, help="Total number of allocations")
+        parser.add_argument(
+            "--hold-ms", dest="hold_ms", type=int, default=50, help="Time spent in each transaction after allocation"
+        )
+        parser.add_argument("--strategy", dest="strategy", choices=["sequence", "lock"], default="sequence")
+
+    @staticmethod
+    def allocate_with_sequence():
+        return Approval.get_next_number()
+
+    @staticmethod
+    def allocate_with_lock():
+        last_itou_approval = (
+            Approval.objects.select_for_update()
+            .filter(number__startswith=Approval.ASP_ITOU_PREFIX)
+            .order_by("number")
+            .last()
+        )
+        return last_itou_approval.number if last_itou_approval else None
+
+    def handle(self, workers, count, hold_ms, strategy, **options):
+
+        if settings.ITOU_ENVIRONMENT == "PROD":
+            raise CommandError("This benchmark consumes PASS IAE numbers and must not be run in production.")
+        if workers < 1 or count < 1:
+            raise CommandError("`--workers` and `--count` must be positive.")
+
+        allocate = self.allocate_with_sequence if strategy == "sequence" else self.allocate_with_lock
+        latencies = []
+        latencies_lock = threading.Lock()
+
+        def run(n):
+            try:
+                for _ in range(n):
+                    start = time.perf_counter()
+                    with transaction.atomic():
+                        allocate()
+                        time.sleep(hold_ms / 1000)
+                    with latencies_lock:
+                        latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        per_worker = [count // workers + (1 if i < count % workers else 0) for i in range(workers)]
+
+        self.stdout.write(f"Allocating {count} numbers with {workers} workers (strategy: {strategy})…")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run, per_worker))
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        self.stdout.write(f"Total time: {elapsed:.2f}s")
+        self.stdout.write(f"Throughput: {len(latencies) / elapsed:.1f} allocations/s")
+        self.stdout.write(f"Median transaction time: {statistics.median(latencies) * 1000:.1f}ms")
+        self.stdout.write(f"95th percentile: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms")
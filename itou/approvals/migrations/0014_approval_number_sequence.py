@@ -0,0 +1,39 @@
+import re
+
+from django.conf import settings
+from django.db import migrations
+
+
+SEQUENCE_NAME = "approvals_approval_itou_number_seq"
+
+
+def seed_sequence(apps, schema_editor):
+    """
+    Start the sequence after the greatest PASS IAE number issued so far.
+    """
+    Approval = apps.get_model("approvals", "Approval")
+    prefix = settings.ASP_ITOU_PREFIX
+    last_number = (
+        Approval.objects.filter(number__regex=rf"^{re.escape(prefix)}[0-9]{{7}}$")
+        .order_by("-number")
+        .values_list("number", flat=True)
+        .first()
+    )
+    with schema_editor.connection.cursor() as cursor:
+        if last_number:
+            cursor.execute("SELECT setval(%s, %s, true)", [SEQUENCE_NAME, int(last_number[len(prefix) :])])
+        else:
+            cursor.execute("SELECT setval(%s, 1, false)", [SEQUENCE_NAME])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("approvals", "0013_prolongation_create_trigger")]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f"CREATE SEQUENCE {SEQUENCE_NAME} MINVALUE 1 MAXVALUE 9999999 NO CYCLE;",
+            reverse_sql=f"DROP SEQUENCE IF EXISTS {SEQUENCE_NAME};",
+        ),
+        migrations.RunPython(seed_sequence, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,6 @@
 import datetime
 import logging
-import time
+import re
 
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
@@ -8,7 +8,7 @@ from django.contrib.postgres.constraints import ExclusionConstraint
 from django.contrib.postgres.fields import RangeBoundary, RangeOperators
 from django.core.exceptions import ValidationError
 from django.core.validators import MinLengthValidator
-from django.db import models
+from django.db import DataError, connection, models, transaction
 from django.db.models import Count, Q
 from django.db.models.functions import TruncDate
 from django.utils import timezone
@@ -130,6 +130,10 @@ class Approval(CommonApprovalMixin):
     # This prefix is used by the ASP system to identify itou as the issuer of a number.
     ASP_ITOU_PREFIX = settings.ASP_ITOU_PREFIX
 
+    # PostgreSQL sequence providing the 7 last digits of PASS IAE numbers, see `get_next_number`.
+    NUMBER_SEQUENCE_NAME = "approvals_approval_itou_number_seq"
+    NUMBER_MAX_VALUE = 9999999
+
     # The period of time during which it is possible to prolong a PASS IAE before it ends.
     PROLONGATION_PERIOD_BEFORE_APPROVAL_END_MONTHS = 3
 
@@ -175,7 +179,6 @@ class Approval(CommonApprovalMixin):
         already_exists = bool(self.pk)
 
         if not self.number:
-            # `get_next_number` will lock rows until the end of the transaction.
             self.number = self.get_next_number()
 
         if not already_exists:
@@ -302,23 +305,41 @@ class Approval(CommonApprovalMixin):
             - YEAR WITHOUT CENTURY is equal to the start year of the `JobApplication.hiring_start_at`
             - A max of 99999 approvals could be issued by year
             - We would have gone beyond, we would never have thought we could go that far
+
+        NUMBER is taken from a dedicated PostgreSQL sequence (bounded by `NUMBER_MAX_VALUE`)
+        instead of locking and sorting all existing PASS IAE: concurrent hirings don't wait
+        for each other anymore. A number consumed by a rolled back transaction is lost,
+        which may leave gaps in the numbering.
         """
-        last_itou_approval = (
-            Approval.objects
-            # select_for_update() returns a queryset that will lock rows until the end of the transaction.
-            # The lock is active for the duration of the transaction (see settings.ATOMIC_REQUESTS).
-            .select_for_update()
-            .filter(number__startswith=Approval.ASP_ITOU_PREFIX)
-            .order_by("number")
-            .last()
+        try:
+            # A savepoint keeps the current transaction usable if the sequence is exhausted.
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SELECT nextval(%s)", [Approval.NUMBER_SEQUENCE_NAME])
+                next_number = cursor.fetchone()[0]
+        except DataError:
+            raise RuntimeError("The maximum number of PASS IAE has been reached.")
+        return f"{Approval.ASP_ITOU_PREFIX}{next_number:07d}"
+
+    @staticmethod
+    def sync_number_sequence():
+        """
+        Set the numbering sequence to the greatest existing PASS IAE number.
+
+        Only required if PASS IAE numbers have been inserted without `get_next_number()`
+        (e.g. a data import). The sequence is seeded the same way by migration 0014.
+        """
+        last_number = (
+            Approval.objects.filter(number__regex=rf"^{re.escape(Approval.ASP_ITOU_PREFIX)}[0-9]{{7}}$")
+            .order_by("-number")
+            .values_list("number", flat=True)
+            .first()
         )
-        if last_itou_approval:
-            raw_number = last_itou_approval.number.removeprefix(Approval.ASP_ITOU_PREFIX)
-            next_number = int(raw_number) + 1
-            if next_number > 9999999:
-                raise RuntimeError("The maximum number of PASS IAE has been reached.")
-            return f"{Approval.ASP_ITOU_PREFIX}{next_number:07d}"
-        return f"{Approval.ASP_ITOU_PREFIX}0000001"
+        with connection.cursor() as cursor:
+            if last_number:
+                value = int(last_number.removeprefix(Approval.ASP_ITOU_PREFIX))
+                cursor.execute("SELECT setval(%s, %s, true)", [Approval.NUMBER_SEQUENCE_NAME, value])
+            else:
+                cursor.execute("SELECT setval(%s, 1, false)", [Approval.NUMBER_SEQUENCE_NAME])
 
     @staticmethod
     def get_default_end_date(start_at):
@@ -1049,11 +1070,15 @@ class ApprovalsWrapper:
         "habilité : Pôle emploi, Mission Locale, CAP Emploi, etc."
     )
 
-    def __init__(self, user):
+    def __init__(self, user, approvals=None, pe_approvals=None):
+        """
+        `approvals` and `pe_approvals` can be passed to avoid querying the
+        database when they have already been fetched, see `for_users()`.
+        """
 
         self.user = user
         self.latest_approval = None
-        self.merged_approvals = self._merge_approvals()
+        self.merged_approvals = self._merge_approvals(approvals=approvals, pe_approvals=pe_approvals)
 
         if not self.merged_approvals:
             self.status = self.NONE_FOUND
@@ -1072,32 +1097,79 @@ class ApprovalsWrapper:
         self.has_valid = self.status == self.VALID
         self.has_in_waiting_period = self.status == self.IN_WAITING_PERIOD
 
-    def _merge_approvals(self):
+    @classmethod
+    def for_users(cls, users):
+        """
+        Returns a dict `{user.pk: ApprovalsWrapper}` for the given users
+        in two queries, whatever the number of users.
+
+        Wrappers are also stored in the `approvals_wrapper` cached property
+        of job seekers so that subsequent accesses don't hit the database.
+        """
+        users = list(users)
+
+        approvals_by_user = {user.pk: [] for user in users}
+        for approval in Approval.objects.filter(user__in=users).order_by("-start_at"):
+            approvals_by_user[approval.user_id].append(approval)
+
+        # Pôle emploi's approvals are useless when an ongoing PASS IAE exists.
+        pe_keys = {
+            (user.pole_emploi_id, user.birthdate)
+            for user in users
+            if user.pole_emploi_id
+            and user.birthdate
+            and not any(approval.is_valid() for approval in approvals_by_user[user.pk])
+        }
+        pe_approvals_by_key = {key: [] for key in pe_keys}
+        if pe_keys:
+            # Use the (pole_emploi_id, birthdate) index and match exact tuples in Python.
+            pe_approvals = PoleEmploiApproval.objects.filter(
+                pole_emploi_id__in={pole_emploi_id for pole_emploi_id, _ in pe_keys},
+                birthdate__in={birthdate for _, birthdate in pe_keys},
+            ).order_by("-start_at")
+            for pe_approval in pe_approvals:
+                key = (pe_approval.pole_emploi_id, pe_approval.birthdate)
+                if key in pe_approvals_by_key:
+                    pe_approvals_by_key[key].append(pe_approval)
+
+        wrappers = {}
+        for user in users:
+            # Mimic `PoleEmploiApprovalManager.find_for()` for users without a PE id or a birthdate.
+            pe_approvals = pe_approvals_by_key.get((user.pole_emploi_id, user.birthdate), [])
+            wrapper = cls(user, approvals=approvals_by_user[user.pk], pe_approvals=pe_approvals)
+            if user.is_job_seeker:
+                user.__dict__["approvals_wrapper"] = wrapper
+            wrappers[user.pk] = wrapper
+        return wrappers
+
+    def _merge_approvals(self, approvals=None, pe_approvals=None):
         """
         Returns a list of merged unique `Approval` and `PoleEmploiApproval` objects.
         """
-        approvals = list(Approval.objects.filter(user=self.user).order_by("-start_at"))
+        if approvals is None:
+            approvals = list(Approval.objects.filter(user=self.user).order_by("-start_at"))
 
         # If an ongoing PASS IAE exists, consider it's the latest valid approval
         # even if a PoleEmploiApproval is more recent.
         if any(approval.is_valid() for approval in approvals):
             return approvals
 
+        if pe_approvals is None:
+            pe_approvals = PoleEmploiApproval.objects.find_for(self.user)
+
         approvals_numbers = [approval.number for approval in approvals]
         pe_approvals = [
             pe_approval
-            for pe_approval in list(PoleEmploiApproval.objects.find_for(self.user))
+            for pe_approval in list(pe_approvals)
             # A `PoleEmploiApproval` could already have been copied in `Approval`.
             if pe_approval not in approvals_numbers
         ]
         merged_approvals = approvals + pe_approvals
         # Sort by the most distant `end_at`, then by the earliest `start_at`.
         # This allows to always choose the longest and most recent approval.
-        # Dates are converted to timestamp so that the subtraction operator
+        # Dates are converted to ordinals so that the subtraction operator
         # can be used in the lambda.
-        return sorted(
-            merged_approvals, key=lambda x: (-time.mktime(x.end_at.timetuple()), time.mktime(x.start_at.timetuple()))
-        )
+        return sorted(merged_approvals, key=lambda x: (-x.end_at.toordinal(), x.start_at.toordinal()))
 
     @property
     def has_valid_pole_emploi_eligibility_diagnosis(self):
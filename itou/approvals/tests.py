@@ -1,4 +1,5 @@
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
 from dateutil.relativedelta import relativedelta
@@ -6,9 +7,9 @@ from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, connection, transaction
 from django.template.defaultfilters import title
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.urls import reverse
 from django.utils import timezone
 
@@ -218,13 +219,29 @@ class ApprovalModelTest(TestCase):
 
     def test_get_next_number(self):
 
+        # Numbers come from a sequence.
+        next_number = Approval.get_next_number()
+        self.assertEqual(len(next_number), 12)
+        self.assertTrue(next_number.startswith(Approval.ASP_ITOU_PREFIX))
+        following_number = Approval.get_next_number()
+        self.assertEqual(int(following_number[5:]), int(next_number[5:]) + 1)
+
+        demo_prefix = "XXXXX"
+        with mock.patch.object(Approval, "ASP_ITOU_PREFIX", demo_prefix):
+            next_number = Approval.get_next_number()
+            self.assertTrue(next_number.startswith(demo_prefix))
+
+    def test_sync_number_sequence(self):
+
         # No pre-existing objects.
+        Approval.sync_number_sequence()
         expected_number = f"{Approval.ASP_ITOU_PREFIX}0000001"
         next_number = Approval.get_next_number()
         self.assertEqual(next_number, expected_number)
 
         # With pre-existing objects.
         ApprovalFactory(number=f"{Approval.ASP_ITOU_PREFIX}0000040")
+        Approval.sync_number_sequence()
         expected_number = f"{Approval.ASP_ITOU_PREFIX}0000041"
         next_number = Approval.get_next_number()
         self.assertEqual(next_number, expected_number)
@@ -232,6 +249,7 @@ class ApprovalModelTest(TestCase):
 
         # With pre-existing Pôle emploi approval.
         ApprovalFactory(number="625741810182")
+        Approval.sync_number_sequence()
         expected_number = f"{Approval.ASP_ITOU_PREFIX}0000001"
         next_number = Approval.get_next_number()
         self.assertEqual(next_number, expected_number)
@@ -240,23 +258,19 @@ class ApprovalModelTest(TestCase):
         # With various pre-existing objects.
         ApprovalFactory(number=f"{Approval.ASP_ITOU_PREFIX}8888882")
         ApprovalFactory(number="625741810182")
+        Approval.sync_number_sequence()
         expected_number = f"{Approval.ASP_ITOU_PREFIX}8888883"
         next_number = Approval.get_next_number()
         self.assertEqual(next_number, expected_number)
         Approval.objects.all().delete()
 
-        demo_prefix = "XXXXX"
-        with mock.patch.object(Approval, "ASP_ITOU_PREFIX", demo_prefix):
-            ApprovalFactory(number=f"{demo_prefix}0044440")
-            expected_number = f"{demo_prefix}0044441"
-            next_number = Approval.get_next_number()
-            self.assertEqual(next_number, expected_number)
-            Approval.objects.all().delete()
-
         ApprovalFactory(number=f"{Approval.ASP_ITOU_PREFIX}9999999")
+        Approval.sync_number_sequence()
         with self.assertRaises(RuntimeError):
             next_number = Approval.get_next_number()
         Approval.objects.all().delete()
+        # The transaction is still usable. Reset the sequence for other tests.
+        Approval.sync_number_sequence()
 
     def test_is_valid(self):
 
@@ -474,6 +488,29 @@ class PoleEmploiApprovalManagerTest(TestCase):
         PoleEmploiApproval.objects.all().delete()
 
 
+class ApprovalNumberConcurrencyTest(TransactionTestCase):
+    def test_concurrent_accepts_get_distinct_numbers(self):
+        job_applications = [
+            JobApplicationSentByJobSeekerFactory(state=JobApplicationWorkflow.STATE_PROCESSING) for _ in range(5)
+        ]
+
+        def accept(job_application_pk):
+            try:
+                job_application = JobApplication.objects.select_related("to_siae").get(pk=job_application_pk)
+                with transaction.atomic():
+                    job_application.accept(user=job_application.to_siae.members.first())
+                    job_application.save()
+                return job_application.approval.number
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(job_applications)) as executor:
+            numbers = list(executor.map(accept, [job_application.pk for job_application in job_applications]))
+
+        self.assertEqual(len(set(numbers)), len(job_applications))
+        self.assertTrue(all(number.startswith(Approval.ASP_ITOU_PREFIX) for number in numbers))
+
+
 class ApprovalsWrapperTest(TestCase):
     """
     Test ApprovalsWrapper.
@@ -617,6 +654,40 @@ class ApprovalsWrapperTest(TestCase):
         self.assertFalse(approvals_wrapper.has_in_waiting_period)
         self.assertEqual(approvals_wrapper.latest_approval, approval)
 
+    def test_for_users(self):
+        # Without approval.
+        user_1 = JobSeekerFactory()
+        # With a valid PASS IAE and a more recent Pôle emploi approval.
+        user_2 = JobSeekerFactory()
+        ApprovalFactory(user=user_2, start_at=datetime.date.today() - relativedelta(days=1))
+        PoleEmploiApprovalFactory(pole_emploi_id=user_2.pole_emploi_id, birthdate=user_2.birthdate)
+        # With a valid Pôle emploi approval.
+        user_3 = JobSeekerFactory()
+        PoleEmploiApprovalFactory(pole_emploi_id=user_3.pole_emploi_id, birthdate=user_3.birthdate)
+        # In waiting period.
+        user_4 = JobSeekerFactory()
+        end_at = datetime.date.today() - relativedelta(days=30)
+        ApprovalFactory(user=user_4, start_at=end_at - relativedelta(years=2), end_at=end_at)
+        # Same Pôle emploi ID as user 3 but another birthdate: must not match.
+        user_5 = JobSeekerFactory(
+            pole_emploi_id=user_3.pole_emploi_id, birthdate=user_3.birthdate - relativedelta(days=1)
+        )
+        users = [user_1, user_2, user_3, user_4, user_5]
+
+        with self.assertNumQueries(2):
+            approvals_wrappers = ApprovalsWrapper.for_users(users)
+
+        for user in users:
+            expected = ApprovalsWrapper(user)
+            approvals_wrapper = approvals_wrappers[user.pk]
+            self.assertEqual(approvals_wrapper.status, expected.status)
+            self.assertEqual(approvals_wrapper.latest_approval, expected.latest_approval)
+            self.assertEqual(approvals_wrapper.merged_approvals, expected.merged_approvals)
+
+        # Wrappers are cached on users.
+        with self.assertNumQueries(0):
+            self.assertIs(user_3.approvals_wrapper, approvals_wrappers[user_3.pk])
+
 
 class AutomaticApprovalAdminViewsTest(TestCase):
     """
@@ -0,0 +1,99 @@
+import random
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from itou.asp import resolvers
+from itou.asp.models import Commune, LaneExtension, LaneType, find_lane_type_aliases
+
+
+# Lanes as returned by the geocoding API, including misspelled lane types
+SAMPLE_LANES = [
+    "Avenue de la République",
+    "Allée des Tilleuls",
+    "Bd Voltaire",
+    "r Victor Hugo",
+    "Grande Rue",
+    "Lieu-dit Les Granges",
+    "Quai de la Loire",
+    "Chem des Vignes",
+    "Domaines du Lac",
+    "Rue Mouffetard",
+]
+SAMPLE_EXTENSIONS = ["B", "bis", "t", "Quater", "G"]
+
+
+class Command(BaseCommand):
+    """
+    Compare the per-call cost of ASP referential lookups done when formatting addresses:
+    - `models`: enum class methods, `find_lane_type_aliases()` and `Commune.objects.by_insee_code()`
+    - `resolvers`: lookup tables of `itou.asp.resolvers`
+
+    Commune lookups use INSEE codes of current communes and need ASP fixtures to be loaded.
+
+    To run the benchmark:
+        django-admin benchmark_asp_resolvers
+        django-admin benchmark_asp_resolvers --number=10000 --communes=500
+    """
+
+    help = "Compare the per-call cost of ASP referential lookups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", dest="number", type=int, default=10000, help="Number of lane lookups")
+        parser.add_argument("--communes", dest="communes", type=int, default=200, help="Number of commune lookups")
+
+    @staticmethod
+    def lookup_lanes_with_models(lanes, extensions):
+        for lane in lanes:
+            lane_type = lane.split(maxsplit=1)[0]
+            (
+                LaneType.with_similar_name(lane_type)
+                or LaneType.with_similar_value(lane_type)
+                or find_lane_type_aliases(lane)
+            )
+        for extension in extensions:
+            LaneExtension.with_similar_name_or_value(extension)
+
+    @staticmethod
+    def lookup_lanes_with_resolvers(lanes, extensions):
+        for lane in lanes:
+            lane_type = lane.split(maxsplit=1)[0]
+            (
+                resolvers.lane_type_with_similar_name(lane_type)
+                or resolvers.lane_type_with_similar_value(lane_type)
+                or resolvers.find_lane_type_aliases(lane)
+            )
+        for extension in extensions:
+            resolvers.lane_extension_with_similar_name_or_value(extension)
+
+    def report(self, label, count, models_time, resolvers_time):
+        self.stdout.write(f"{label} ({count} lookups):")
+        self.stdout.write(f"  models: {models_time * 1_000_000 / count:.2f}µs per lookup")
+        self.stdout.write(f"  resolvers: {resolvers_time * 1_000_000 / count:.2f}µs per lookup")
+        self.stdout.write(f"  speedup: x{models_time / resolvers_time:.1f}")
+
+    def handle(self, number, communes, **options):
+        if number < 1 or communes < 0:
+            raise CommandError("`--number` must be positive and `--communes` can't be negative.")
+
+        lanes = random.choices(SAMPLE_LANES, k=number)
+        extensions = random.choices(SAMPLE_EXTENSIONS, k=number)
+
+        models_time = timeit.timeit(lambda: self.lookup_lanes_with_models(lanes, extensions), number=1)
+        resolvers_time = timeit.timeit(lambda: self.lookup_lanes_with_resolvers(lanes, extensions), number=1)
+        self.report("Lane types and extensions", number, models_time, resolvers_time)
+
+        insee_codes = list(Commune.objects.all().current().order_by("?").values_list("code", flat=True)[:communes])
+        if not insee_codes:
+            self.stdout.write("No communes to look up: skipped (load ASP fixtures first).")
+            return
+
+        models_time = timeit.timeit(lambda: [Commune.objects.by_insee_code(code) for code in insee_codes], number=1)
+
+        def lookup_communes_with_resolvers():
+            # Loading the index is part of the cost
+            index = resolvers.CommuneIndex()
+            return [index.by_insee_code(code) for code in insee_codes]
+
+        resolvers_time = timeit.timeit(lookup_communes_with_resolvers, number=1)
+        self.report("Communes", len(insee_codes), models_time, resolvers_time)
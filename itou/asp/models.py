@@ -4,6 +4,8 @@ from django.db import models
 from django.utils.functional import cached_property
 from unidecode import unidecode
 
+from itou.utils.referentials import ReferentialManagerMixin
+
 
 class LaneType(models.TextChoices):
     """
@@ -332,17 +334,27 @@ class PrescriberType(models.TextChoices):
         return kinds.get(prescriber_kind, cls.UNKNOWN)
 
 
-class CommuneManager(models.Manager):
+class CommuneManager(ReferentialManagerMixin, models.Manager):
+
+    referential_indexes = ["code"]
+
     def get_queryset(self):
         return PeriodQuerySet(self.model)
 
+    def get_referential_queryset(self):
+        # As `first()`: the commune with the lowest pk wins for a given code.
+        return self.get_queryset().order_by("pk")
+
     def by_insee_code(self, insee_code):
         """
         Lookup a Commune by INSEE code
 
         May return several results if not used with PeriodQuerySet.current
+        Read from the process-wide referential (see `itou.utils.referentials`).
         """
-        return self.get_queryset().filter(code=insee_code).first()
+        if not self.uses_referential:
+            return self.get_queryset().filter(code=insee_code).first()
+        return self.referential.get("code", insee_code)
 
 
 class Commune(PrettyPrintMixin, AbstractPeriod):
@@ -0,0 +1,81 @@
+"""
+Lookup tables for ASP referential matching.
+
+Matching geocoding API results against ASP reference data is done for every
+address formatted in HEXA format (see `itou.utils.address.format`).
+
+Lane types and lane extensions are enums: their lookup tables and the lane type
+aliases regex are built once, at import time.
+Communes are stored in DB: `CommuneIndex` loads current communes once
+and resolves INSEE codes in memory.
+"""
+import re
+
+from unidecode import unidecode
+
+from itou.asp.models import _LANE_TYPE_ALIASES, Commune, LaneExtension, LaneType
+
+
+_LANE_TYPES_BY_NAME = {lane_type.name: lane_type for lane_type in LaneType}
+
+_LANE_TYPES_BY_VALUE = {unidecode(lane_type.label.lower()): lane_type for lane_type in LaneType}
+
+# A single regex for all aliases: each alias is a capturing group, in the same
+# order as `_LANE_TYPE_ALIASES`. All aliases are anchored at the start of the
+# string, so the first matching alias wins, as with successive `re.search()` calls.
+_LANE_TYPE_ALIASES_RE = re.compile("|".join(f"({alias})" for alias in _LANE_TYPE_ALIASES))
+_LANE_TYPE_ALIASES_GROUPS = list(_LANE_TYPE_ALIASES.values())
+
+_LANE_EXTENSIONS = {
+    **{extension.value.lower(): extension for extension in LaneExtension},
+    **{extension.name.lower(): extension for extension in LaneExtension},
+}
+
+
+def lane_type_with_similar_name(name):
+    "Same as `LaneType.with_similar_name()`"
+    return _LANE_TYPES_BY_NAME.get(name.upper())
+
+
+def lane_type_with_similar_value(value):
+    "Same as `LaneType.with_similar_value()`"
+    return _LANE_TYPES_BY_VALUE.get(value.lower())
+
+
+def find_lane_type_aliases(alias):
+    "Same as `itou.asp.models.find_lane_type_aliases()`"
+    match = _LANE_TYPE_ALIASES_RE.search(alias.lower())
+    if match:
+        return _LANE_TYPE_ALIASES_GROUPS[match.lastindex - 1]
+    return None
+
+
+def lane_extension_with_similar_name_or_value(s):
+    "Same as `LaneExtension.with_similar_name_or_value()`"
+    return _LANE_EXTENSIONS.get(s.lower())
+
+
+class CommuneIndex:
+    """
+    In-memory index of current communes, by INSEE code.
+
+    Communes are loaded with a single query on first lookup, the index is meant
+    to be shared by all the lookups of a batch (e.g. formatting addresses in bulk).
+    It is not refreshed: don't keep it around longer than needed.
+    """
+
+    def __init__(self, queryset=None):
+        self._queryset = Commune.objects.all().current() if queryset is None else queryset
+        self._communes = None
+
+    def __len__(self):
+        return len(self._get_communes())
+
+    def _get_communes(self):
+        if self._communes is None:
+            self._communes = {commune.code: commune for commune in self._queryset}
+        return self._communes
+
+    def by_insee_code(self, insee_code):
+        "Same as `Commune.objects.by_insee_code()`, restricted to current communes"
+        return self._get_communes().get(insee_code)
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from itou.asp.models import Commune
+
+
+@receiver([post_save, post_delete], sender=Commune)
+def invalidate_commune_referential(sender, instance, raw=False, **kwargs):
+    # Fixtures are loaded during deployments, which restart workers.
+    if not raw:
+        Commune.objects.referential.invalidate()
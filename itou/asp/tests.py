@@ -1,7 +1,10 @@
+import datetime
 from unittest import mock
 
 from django.test import TestCase
 
+from itou.asp import resolvers
+from itou.asp.factories import CommuneFactory
 from itou.asp.models import LaneExtension, LaneType, find_lane_type_aliases
 from itou.users.factories import JobSeekerFactory, JobSeekerWithAddressFactory
 from itou.utils.address.format import format_address
@@ -193,3 +196,35 @@ class LaneExtensionTest(TestCase):
         result, _error = format_address(user)
         self.assertEqual(result.get("non_std_extension"), "G")
         self.assertIsNone(result.get("std_extension"))
+
+
+class ResolversTest(TestCase):
+    def test_lane_types(self):
+        """
+        Lookup tables must give the same results as the enum methods
+        """
+        for lane_type in LaneType:
+            for s in [lane_type.name, lane_type.name.lower(), lane_type.label, lane_type.label.upper()]:
+                self.assertEqual(LaneType.with_similar_name(s), resolvers.lane_type_with_similar_name(s))
+                self.assertEqual(LaneType.with_similar_value(s), resolvers.lane_type_with_similar_value(s))
+
+    def test_aliases(self):
+        for alias in ["grand rue", "grande-rue", "grande'rue", "R", "r", "lieu dit", "lieu-dit", "Voies", "XXX"]:
+            self.assertEqual(find_lane_type_aliases(alias), resolvers.find_lane_type_aliases(alias))
+
+    def test_lane_extensions(self):
+        for s in ["B", "b", "bis", "Ter", "t", "QUATER", "C", "G", ""]:
+            self.assertEqual(
+                LaneExtension.with_similar_name_or_value(s), resolvers.lane_extension_with_similar_name_or_value(s)
+            )
+
+    def test_commune_index(self):
+        commune = CommuneFactory()
+        # Not a current commune
+        CommuneFactory(code="12345", end_date=datetime.date(2018, 1, 1))
+
+        index = resolvers.CommuneIndex()
+        with self.assertNumQueries(1):
+            self.assertEqual(commune, index.by_insee_code(commune.code))
+            self.assertIsNone(index.by_insee_code("12345"))
+            self.assertIsNone(index.by_insee_code("99999"))
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class EligibilityConfig(AppConfig):
+    name = "itou.eligibility"
+
+    def ready(self):
+        """
+        When the app is loaded:
+        register receivers invalidating cached eligibility snapshots
+        and the administrative criteria referential.
+        """
+        import itou.eligibility.signals  # noqa F401
@@ -9,6 +9,7 @@ from django.utils import timezone
 
 from itou.approvals.models import Approval
 from itou.utils.perms.user import KIND_PRESCRIBER, KIND_SIAE_STAFF
+from itou.utils.referentials import ReferentialManagerMixin
 
 
 logger = logging.getLogger(__name__)
@@ -243,6 +244,33 @@ class AdministrativeCriteriaQuerySet(models.QuerySet):
         return self.filter(level=AdministrativeCriteria.Level.LEVEL_2)
 
 
+class AdministrativeCriteriaManager(
+    ReferentialManagerMixin, models.Manager.from_queryset(AdministrativeCriteriaQuerySet)
+):
+    """
+    Criteria of `level1()` and `level2()` are read from the process-wide referential
+    (see `itou.utils.referentials`), as those of `all_from_referential()`.
+    """
+
+    referential_groups = ["level"]
+
+    def level1(self):
+        queryset = super().level1()
+        if not self.uses_referential:
+            return queryset
+        return self.with_referential_rows(
+            queryset, self.referential.filter("level", AdministrativeCriteria.Level.LEVEL_1)
+        )
+
+    def level2(self):
+        queryset = super().level2()
+        if not self.uses_referential:
+            return queryset
+        return self.with_referential_rows(
+            queryset, self.referential.filter("level", AdministrativeCriteria.Level.LEVEL_2)
+        )
+
+
 class AdministrativeCriteria(models.Model):
     """
     List of administrative criteria.
@@ -273,7 +301,7 @@ class AdministrativeCriteria(models.Model):
         settings.AUTH_USER_MODEL, verbose_name="Créé par", null=True, blank=True, on_delete=models.SET_NULL
     )
 
-    objects = models.Manager.from_queryset(AdministrativeCriteriaQuerySet)()
+    objects = AdministrativeCriteriaManager()
 
     class Meta:
         verbose_name = "Critère administratif"
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from itou.approvals.models import Approval, Prolongation, Suspension
+from itou.eligibility.models import AdministrativeCriteria, EligibilityDiagnosis
+from itou.eligibility.snapshot import JobSeekerEligibilitySnapshot
+from itou.users.models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_eligibility_snapshot_for_user(sender, instance, **kwargs):
+    # `birthdate` and `pole_emploi_id` are used to find Pôle emploi approvals.
+    if instance.is_job_seeker:
+        JobSeekerEligibilitySnapshot.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Approval)
+def invalidate_eligibility_snapshot_for_approval(sender, instance, **kwargs):
+    JobSeekerEligibilitySnapshot.invalidate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Suspension)
+@receiver([post_save, post_delete], sender=Prolongation)
+def invalidate_eligibility_snapshot_for_approval_period(sender, instance, **kwargs):
+    JobSeekerEligibilitySnapshot.invalidate(instance.approval.user_id)
+
+
+@receiver([post_save, post_delete], sender=EligibilityDiagnosis)
+def invalidate_eligibility_snapshot_for_diagnosis(sender, instance, **kwargs):
+    JobSeekerEligibilitySnapshot.invalidate(instance.job_seeker_id)
+
+
+@receiver([post_save, post_delete], sender=AdministrativeCriteria)
+def invalidate_administrative_criteria_referential(sender, instance, raw=False, **kwargs):
+    # Fixtures are loaded during deployments, which restart workers.
+    if not raw:
+        AdministrativeCriteria.objects.referential.invalidate()
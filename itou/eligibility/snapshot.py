@@ -0,0 +1,54 @@
+"""
+Approvals and eligibility status of a job seeker, computed once and shared
+between the successive steps (i.e. HTTP requests) of the job application
+submit process.
+
+Snapshots are stored in the cache for a short time and invalidated
+(see `itou.eligibility.signals`) whenever one of the objects they
+are computed from is written.
+"""
+from django.core.cache import cache
+
+from itou.approvals.models import ApprovalsWrapper
+from itou.eligibility.models import EligibilityDiagnosis
+
+
+class JobSeekerEligibilitySnapshot:
+
+    # Short enough to limit the impact of writes that don't send signals (e.g. `QuerySet.update()`).
+    CACHE_TIMEOUT = 5 * 60  # in seconds.
+
+    def __init__(self, job_seeker):
+        self.job_seeker_pk = job_seeker.pk
+        self.approvals_wrapper = ApprovalsWrapper(job_seeker)
+        if self.approvals_wrapper.latest_approval and self.approvals_wrapper.latest_approval.is_pass_iae:
+            # Evaluate the `is_suspended` cached property so that it's part of the snapshot.
+            self.approvals_wrapper.latest_approval.is_suspended
+        # `EligibilityDiagnosis.objects.has_considered_valid()` reuses the wrapper computed above.
+        job_seeker.__dict__["approvals_wrapper"] = self.approvals_wrapper
+        self.has_considered_valid_diagnosis = EligibilityDiagnosis.objects.has_considered_valid(job_seeker)
+
+    @staticmethod
+    def get_cache_key(job_seeker_pk):
+        return f"eligibility_snapshot:{job_seeker_pk}"
+
+    @classmethod
+    def get(cls, job_seeker):
+        """
+        Returns the snapshot of the given job seeker, computing it only if it's
+        neither memoised on the instance (same request) nor cached (previous steps).
+        """
+        snapshot = job_seeker.__dict__.get("_eligibility_snapshot")
+        if snapshot is None:
+            cache_key = cls.get_cache_key(job_seeker.pk)
+            snapshot = cache.get(cache_key)
+            if snapshot is None:
+                snapshot = cls(job_seeker)
+                cache.set(cache_key, snapshot, cls.CACHE_TIMEOUT)
+            job_seeker.__dict__["_eligibility_snapshot"] = snapshot
+            job_seeker.__dict__["approvals_wrapper"] = snapshot.approvals_wrapper
+        return snapshot
+
+    @classmethod
+    def invalidate(cls, job_seeker_pk):
+        cache.delete(cls.get_cache_key(job_seeker_pk))
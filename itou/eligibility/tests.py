@@ -1,6 +1,7 @@
 import datetime
 
 from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
 from django.test import TestCase
 
 from itou.approvals.factories import ApprovalFactory, PoleEmploiApprovalFactory
@@ -10,9 +11,11 @@ from itou.eligibility.factories import (
     ExpiredEligibilityDiagnosisFactory,
 )
 from itou.eligibility.models import AdministrativeCriteria, EligibilityDiagnosis
+from itou.eligibility.snapshot import JobSeekerEligibilitySnapshot
 from itou.prescribers.factories import AuthorizedPrescriberOrganizationWithMembershipFactory
 from itou.siaes.factories import SiaeWithMembershipFactory
 from itou.users.factories import JobSeekerFactory
+from itou.users.models import User
 from itou.utils.perms.user import KIND_PRESCRIBER, KIND_SIAE_STAFF, UserInfo
 
 
@@ -254,3 +257,44 @@ class AdministrativeCriteriaModelTest(TestCase):
         qs = AdministrativeCriteria.objects.level2()
         self.assertIn(level2_criterion, qs)
         self.assertNotIn(level1_criterion, qs)
+
+
+class JobSeekerEligibilitySnapshotTest(TestCase):
+    """
+    Test JobSeekerEligibilitySnapshot.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_is_cached_between_requests(self):
+        job_seeker = JobSeekerFactory()
+        EligibilityDiagnosisFactory(job_seeker=job_seeker)
+
+        snapshot = JobSeekerEligibilitySnapshot.get(job_seeker)
+        self.assertTrue(snapshot.has_considered_valid_diagnosis)
+        self.assertFalse(snapshot.approvals_wrapper.has_valid)
+
+        # A fresh instance, as in the next step of the submit process.
+        job_seeker = User.objects.get(pk=job_seeker.pk)
+        with self.assertNumQueries(0):
+            snapshot = JobSeekerEligibilitySnapshot.get(job_seeker)
+            self.assertTrue(snapshot.has_considered_valid_diagnosis)
+            self.assertIs(job_seeker.approvals_wrapper, snapshot.approvals_wrapper)
+
+    def test_snapshot_is_invalidated_on_writes(self):
+        job_seeker = JobSeekerFactory()
+        snapshot = JobSeekerEligibilitySnapshot.get(job_seeker)
+        self.assertFalse(snapshot.has_considered_valid_diagnosis)
+
+        diagnosis = EligibilityDiagnosisFactory(job_seeker=job_seeker)
+        job_seeker = User.objects.get(pk=job_seeker.pk)
+        snapshot = JobSeekerEligibilitySnapshot.get(job_seeker)
+        self.assertTrue(snapshot.has_considered_valid_diagnosis)
+
+        diagnosis.delete()
+        ApprovalFactory(user=job_seeker)
+        job_seeker = User.objects.get(pk=job_seeker.pk)
+        snapshot = JobSeekerEligibilitySnapshot.get(job_seeker)
+        self.assertTrue(snapshot.approvals_wrapper.has_valid)
+        self.assertFalse(snapshot.has_considered_valid_diagnosis)
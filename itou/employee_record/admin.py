@@ -60,3 +60,10 @@ class EmployeeRecordAdmin(admin.ModelAdmin):
             },
         ),
     )
+
+
+@admin.register(models.EmployeeRecordFeedbackFile)
+class EmployeeRecordFeedbackFileAdmin(admin.ModelAdmin):
+    list_display = ("name", "processed_at")
+    search_fields = ("name",)
+    readonly_fields = ("name", "processed_at")
@@ -0,0 +1,67 @@
+from django.core.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+
+from itou.employee_record.models import EmployeeRecordBatch
+from itou.employee_record.serializers import EmployeeRecordBatchSerializer, EmployeeRecordSerializer
+
+
+# Number of employee records fetched from DB at once
+FETCH_CHUNK_SIZE = 100
+
+
+def _render_batch_envelope():
+    """
+    Render an empty batch and split it around the (empty) list of employee records,
+    so that a batch file can be assembled from already rendered employee records.
+    """
+    content = JSONRenderer().render(EmployeeRecordBatchSerializer(EmployeeRecordBatch([])).data)
+    prefix, suffix = content.split(b"[]")
+    return prefix + b"[", b"]" + suffix
+
+
+def _render_employee_record(renderer, employee_record, line_number):
+    employee_record._batch_line_number = line_number
+    return renderer.render(EmployeeRecordSerializer(employee_record).data)
+
+
+def build_upload_batches(employee_records):
+    """
+    Stream employee records (an `EmployeeRecordQuerySet`) and pack them into upload batches.
+
+    A new batch is started whenever adding the next employee record would exceed
+    either `EmployeeRecordBatch.MAX_EMPLOYEE_RECORDS` or `EmployeeRecordBatch.MAX_SIZE_BYTES`
+    (size of the rendered JSON file).
+
+    Yields `(batch, json_bytes)` pairs, `json_bytes` being the content of the file to upload.
+    """
+    renderer = JSONRenderer()
+    prefix, suffix = _render_batch_envelope()
+    envelope_size = len(prefix) + len(suffix)
+
+    records, rendered_records, size = [], [], envelope_size
+
+    queryset = employee_records.for_serialization()
+    for employee_record in queryset.iterator(chunk_size=FETCH_CHUNK_SIZE):
+        rendered = _render_employee_record(renderer, employee_record, len(records) + 1)
+        # Records are separated by a comma
+        separator_size = 1 if records else 0
+
+        if records and (
+            len(records) == EmployeeRecordBatch.MAX_EMPLOYEE_RECORDS
+            or size + separator_size + len(rendered) > EmployeeRecordBatch.MAX_SIZE_BYTES
+        ):
+            yield EmployeeRecordBatch(records), prefix + b",".join(rendered_records) + suffix
+            records, rendered_records, size = [], [], envelope_size
+            separator_size = 0
+            # Line number has changed
+            rendered = _render_employee_record(renderer, employee_record, 1)
+
+        if size + len(rendered) > EmployeeRecordBatch.MAX_SIZE_BYTES:
+            raise ValidationError(f"Employee record {employee_record.pk} does not fit in an upload batch")
+
+        records.append(employee_record)
+        rendered_records.append(rendered)
+        size += separator_size + len(rendered)
+
+    if records:
+        yield EmployeeRecordBatch(records), prefix + b",".join(rendered_records) + suffix
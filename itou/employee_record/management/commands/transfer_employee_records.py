@@ -1,17 +1,24 @@
+import json
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
 from io import BytesIO
+from itertools import islice
 from os import path
 
 import pysftp
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
-from rest_framework.parsers import JSONParser
 from rest_framework.renderers import JSONRenderer
 
-from itou.employee_record.models import EmployeeRecord, EmployeeRecordBatch
-from itou.employee_record.serializers import EmployeeRecordBatchSerializer, EmployeeRecordSerializer
-from itou.utils.iterators import chunks
+from itou.employee_record.batch_builder import build_upload_batches
+from itou.employee_record.models import EmployeeRecord, EmployeeRecordBatch, EmployeeRecordFeedbackFile
+from itou.employee_record.serializers import EmployeeRecordSerializer
 
 
 # Global SFTP connection options
@@ -33,6 +40,9 @@ class Command(BaseCommand):
     - perform dry-run operations
     """
 
+    # Number of feedback files downloaded concurrently in pipelined mode
+    PIPELINE_WORKERS = 3
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -57,6 +67,12 @@ class Command(BaseCommand):
         parser.add_argument(
             "--upload", dest="upload", action="store_true", help="Upload employee records ready for processing"
         )
+        parser.add_argument(
+            "--pipeline",
+            dest="pipeline",
+            action="store_true",
+            help="Download next feedback files while processing the current one",
+        )
 
     def _get_sftp_connection(self):
         """
@@ -80,14 +96,11 @@ class Command(BaseCommand):
             f.write(content)
         self.logger.info("Wrote '%s' to local path '%s'", remote_path, local_path)
 
-    def _upload_batch_file(self, conn, employee_records, dry_run):
+    def _upload_batch_file(self, conn, batch, json_bytes, dry_run):
         """
-        Render a list of employee records in JSON format then send it to SFTP upload folder
+        Send an already rendered batch of employee records to SFTP upload folder
         """
-        batch = EmployeeRecordBatchSerializer(EmployeeRecordBatch(employee_records))
-
-        # JSONRenderer produces byte arrays
-        json_bytes = JSONRenderer().render(batch.data)
+        employee_records = batch.employee_records
 
         # Using FileIO objects allows to use them as files
         # Cool side effect: no temporary file needed
@@ -120,8 +133,7 @@ class Command(BaseCommand):
 
             # Now that file is transfered, update employee records status (SENT)
             # and store in which file they have been sent
-            for idx, employee_record in enumerate(employee_records, 1):
-                employee_record.update_as_sent(remote_path, idx)
+            EmployeeRecord.objects.bulk_update_as_sent(remote_path, employee_records)
 
     def _parse_feedback_file(self, feedback_file, batch, dry_run):
         """
@@ -143,6 +155,7 @@ class Command(BaseCommand):
 
             return 1
 
+        lines = []
         for idx, employee_record in enumerate(records, 1):
             line_number = employee_record.get("numLigne")
             processing_code = employee_record.get("codeTraitement")
@@ -156,8 +169,17 @@ class Command(BaseCommand):
                 self.logger.warning("No line number for employee record (index: %s, file: '%s')", idx, feedback_file)
                 continue
 
-            # Now we must find the matching FS
-            employee_record = EmployeeRecord.objects.find_by_batch(batch_filename, line_number).first()
+            lines.append((line_number, processing_code, processing_label))
+
+        # Now we must find the matching FS (in a single query)
+        employee_records = EmployeeRecord.objects.find_by_batch_lines(
+            batch_filename, [line_number for line_number, _, _ in lines]
+        )
+        acceptances = []
+        rejections = []
+
+        for line_number, processing_code, processing_label in lines:
+            employee_record = employee_records.get((batch_filename, line_number))
 
             if not employee_record:
                 self.logger.error(
@@ -168,6 +190,11 @@ class Command(BaseCommand):
                 record_errors += 1
                 continue
 
+            if employee_record.status != EmployeeRecord.Status.SENT:
+                # Feedback already applied by a previous pass on this file (which had errors)
+                self.logger.info("Feedback already applied to %s, skipping", employee_record)
+                continue
+
             if processing_code == success_code:
                 # Archive JSON copy of employee record (with processing code and label)
                 employee_record.asp_processing_code = processing_code
@@ -176,8 +203,8 @@ class Command(BaseCommand):
                 serializer = EmployeeRecordSerializer(employee_record)
 
                 if not dry_run:
-                    employee_record.update_as_accepted(
-                        processing_code, processing_label, renderer.render(serializer.data).decode()
+                    acceptances.append(
+                        (employee_record, processing_code, processing_label, renderer.render(serializer.data).decode())
                     )
                 else:
                     self.logger.info(
@@ -186,55 +213,123 @@ class Command(BaseCommand):
                 continue
 
             if not dry_run:
-                employee_record.updated_as_rejected(processing_code, processing_label)
+                rejections.append((employee_record, processing_code, processing_label))
             else:
                 self.logger.info(
                     "DRY-RUN: Rejected %s, code: %s, label: %s", employee_record, processing_code, processing_label
                 )
 
+        if dry_run:
+            return record_errors
+
+        # All the employee records of a feedback file are updated at once (or not at all)
+        # and the file is recorded as processed in the same transaction.
+        # A file with errors is not recorded: it's left on the server and parsed again
+        # by the next run (see `download()`).
+        with transaction.atomic():
+            EmployeeRecord.objects.bulk_update_as_accepted(acceptances)
+            EmployeeRecord.objects.bulk_update_as_rejected(rejections)
+            if record_errors == 0:
+                EmployeeRecordFeedbackFile.objects.create(name=feedback_file)
+
         return record_errors
 
-    def download(self, conn, dry_run):
+    def _fetch_feedback_file(self, conn, result_file):
+        """
+        Download a feedback file from the current remote directory of `conn`
+        """
+        with BytesIO() as result_stream:
+            self.logger.info("Fetching file '%s'", result_file)
+            conn.getfo(result_file, result_stream)
+            return result_stream.getvalue()
+
+    def _fetch_feedback_files(self, conn, result_files, pipeline):
+        """
+        Yield `(result_file, get_content)` pairs in the order of `result_files`,
+        calling `get_content()` returns the file content or raises the download error.
+
+        In pipelined mode, the next files are downloaded by a small thread pool
+        while the current one is parsed and applied. Each worker thread uses
+        its own SFTP connection (SFTP channels can't be shared between threads).
+        """
+        if not pipeline:
+            for result_file in result_files:
+                yield result_file, partial(self._fetch_feedback_file, conn, result_file)
+            return
+
+        thread_data = threading.local()
+        lock = threading.Lock()
+
+        with ExitStack() as connections:
+
+            def fetch_in_worker(result_file):
+                if not hasattr(thread_data, "conn"):
+                    with lock:
+                        thread_data.conn = connections.enter_context(self._get_sftp_connection())
+                with thread_data.conn.cd(settings.ASP_FS_REMOTE_DOWNLOAD_DIR):
+                    return self._fetch_feedback_file(thread_data.conn, result_file)
+
+            with ThreadPoolExecutor(max_workers=self.PIPELINE_WORKERS) as executor:
+                remaining_files = iter(result_files)
+                pending = deque(
+                    (result_file, executor.submit(fetch_in_worker, result_file))
+                    for result_file in islice(remaining_files, self.PIPELINE_WORKERS)
+                )
+                while pending:
+                    result_file, future = pending.popleft()
+                    # Keep the workers busy while the current file is processed
+                    for next_file in islice(remaining_files, 1):
+                        pending.append((next_file, executor.submit(fetch_in_worker, next_file)))
+                    yield result_file, future.result
+
+    def download(self, conn, dry_run, pipeline=False):
         """
         Fetch remote ASP file containing the results of the processing
         of a batch of employee records
         """
         self.logger.info("Starting DOWNLOAD")
 
-        parser = JSONParser()
         count = 0
         errors = 0
         files_to_delete = []
 
         # Get into the download folder
         with conn.cd(settings.ASP_FS_REMOTE_DOWNLOAD_DIR):
-            result_files = conn.listdir()
+            result_files = list(conn.listdir())
 
             if len(result_files) == 0:
                 self.logger.info("No feedback files found")
                 return
 
-            for result_file in result_files:
-                try:
-                    with BytesIO() as result_stream:
-                        self.logger.info("Fetching file '%s'", result_file)
+            # Feedback files already applied during a previous run are only removed
+            already_processed = set(
+                EmployeeRecordFeedbackFile.objects.filter(name__in=result_files).values_list("name", flat=True)
+            )
+            for result_file in already_processed:
+                self.logger.info("File '%s' has already been processed", result_file)
+                files_to_delete.append(result_file)
 
-                        conn.getfo(result_file, result_stream)
-                        # Rewind stream
-                        result_stream.seek(0)
+            files_to_process = [result_file for result_file in result_files if result_file not in already_processed]
 
-                        # Parse and update employee records with feedback
-                        errors += self._parse_feedback_file(result_file, parser.parse(result_stream), dry_run)
+            for result_file, get_content in self._fetch_feedback_files(conn, files_to_process, pipeline):
+                file_errors = 0
+                try:
+                    # Plain `json` is much faster than DRF parsers (no stream decoding)
+                    batch = json.loads(get_content())
+
+                    # Parse and update employee records with feedback
+                    file_errors = self._parse_feedback_file(result_file, batch, dry_run)
 
-                        count += 1
+                    count += 1
                 except Exception as ex:
-                    errors += 1
+                    file_errors += 1
                     self.logger.error("Error while parsing file '%s': %s", result_file, ex)
 
-                self.logger.info("Parsed %s/%s files", count, len(result_files))
+                errors += file_errors
+                self.logger.info("Parsed %s/%s files", count, len(files_to_process))
 
                 # There were errors do not delete file
-                if errors > 0:
+                if file_errors > 0:
                     self.logger.warning(
                         "Will not delete file '%s' because of errors. Leaving it in place for another pass...",
                         result_file,
@@ -254,16 +349,20 @@ class Command(BaseCommand):
 
                 conn.remove(file)
 
+        if errors > 0:
+            self.logger.warning("Feedback files processed with %s error(s)", errors)
+
     def upload(self, sftp, dry_run):
         """
         Upload a file composed of all ready employee records
         """
         self.logger.info("Starting UPLOAD")
 
-        for batch in chunks(EmployeeRecord.objects.ready(), EmployeeRecordBatch.MAX_EMPLOYEE_RECORDS):
-            self._upload_batch_file(sftp, batch, dry_run)
+        # Batches are as large as allowed by ASP (number of records and file size)
+        for batch, json_bytes in build_upload_batches(EmployeeRecord.objects.ready()):
+            self._upload_batch_file(sftp, batch, json_bytes, dry_run)
 
-    def handle(self, upload=True, download=True, verbosity=1, dry_run=False, **options):
+    def handle(self, upload=True, download=True, verbosity=1, dry_run=False, pipeline=False, **options):
         """
         Employee Record Management Command
         """
@@ -281,6 +380,6 @@ class Command(BaseCommand):
 
             # Fetch results from ASP
             if download:
-                self.download(sftp, dry_run)
+                self.download(sftp, dry_run, pipeline=pipeline)
 
         self.logger.info("Employee records processing done!")
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.2 on 2021-06-07 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("employee_record", "0006_prod_squash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmployeeRecordFeedbackFile",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "name",
+                    models.CharField(max_length=50, unique=True, verbose_name="Nom du fichier de retour ASP"),
+                ),
+                (
+                    "processed_at",
+                    models.DateTimeField(default=django.utils.timezone.now, verbose_name="Date de traitement"),
+                ),
+            ],
+            options={
+                "verbose_name": "Fichier de retour ASP",
+                "verbose_name_plural": "Fichiers de retour ASP",
+                "ordering": ["-processed_at"],
+            },
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 from itou.asp.models import EmployerType, PrescriberType, SiaeKind
@@ -48,6 +48,108 @@ class EmployeeRecordQuerySet(models.QuerySet):
         """
         return self.filter(asp_batch_file=filename, asp_batch_line_number=line_number)
 
+    def with_validation_related_data(self):
+        """
+        Preload every object read by `EmployeeRecord.clean()`
+        to avoid one set of queries per employee record.
+        """
+        return self.select_related(
+            "job_application__approval",
+            "job_application__job_seeker__birth_country",
+            "job_application__job_seeker__birth_place",
+            "job_application__job_seeker__jobseeker_profile__hexa_commune",
+        )
+
+    def for_serialization(self):
+        """
+        Preload every object read by `EmployeeRecordSerializer` and its nested serializers
+        (including `asp_*` properties): any number of employee records can then be
+        serialized with a single query.
+        """
+        return self.with_validation_related_data().select_related(
+            "financial_annex",
+            "job_application__sender_prescriber_organization",
+            "job_application__to_siae__convention",
+        )
+
+    def find_by_batch_lines(self, filename, line_numbers):
+        """
+        Fetch employee records of an ASP batch file with a single query.
+
+        Returns a dict of employee records keyed by their
+        `(asp_batch_file, asp_batch_line_number)` pair.
+        """
+        employee_records = self.for_serialization().filter(
+            asp_batch_file=filename, asp_batch_line_number__in=line_numbers
+        )
+        return {
+            (employee_record.asp_batch_file, employee_record.asp_batch_line_number): employee_record
+            for employee_record in employee_records
+        }
+
+    def _bulk_transition(self, employee_records, fields):
+        now = timezone.now()
+        for employee_record in employee_records:
+            employee_record.updated_at = now
+        self.bulk_update(employee_records, fields + ["updated_at"])
+
+    @transaction.atomic
+    def bulk_update_as_sent(self, asp_filename, employee_records):
+        """
+        Batch version of `EmployeeRecord.update_as_sent()`.
+
+        Line numbers follow the order of `employee_records` (starting at 1),
+        i.e. the order of the uploaded file.
+        Validation is done on freshly loaded objects with all related data.
+        """
+        pks = [employee_record.pk for employee_record in employee_records]
+        loaded = self.with_validation_related_data().in_bulk(pks)
+
+        to_update = []
+        for line_number, pk in enumerate(pks, 1):
+            employee_record = loaded[pk]
+            employee_record.set_as_sent(asp_filename, line_number)
+            to_update.append(employee_record)
+
+        self._bulk_transition(to_update, ["asp_batch_file", "asp_batch_line_number", "status"])
+        return to_update
+
+    @transaction.atomic
+    def bulk_update_as_rejected(self, rejections):
+        """
+        Batch version of `EmployeeRecord.update_as_rejected()`.
+
+        `rejections` is an iterable of `(employee_record, code, label)` tuples,
+        employee records are expected to be loaded with related data
+        (see `find_by_batch_lines()`).
+        """
+        employee_records = []
+        for employee_record, code, label in rejections:
+            employee_record.set_as_rejected(code, label)
+            employee_records.append(employee_record)
+
+        self._bulk_transition(employee_records, ["status", "asp_processing_code", "asp_processing_label"])
+        return employee_records
+
+    @transaction.atomic
+    def bulk_update_as_accepted(self, acceptances):
+        """
+        Batch version of `EmployeeRecord.update_as_accepted()`.
+
+        `acceptances` is an iterable of `(employee_record, code, label, archive)` tuples,
+        employee records are expected to be loaded with related data
+        (see `find_by_batch_lines()`).
+        """
+        employee_records = []
+        for employee_record, code, label, archive in acceptances:
+            employee_record.set_as_accepted(code, label, archive)
+            employee_records.append(employee_record)
+
+        self._bulk_transition(
+            employee_records, ["status", "asp_processing_code", "asp_processing_label", "archived_json"]
+        )
+        return employee_records
+
 
 class EmployeeRecord(models.Model):
     """
@@ -220,10 +322,10 @@ class EmployeeRecord(models.Model):
         self.status = self.Status.READY
         self.save()
 
-    def update_as_sent(self, asp_filename, line_number):
+    def set_as_sent(self, asp_filename, line_number):
         """
-        An employee record is sent to ASP via a JSON file,
-        The file name is stored for further feedback processing (also done via a file)
+        Check and apply the SENT transition without saving
+        (shared by `update_as_sent()` and its batch version)
 
         Status: READY => SENT
         """
@@ -235,11 +337,20 @@ class EmployeeRecord(models.Model):
         self.asp_batch_file = asp_filename
         self.asp_batch_line_number = line_number
         self.status = EmployeeRecord.Status.SENT
+
+    def update_as_sent(self, asp_filename, line_number):
+        """
+        An employee record is sent to ASP via a JSON file,
+        The file name is stored for further feedback processing (also done via a file)
+
+        Status: READY => SENT
+        """
+        self.set_as_sent(asp_filename, line_number)
         self.save()
 
-    def update_as_rejected(self, code, label):
+    def set_as_rejected(self, code, label):
         """
-        Update status after an ASP rejection of the employee record
+        Check and apply the REJECTED transition without saving
 
         Status: SENT => REJECTED
         """
@@ -250,9 +361,22 @@ class EmployeeRecord(models.Model):
         self.status = EmployeeRecord.Status.REJECTED
         self.asp_processing_code = code
         self.asp_processing_label = label
+
+    def update_as_rejected(self, code, label):
+        """
+        Update status after an ASP rejection of the employee record
+
+        Status: SENT => REJECTED
+        """
+        self.set_as_rejected(code, label)
         self.save()
 
-    def update_as_accepted(self, code, label, archive):
+    def set_as_accepted(self, code, label, archive):
+        """
+        Check and apply the PROCESSED transition without saving
+
+        Status: SENT => PROCESSED
+        """
         if not self.status == EmployeeRecord.Status.SENT:
             raise ValidationError(self.ERROR_EMPLOYEE_RECORD_INVALID_STATE)
 
@@ -261,6 +385,9 @@ class EmployeeRecord(models.Model):
         self.asp_processing_code = code
         self.asp_processing_label = label
         self.archived_json = archive
+
+    def update_as_accepted(self, code, label, archive):
+        self.set_as_accepted(code, label, archive)
         self.save()
 
     @property
@@ -357,7 +484,11 @@ class EmployeeRecord(models.Model):
             # an SIAE applied
             return PrescriberType.UNKNOWN
 
-        return PrescriberType.from_itou_prescriber_kind(sender_kind)
+        prescriber_organization = self.job_application.sender_prescriber_organization
+        if not prescriber_organization:
+            return PrescriberType.UNKNOWN
+
+        return PrescriberType.from_itou_prescriber_kind(prescriber_organization.kind)
 
     @property
     def asp_siae_type(self):
@@ -409,6 +540,27 @@ class EmployeeRecord(models.Model):
         return fs
 
 
+class EmployeeRecordFeedbackFile(models.Model):
+    """
+    Ledger of ASP feedback files already applied to employee records
+
+    A feedback file is recorded in the same transaction as the updates of its
+    employee records: if a run fails after that point (e.g. before the file could
+    be removed from the SFTP server), the next run will skip it.
+    """
+
+    name = models.CharField(max_length=50, unique=True, verbose_name="Nom du fichier de retour ASP")
+    processed_at = models.DateTimeField(verbose_name="Date de traitement", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Fichier de retour ASP"
+        verbose_name_plural = "Fichiers de retour ASP"
+        ordering = ["-processed_at"]
+
+    def __str__(self):
+        return self.name
+
+
 class EmployeeRecordBatch:
     """
     Transient wrapper for a list of employee records.
@@ -449,8 +601,8 @@ class EmployeeRecordBatch:
         self.upload_filename = self.REMOTE_PATH_FORMAT.format(timezone.now().strftime("%Y%m%d%H%M%S"))
 
         # add a line number to each FS for JSON serialization
-        for idx, er in enumerate(self.employee_records):
-            er.batch_line = idx
+        for idx, er in enumerate(self.employee_records, 1):
+            er._batch_line_number = idx
 
     def __str__(self):
         return f"{self.upload_filename}"
@@ -1,19 +1,34 @@
+import io
 import json
 from unittest import mock
 
 from django.core.exceptions import ValidationError
 from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
 
+from itou.asp.models import PrescriberType
+from itou.employee_record.batch_builder import build_upload_batches
 from itou.employee_record.factories import EmployeeRecordFactory
 from itou.employee_record.management.commands.transfer_employee_records import Command
 from itou.employee_record.mocks.transfer_employee_records import (
+    FILES as SFTP_FILES,
     SFTPBadConnectionMock,
     SFTPConnectionMock,
     SFTPEvilConnectionMock,
     SFTPGoodConnectionMock,
 )
-from itou.employee_record.models import EmployeeRecord, EmployeeRecordBatch, validate_asp_batch_filename
+from itou.employee_record.models import (
+    EmployeeRecord,
+    EmployeeRecordBatch,
+    EmployeeRecordFeedbackFile,
+    validate_asp_batch_filename,
+)
+from itou.employee_record.serializers import EmployeeRecordBatchSerializer, EmployeeRecordSerializer
 from itou.job_applications.factories import (
+    JobApplicationSentByJobSeekerFactory,
+    JobApplicationSentByPrescriberFactory,
+    JobApplicationSentByPrescriberOrganizationFactory,
+    JobApplicationSentBySiaeFactory,
     JobApplicationWithApprovalFactory,
     JobApplicationWithApprovalNotCancellableFactory,
     JobApplicationWithCompleteJobSeekerProfileFactory,
@@ -21,6 +36,7 @@ from itou.job_applications.factories import (
     JobApplicationWithoutApprovalFactory,
 )
 from itou.job_applications.models import JobApplicationWorkflow
+from itou.prescribers.models import PrescriberOrganization
 from itou.utils.mocks.address_format import mock_get_geocoding_data
 
 
@@ -148,6 +164,28 @@ class EmployeeRecordModelTest(TestCase):
 
         self.assertEqual(result.id, employee_record.id)
 
+    def test_asp_prescriber_type(self):
+        """
+        ASP prescriber type is given by the kind of the sender prescriber organization
+        """
+        job_application = JobApplicationSentByPrescriberOrganizationFactory(
+            sender_prescriber_organization__kind=PrescriberOrganization.Kind.ML
+        )
+        self.assertEqual(EmployeeRecord(job_application=job_application).asp_prescriber_type, PrescriberType.ML)
+
+        # Prescriber without organization
+        job_application = JobApplicationSentByPrescriberFactory()
+        self.assertEqual(EmployeeRecord(job_application=job_application).asp_prescriber_type, PrescriberType.UNKNOWN)
+
+        job_application = JobApplicationSentByJobSeekerFactory()
+        self.assertEqual(
+            EmployeeRecord(job_application=job_application).asp_prescriber_type,
+            PrescriberType.SPONTANEOUS_APPLICATION,
+        )
+
+        job_application = JobApplicationSentBySiaeFactory()
+        self.assertEqual(EmployeeRecord(job_application=job_application).asp_prescriber_type, PrescriberType.UNKNOWN)
+
 
 class EmployeeRecordBatchTest(TestCase):
     """
@@ -239,6 +277,173 @@ class EmployeeRecordLifeCycleTest(TestCase):
         self.assertEqual(self.employee_record.asp_processing_label, process_message)
 
 
+class EmployeeRecordBulkLifeCycleTest(TestCase):
+    """
+    Batch versions of employee records transitions
+    """
+
+    fixtures = ["test_INSEE_communes.json"]
+
+    @mock.patch(
+        "itou.utils.address.format.get_geocoding_data",
+        side_effect=mock_get_geocoding_data,
+    )
+    def setUp(self, _mock):
+        self.employee_records = []
+        for _ in range(3):
+            employee_record = EmployeeRecord.from_job_application(JobApplicationWithCompleteJobSeekerProfileFactory())
+            employee_record.update_as_ready()
+            self.employee_records.append(employee_record)
+
+    def test_bulk_update_as_sent(self):
+        filename = "RIAE_FS_20210410130000.json"
+        # Validation related data is loaded once for the whole batch.
+        with self.assertNumQueries(4):
+            EmployeeRecord.objects.bulk_update_as_sent(filename, self.employee_records)
+
+        for line_number, employee_record in enumerate(self.employee_records, 1):
+            employee_record.refresh_from_db()
+            self.assertEqual(employee_record.status, EmployeeRecord.Status.SENT)
+            self.assertEqual(employee_record.asp_batch_file, filename)
+            self.assertEqual(employee_record.asp_batch_line_number, line_number)
+
+    def test_bulk_update_as_sent_invalid_state(self):
+        filename = "RIAE_FS_20210410130000.json"
+        self.employee_records[1].update_as_sent(filename, 1)
+
+        with self.assertRaises(ValidationError):
+            EmployeeRecord.objects.bulk_update_as_sent("RIAE_FS_20210410130001.json", self.employee_records)
+
+        # Nothing was updated.
+        employee_record = self.employee_records[0]
+        employee_record.refresh_from_db()
+        self.assertEqual(employee_record.status, EmployeeRecord.Status.READY)
+
+    def test_find_by_batch_lines(self):
+        filename = "RIAE_FS_20210410130000.json"
+        EmployeeRecord.objects.bulk_update_as_sent(filename, self.employee_records)
+
+        with self.assertNumQueries(1):
+            result = EmployeeRecord.objects.find_by_batch_lines(filename, [1, 3, 4])
+
+        self.assertEqual(set(result.keys()), {(filename, 1), (filename, 3)})
+        self.assertEqual(result[(filename, 3)].pk, self.employee_records[2].pk)
+
+    def test_bulk_update_as_accepted_and_rejected(self):
+        filename = "RIAE_FS_20210410130000.json"
+        EmployeeRecord.objects.bulk_update_as_sent(filename, self.employee_records)
+        employee_records = EmployeeRecord.objects.find_by_batch_lines(filename, [1, 2, 3])
+
+        process_code, process_message = "0000", "La ligne de la fiche salarié a été enregistrée avec succès."
+        err_code, err_message = "12", "JSON Invalide"
+        EmployeeRecord.objects.bulk_update_as_accepted(
+            [
+                (employee_records[(filename, 1)], process_code, process_message, "{}"),
+                (employee_records[(filename, 2)], process_code, process_message, "{}"),
+            ]
+        )
+        EmployeeRecord.objects.bulk_update_as_rejected([(employee_records[(filename, 3)], err_code, err_message)])
+
+        statuses = [EmployeeRecord.objects.get(pk=er.pk).status for er in self.employee_records]
+        self.assertEqual(
+            statuses,
+            [EmployeeRecord.Status.PROCESSED, EmployeeRecord.Status.PROCESSED, EmployeeRecord.Status.REJECTED],
+        )
+        rejected = EmployeeRecord.objects.get(pk=self.employee_records[2].pk)
+        self.assertEqual(rejected.asp_processing_code, err_code)
+        self.assertEqual(rejected.asp_processing_label, err_message)
+
+
+class EmployeeRecordBatchBuilderTest(TestCase):
+    """
+    Packing of ready employee records into upload batches
+    """
+
+    fixtures = ["test_INSEE_communes.json"]
+
+    @mock.patch(
+        "itou.utils.address.format.get_geocoding_data",
+        side_effect=mock_get_geocoding_data,
+    )
+    def setUp(self, _mock):
+        for _ in range(3):
+            employee_record = EmployeeRecord.from_job_application(JobApplicationWithCompleteJobSeekerProfileFactory())
+            employee_record.update_as_ready()
+
+    def test_single_batch(self):
+        batches = list(build_upload_batches(EmployeeRecord.objects.ready()))
+
+        self.assertEqual(len(batches), 1)
+        batch, json_bytes = batches[0]
+        self.assertEqual(len(batch.employee_records), 3)
+
+        # The rendered file is the same as the one of the batch serializer.
+        expected = JSONRenderer().render(EmployeeRecordBatchSerializer(batch).data)
+        self.assertEqual(json_bytes, expected)
+        lines = json.loads(json_bytes)["lignesTelechargement"]
+        self.assertEqual([line["numLigne"] for line in lines], [1, 2, 3])
+
+    def test_split_on_max_employee_records(self):
+        with mock.patch.object(EmployeeRecordBatch, "MAX_EMPLOYEE_RECORDS", 2):
+            batches = list(build_upload_batches(EmployeeRecord.objects.ready()))
+
+        self.assertEqual([len(batch.employee_records) for batch, _ in batches], [2, 1])
+        lines = json.loads(batches[1][1])["lignesTelechargement"]
+        self.assertEqual([line["numLigne"] for line in lines], [1])
+
+    def test_split_on_max_size(self):
+        _, json_bytes = next(build_upload_batches(EmployeeRecord.objects.ready()))
+        # Enough room for two employee records but not for three.
+        max_size = len(json_bytes) - 10
+
+        with mock.patch.object(EmployeeRecordBatch, "MAX_SIZE_BYTES", max_size):
+            batches = list(build_upload_batches(EmployeeRecord.objects.ready()))
+
+        self.assertEqual([len(batch.employee_records) for batch, _ in batches], [2, 1])
+        for _, json_bytes in batches:
+            self.assertLessEqual(len(json_bytes), max_size)
+            json.loads(json_bytes)
+
+    def test_employee_record_too_large(self):
+        with mock.patch.object(EmployeeRecordBatch, "MAX_SIZE_BYTES", 100):
+            with self.assertRaises(ValidationError):
+                list(build_upload_batches(EmployeeRecord.objects.ready()))
+
+
+class EmployeeRecordSerializationTest(TestCase):
+    """
+    Serializing employee records must not trigger any query per record
+    """
+
+    fixtures = ["test_INSEE_communes.json", "test_asp_INSEE_countries.json"]
+
+    @mock.patch(
+        "itou.utils.address.format.get_geocoding_data",
+        side_effect=mock_get_geocoding_data,
+    )
+    def create_ready_employee_records(self, count, _mock):
+        for _ in range(count):
+            employee_record = EmployeeRecord.from_job_application(JobApplicationWithCompleteJobSeekerProfileFactory())
+            employee_record.update_as_ready()
+
+    def serialize_ready_employee_records(self):
+        employee_records = EmployeeRecordBatch(
+            list(EmployeeRecord.objects.ready().for_serialization())
+        ).employee_records
+        return EmployeeRecordSerializer(employee_records, many=True).data
+
+    def test_number_of_queries_does_not_depend_on_batch_size(self):
+        self.create_ready_employee_records(1)
+        with self.assertNumQueries(1):
+            data = self.serialize_ready_employee_records()
+        self.assertEqual(len(data), 1)
+
+        self.create_ready_employee_records(4)
+        with self.assertNumQueries(1):
+            data = self.serialize_ready_employee_records()
+        self.assertEqual(len(data), 5)
+
+
 class EmployeeRecordManagementCommandTest(TestCase):
     """
     Employee record management command, testing:
@@ -358,6 +563,86 @@ class EmployeeRecordManagementCommandTest(TestCase):
         self.assertEqual(employee_record.status, EmployeeRecord.Status.PROCESSED)
         self.assertEqual(employee_record.asp_processing_code, "0000")
 
+    @mock.patch("pysftp.Connection", SFTPGoodConnectionMock)
+    @mock.patch(
+        "itou.utils.address.format.get_geocoding_data",
+        side_effect=mock_get_geocoding_data,
+    )
+    def test_pipelined_download(self, _mock):
+        employee_record = self.employee_record
+
+        command = Command()
+        command.handle(upload=True, download=False)
+        employee_record.refresh_from_db()
+        feedback_file = EmployeeRecordBatch.feedback_filename(employee_record.asp_batch_file)
+
+        command.handle(upload=False, download=True, pipeline=True)
+        employee_record.refresh_from_db()
+
+        self.assertEqual(employee_record.status, EmployeeRecord.Status.PROCESSED)
+        self.assertTrue(EmployeeRecordFeedbackFile.objects.filter(name=feedback_file).exists())
+        self.assertNotIn(feedback_file, SFTP_FILES)
+
+    @mock.patch("pysftp.Connection", SFTPGoodConnectionMock)
+    @mock.patch(
+        "itou.utils.address.format.get_geocoding_data",
+        side_effect=mock_get_geocoding_data,
+    )
+    def test_download_skips_processed_files(self, _mock):
+        employee_record = self.employee_record
+
+        command = Command()
+        command.handle(upload=True, download=False)
+        employee_record.refresh_from_db()
+        feedback_file = EmployeeRecordBatch.feedback_filename(employee_record.asp_batch_file)
+
+        # File applied by a previous run which failed before removing it
+        EmployeeRecordFeedbackFile.objects.create(name=feedback_file)
+
+        command.handle(upload=False, download=True)
+        employee_record.refresh_from_db()
+
+        # Not applied a second time, but removed from the server
+        self.assertEqual(employee_record.status, EmployeeRecord.Status.SENT)
+        self.assertNotIn(feedback_file, SFTP_FILES)
+
+    @mock.patch("pysftp.Connection", SFTPGoodConnectionMock)
+    @mock.patch(
+        "itou.utils.address.format.get_geocoding_data",
+        side_effect=mock_get_geocoding_data,
+    )
+    def test_download_keeps_files_with_errors(self, _mock):
+        employee_record = self.employee_record
+
+        command = Command()
+        command.handle(upload=True, download=False)
+        employee_record.refresh_from_db()
+        feedback_file = EmployeeRecordBatch.feedback_filename(employee_record.asp_batch_file)
+
+        # Add a line which matches no employee record to the feedback file
+        content = SFTP_FILES[feedback_file]
+        content.seek(0)
+        batch = json.load(content)
+        unknown_line = dict(batch["lignesTelechargement"][0], numLigne=9999)
+        batch["lignesTelechargement"].append(unknown_line)
+        SFTP_FILES[feedback_file] = io.BytesIO(json.dumps(batch).encode())
+        self.addCleanup(SFTP_FILES.pop, feedback_file, None)
+
+        with mock.patch.object(
+            Command, "_parse_feedback_file", autospec=True, side_effect=Command._parse_feedback_file
+        ) as parse_feedback_file:
+            for _ in range(2):
+                command.handle(upload=False, download=True)
+
+                # Known lines are applied, the file is left on the server and not recorded as processed
+                employee_record.refresh_from_db()
+                self.assertEqual(employee_record.status, EmployeeRecord.Status.PROCESSED)
+                self.assertIn(feedback_file, SFTP_FILES)
+                self.assertFalse(EmployeeRecordFeedbackFile.objects.filter(name=feedback_file).exists())
+
+        # Parsed again by the second run
+        self.assertEqual(parse_feedback_file.call_count, 2)
+
     @mock.patch("pysftp.Connection", SFTPGoodConnectionMock)
     @mock.patch(
         "itou.utils.address.format.get_geocoding_data",
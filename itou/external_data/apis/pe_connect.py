@@ -1,6 +1,9 @@
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
+import httpx
 from django.conf import settings
 from django.db import transaction
 from django.forms.models import model_to_dict
@@ -27,26 +30,58 @@ ESD_PT_LICENSES_API = "peconnect-formations/v1/permits"
 
 logger = logging.getLogger(__name__)
 
+# Connections to ESD APIs are shared by all imports (i.e. Huey tasks) of the process
+_client = None
+_client_lock = threading.Lock()
+
 
 # This part may be refactored with the processing of other APIs
 # YAGNI at the moment
 
 
-def _call_api(api_path, token):
+def get_client():
+    """
+    Shared HTTP client: keeps connections to ESD APIs alive between calls and imports.
+    `httpx.Client` is thread-safe, the five calls of an import go through it concurrently.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                timeout=settings.REQUESTS_TIMEOUT,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+    return _client
+
+
+def _call_api(api_path, token, api_calls=None):
     """
     Make a sync call to an API
     For further processing, returning something else than `None` is considered a success
+
+    If given, the `api_calls` dict is updated with the status and duration of the call
+    (key: `api_path`), for QoS.
     """
     url = f"{API_ESD_BASE_URL}/{api_path}"
-    response = requests.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=settings.REQUESTS_TIMEOUT)
-    if response.status_code == 200:
-        result = response.json()
-        # logger.debug(f"CALL {url}: {result}")
-        return result
-
-    # Track it for QoS
-    logger.warning("API call to: %s returned status code %s", url, response.status_code)
-    return None
+    result = None
+    start = time.perf_counter()
+    try:
+        response = get_client().get(url, headers={"Authorization": f"Bearer {token}"})
+    except httpx.RequestError as e:
+        status = type(e).__name__
+        logger.warning("API call to: %s failed: %s", url, e)
+    else:
+        status = response.status_code
+        if response.status_code == 200:
+            result = response.json()
+        else:
+            # Track it for QoS
+            logger.warning("API call to: %s returned status code %s", url, response.status_code)
+
+    if api_calls is not None:
+        api_calls[api_path] = {"status": status, "duration_ms": round((time.perf_counter() - start) * 1000)}
+
+    return result
 
 
 def _fields_or_failed(result, keys):
@@ -56,7 +91,7 @@ def _fields_or_failed(result, keys):
     return {k: v for k, v in result.items() if k in keys}
 
 
-def _get_userinfo(token):
+def _get_userinfo(token, api_calls=None):
     """
     Get main info from user:
         * first and family names
@@ -67,25 +102,25 @@ def _get_userinfo(token):
     """
     # Fields of interest
     keys = ["given_name", "family_name", "gender", "email"]
-    return _fields_or_failed(_call_api(ESD_USERINFO_API, token), keys)
+    return _fields_or_failed(_call_api(ESD_USERINFO_API, token, api_calls), keys)
 
 
-def _get_birthdate(token):
+def _get_birthdate(token, api_calls=None):
     """
     Get birthdate of user (format `YYYY-MM-DDTHH:MM:SSZ`), converted as `datetime` object.
 
     See: https://www.emploi-store-dev.fr/portail-developpeur-cms/home/catalogue-des-api/documentation-des-api/api/api-pole-emploi-connect/api-peconnect-datenaissance-v1.html  # noqa E501
     """
     key = "dateDeNaissance"
-    # code, resp = _call_api(ESD_BIRTHDATE_API, token)
-    result = _fields_or_failed(_call_api(ESD_BIRTHDATE_API, token), [key])
+    # code, resp = _call_api(ESD_BIRTHDATE_API, token, api_calls)
+    result = _fields_or_failed(_call_api(ESD_BIRTHDATE_API, token, api_calls), [key])
     if result:
         return {key: result.get(key)}
 
     return None
 
 
-def _get_status(token):
+def _get_status(token, api_calls=None):
     """
     Get current status of candidate.
 
@@ -96,7 +131,7 @@ def _get_status(token):
     See: https://www.emploi-store-dev.fr/portail-developpeur-cms/home/catalogue-des-api/documentation-des-api/api/api-pole-emploi-connect/api-peconnect-statut-v1.html  # noqa E501
     """
     key = "codeStatutIndividu"
-    result = _fields_or_failed(_call_api(ESD_STATUS_API, token), [key])
+    result = _fields_or_failed(_call_api(ESD_STATUS_API, token, api_calls), [key])
     if result:
         code = result.get(key)
         return {key: int(code)}
@@ -104,7 +139,7 @@ def _get_status(token):
     return None
 
 
-def _get_address(token):
+def _get_address(token, api_calls=None):
     """
     Get current address of the candidate:
 
@@ -122,10 +157,10 @@ def _get_address(token):
     See: https://www.emploi-store-dev.fr/portail-developpeur-cms/home/catalogue-des-api/documentation-des-api/api/api-pole-emploi-connect/api-peconnect-coordonnees-v1.html   # noqa E501
     """
     keys = ["adresse1", "adresse2", "adresse3", "adresse4", "codePostal", "codeINSEE", "libelleCommune"]
-    return _fields_or_failed(_call_api(ESD_COORDS_API, token), keys)
+    return _fields_or_failed(_call_api(ESD_COORDS_API, token, api_calls), keys)
 
 
-def _get_compensations(token):
+def _get_compensations(token, api_calls=None):
     """
     Get user "compensations" (social allowance):
 
@@ -136,22 +171,20 @@ def _get_compensations(token):
     See: https://www.emploi-store-dev.fr/portail-developpeur-cms/home/catalogue-des-api/documentation-des-api/api/api-pole-emploi-connect/api-indemnisations-v1.html  # noqa E501
     """
     keys = ["beneficiairePrestationSolidarite", "beneficiaireAssuranceChomage"]
-    return _fields_or_failed(_call_api(ESD_COMPENSATION_API, token), keys)
+    return _fields_or_failed(_call_api(ESD_COMPENSATION_API, token, api_calls), keys)
 
 
 def get_aggregated_user_data(token):
     """
     Aggregates all needed user data before formatting and storage.
-    Returns a pair status and a "flat" dict.
+    APIs are called concurrently.
+    Returns a status, a "flat" dict and the status / duration of each API call.
     """
     # Include API results "à volonté"
-    results = [
-        _get_userinfo(token),
-        _get_birthdate(token),
-        _get_status(token),
-        _get_address(token),
-        _get_compensations(token),
-    ]
+    fetchers = [_get_userinfo, _get_birthdate, _get_status, _get_address, _get_compensations]
+    api_calls = {}
+    with ThreadPoolExecutor(max_workers=len(fetchers)) as executor:
+        results = list(executor.map(lambda fetch: fetch(token, api_calls), fetchers))
 
     ok = all(results)
     partial = not ok and any(results)
@@ -168,7 +201,7 @@ def get_aggregated_user_data(token):
     for result in cleaned_results:
         user_data.update(result)
 
-    return status, user_data
+    return status, user_data, api_calls
 
 
 def _model_fields_changed(initial, final_instance):
@@ -186,13 +219,15 @@ def _model_fields_changed(initial, final_instance):
 # * or store as key / value if needed
 
 
-def set_pe_data_import_from_user_data(pe_data_import, user, status, user_data):
+def set_pe_data_import_from_user_data(pe_data_import, user, status, user_data, api_calls=None):
     """
     Store user data and produce a "report" containing a JSON object, with these fields:
         - fields_fetched (array): successfully imported field names
         - fields_failed (array): fields that could not be fetched (API error...)
         - fields_updated (array): updated fields in the db each of form:
             `class_name/pk/field_name` (f.i. `User/10/birthdate`)
+        - api_calls (object): HTTP status (or error) and duration in ms of each API call,
+            f.i. `{"peconnect-statut/v1/statut": {"status": 200, "duration_ms": 87}}`
 
     Return a ExternalDataImport object containing outcome of the data import
     """
@@ -236,7 +271,12 @@ def set_pe_data_import_from_user_data(pe_data_import, user, status, user_data):
     user.save()
     job_seeker_data.save()
 
-    report = {"fields_fetched": fields_fetched, "fields_failed": fields_failed, "fields_updated": fields_updated}
+    report = {
+        "fields_fetched": fields_fetched,
+        "fields_failed": fields_failed,
+        "fields_updated": fields_updated,
+        "api_calls": api_calls or {},
+    }
     pe_data_import.status = status
     pe_data_import.report = report
     return pe_data_import
@@ -261,12 +301,12 @@ def import_user_pe_data(
 
         try:
             # External requests
-            status, user_data = get_aggregated_user_data(token)
+            status, user_data, api_calls = get_aggregated_user_data(token)
             with transaction.atomic():
                 # A refactoring would be helpful to split user/job seeker saving
                 # and to use the status before calling save()
                 # Save user and job seeker data
-                set_pe_data_import_from_user_data(pe_data_import, user, status, user_data)
+                set_pe_data_import_from_user_data(pe_data_import, user, status, user_data, api_calls)
                 pe_data_import.save()
 
             if status == ExternalDataImport.STATUS_OK:
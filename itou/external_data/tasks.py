@@ -1,8 +1,8 @@
-from huey.contrib.djhuey import db_task
+from itou.utils.queues import db_task
 
 from .apis.pe_connect import import_user_pe_data
 
 
-@db_task()
+@db_task("external_data")
 def huey_import_user_pe_data(user, token, pe_data_import):
     import_user_pe_data(user, token, pe_data_import)
@@ -1,6 +1,8 @@
+import functools
 import json
+from unittest import mock
 
-import requests_mock
+import httpx
 from django.test import TestCase
 
 import itou.external_data.apis.pe_connect as pec
@@ -69,6 +71,39 @@ _API_KEYS = [
 ]
 
 
+class _MockedAPIs:
+    """
+    Register responses of ESD APIs by URL (same interface as `requests_mock`).
+    """
+
+    def __init__(self):
+        self.responses = {}
+
+    def get(self, url, text="", status_code=200, exc=None):
+        self.responses[url] = (status_code, text, exc)
+
+    def handler(self, request):
+        status_code, text, exc = self.responses.get(str(request.url), (404, "", None))
+        if exc:
+            raise exc("Mocked error", request=request)
+        return httpx.Response(status_code, text=text)
+
+
+def _mock_apis(test_func):
+    """
+    Give a `_MockedAPIs` object to the test and route calls of the shared HTTP client through it.
+    """
+
+    @functools.wraps(test_func)
+    def wrapper(self):
+        m = _MockedAPIs()
+        client = httpx.Client(transport=httpx.MockTransport(m.handler))
+        with mock.patch("itou.external_data.apis.pe_connect.get_client", return_value=client):
+            return test_func(self, m)
+
+    return wrapper
+
+
 def _status_ok(m):
     m.get(_url_for_key(pec.ESD_USERINFO_API), text=json.dumps(_RESP_USER_INFO))
     m.get(_url_for_key(pec.ESD_BIRTHDATE_API), text=json.dumps(_RESP_USER_BIRTHDATE))
@@ -89,7 +124,7 @@ def _status_failed(m):
 
 
 class ExternalDataImportTest(TestCase):
-    @requests_mock.Mocker()
+    @_mock_apis
     def test_status_ok(self, m):
         user = JobSeekerFactory()
 
@@ -107,7 +142,7 @@ class ExternalDataImportTest(TestCase):
         self.assertEqual(6, len(report.get("fields_updated")))
         self.assertEqual(12, len(report.get("fields_fetched")))
 
-    @requests_mock.Mocker()
+    @_mock_apis
     def test_status_partial(self, m):
         user = JobSeekerFactory()
         _status_partial(m)
@@ -125,7 +160,7 @@ class ExternalDataImportTest(TestCase):
         self.assertEqual(9, len(report.get("fields_fetched")))
         self.assertEqual(2, len(report.get("fields_failed")))
 
-    @requests_mock.Mocker()
+    @_mock_apis
     def test_status_failed(self, m):
         user = JobSeekerFactory()
         _status_failed(m)
@@ -138,9 +173,26 @@ class ExternalDataImportTest(TestCase):
         self.assertEqual(0, len(report.get("fields_fetched")))
         self.assertEqual(0, len(report.get("fields_failed")))
 
+    @_mock_apis
+    def test_report_api_calls(self, m):
+        user = JobSeekerFactory()
+        _status_partial(m)
+        m.get(_url_for_key(pec.ESD_STATUS_API), exc=httpx.ConnectTimeout)
+
+        result = import_user_pe_data(user, FOO_TOKEN)
+        self.assertEqual(result.status, ExternalDataImport.STATUS_PARTIAL)
+
+        api_calls = result.report.get("api_calls")
+        self.assertCountEqual(_API_KEYS, api_calls.keys())
+        self.assertEqual(200, api_calls[pec.ESD_USERINFO_API]["status"])
+        self.assertEqual(503, api_calls[pec.ESD_COMPENSATION_API]["status"])
+        self.assertEqual("ConnectTimeout", api_calls[pec.ESD_STATUS_API]["status"])
+        for api_call in api_calls.values():
+            self.assertGreaterEqual(api_call["duration_ms"], 0)
+
 
 class JobSeekerExternalDataTest(TestCase):
-    @requests_mock.Mocker()
+    @_mock_apis
     def test_import_ok(self, m):
         _status_ok(m)
 
@@ -179,7 +231,7 @@ class JobSeekerExternalDataTest(TestCase):
         self.assertNotIn(f"User/{user.pk}/birthdate", report.get("fields_updated"))
         self.assertEqual(birthdate, user.birthdate)
 
-    @requests_mock.Mocker()
+    @_mock_apis
     def test_import_partial(self, m):
         _status_partial(m)
 
@@ -197,7 +249,7 @@ class JobSeekerExternalDataTest(TestCase):
         self.assertEqual(user.address_line_2, "The cupboard under the stairs")
         self.assertNotEqual(str(user.birthdate), "1970-01-01")
 
-    @requests_mock.Mocker()
+    @_mock_apis
     def test_import_failed(self, m):
         _status_failed(m)
 
@@ -210,7 +262,7 @@ class JobSeekerExternalDataTest(TestCase):
         self.assertIsNone(data.is_pe_jobseeker)
         self.assertIsNone(data.has_minimal_social_allowance)
 
-    @requests_mock.Mocker()
+    @_mock_apis
     def test_has_external_data(self, m):
         _status_ok(m)
 
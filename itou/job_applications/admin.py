@@ -54,6 +54,7 @@ class JobApplicationAdmin(admin.ModelAdmin):
     readonly_fields = (
         "created_at",
         "updated_at",
+        "last_change_at",
         "approval_number_sent_at",
         "approval_manually_delivered_by",
         "approval_manually_refused_by",
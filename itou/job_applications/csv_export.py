@@ -1,6 +1,10 @@
 import csv
 
+from django.db.models import prefetch_related_objects
+
+from itou.approvals.models import ApprovalsWrapper
 from itou.eligibility.models import EligibilityDiagnosis
+from itou.utils.iterators import chunked_iterator
 
 
 JOB_APPLICATION_CSV_HEADERS = [
@@ -29,6 +33,21 @@ JOB_APPLICATION_CSV_HEADERS = [
 
 DATE_FMT = "%d/%m/%Y"
 
+# Number of job applications fetched (and enriched with bulk queries) at a time.
+BATCH_SIZE = 1000
+
+
+class _EchoBuffer:
+    """
+    A file-like object implementing only `write`, returning the written value
+    instead of storing it, so that `csv.writer` can be used with a
+    `StreamingHttpResponse`.
+    https://docs.djangoproject.com/en/dev/howto/outputting-csv/#streaming-large-csv-files
+    """
+
+    def write(self, value):
+        return value
+
 
 def _format_date(dt):
     return dt.strftime(DATE_FMT) if dt else ""
@@ -44,21 +63,39 @@ def _get_prescriber_name(job_application):
 
 
 def _get_selected_jobs(job_application):
-    selected_jobs = "Candidature spontanée"
-    if job_application.selected_jobs.exists:
-        selected_jobs = " ".join(map(lambda j: j.display_name, job_application.selected_jobs.all()))
-    return selected_jobs
-
-
-def _get_eligibility_status(job_application):
-    eligibility = "non"
-    if EligibilityDiagnosis.objects.has_considered_valid(job_seeker=job_application.job_seeker):
-        eligibility = "oui"
+    # Relies on `selected_jobs__appellation` being prefetched for the whole batch.
+    selected_jobs = job_application.selected_jobs.all()
+    if not selected_jobs:
+        return "Candidature spontanée"
+    return " ".join(job.display_name for job in selected_jobs)
 
-    return eligibility
 
+def _get_eligible_job_seeker_ids(job_seekers, approvals_wrappers):
+    """
+    Returns the set of ids of the given job seekers having a considered valid
+    eligibility diagnosis, in two queries.
 
-def _job_application_as_dict(job_application):
+    Bulk equivalent of `EligibilityDiagnosis.objects.has_considered_valid(job_seeker)`:
+    - a valid Pôle emploi approval implies a diagnosis made outside of Itou
+    - during a valid approval, any diagnosis is considered valid
+    - otherwise, only non expired diagnoses made by a prescriber are considered
+    """
+    diagnoses = EligibilityDiagnosis.objects.filter(job_seeker__in=job_seekers).order_by()
+    with_any_diagnosis = set(diagnoses.values_list("job_seeker_id", flat=True).distinct())
+    with_valid_prescriber_diagnosis = set(
+        diagnoses.valid().by_author_kind_prescriber().values_list("job_seeker_id", flat=True).distinct()
+    )
+
+    eligible_ids = set(with_valid_prescriber_diagnosis)
+    for job_seeker_id, approvals_wrapper in approvals_wrappers.items():
+        if not approvals_wrapper.has_valid:
+            continue
+        if approvals_wrapper.has_valid_pole_emploi_eligibility_diagnosis or job_seeker_id in with_any_diagnosis:
+            eligible_ids.add(job_seeker_id)
+    return eligible_ids
+
+
+def _job_application_as_dict(job_application, approvals_wrapper, is_eligible):
     """
     The main CSV export mthod: it converts a JobApplication into a CSV array data
     """
@@ -68,8 +105,8 @@ def _job_application_as_dict(job_application):
     numero_pass_iae = ""
     approval_start_date = None
     approval_end_date = None
-    if job_seeker.approvals_wrapper.has_valid and job_seeker.approvals_wrapper.latest_approval is not None:
-        approval = job_seeker.approvals_wrapper.latest_approval
+    if approvals_wrapper.has_valid and approvals_wrapper.latest_approval is not None:
+        approval = approvals_wrapper.latest_approval
         numero_pass_iae = approval.number
         approval_start_date = approval.start_at
         approval_end_date = approval.end_at
@@ -92,22 +129,52 @@ def _job_application_as_dict(job_application):
         "Dates de début d’embauche": _format_date(job_application.hiring_start_at),
         "Dates de fin d’embauche": _format_date(job_application.hiring_end_at),
         "Motifs de refus": job_application.get_refusal_reason_display(),
-        "Éligibilité IAE validée": _get_eligibility_status(job_application),
+        "Éligibilité IAE validée": "oui" if is_eligible else "non",
         "Numéro Pass IAE": numero_pass_iae,
         "Début Pass IAE": _format_date(approval_start_date),
         "Fin Pass IAE": _format_date(approval_end_date),
     }
 
 
+def _iter_rows(job_applications):
+    """
+    Yield CSV rows, fetching job applications by batches of `BATCH_SIZE`.
+
+    Related data (selected jobs, approvals and eligibility) is loaded in bulk
+    for each batch, so the number of queries does not depend on the number of rows.
+    """
+    job_applications = job_applications.select_related(
+        "job_seeker", "sender", "sender_prescriber_organization", "to_siae__convention"
+    )
+    # `prefetch_related()` is ignored by `iterator()`: prefetch manually for each batch instead.
+    for batch in chunked_iterator(job_applications.iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+        prefetch_related_objects(batch, "selected_jobs__appellation")
+        job_seekers = list({ja.job_seeker_id: ja.job_seeker for ja in batch}.values())
+        approvals_wrappers = ApprovalsWrapper.for_users(job_seekers)
+        eligible_job_seeker_ids = _get_eligible_job_seeker_ids(job_seekers, approvals_wrappers)
+        for job_application in batch:
+            job_seeker_id = job_application.job_seeker_id
+            yield _job_application_as_dict(
+                job_application, approvals_wrappers[job_seeker_id], job_seeker_id in eligible_job_seeker_ids
+            )
+
+
 def generate_csv_export(job_applications, stream):
     """
     Takes a list of job application, converts them to CSV and writes them in the provided stream
     The stream can be for instance an http response, a string (io.StringIO()) or a file
     """
-
-    rows = [_job_application_as_dict(job_application) for job_application in job_applications.iterator()]
-
     writer = csv.DictWriter(stream, quoting=csv.QUOTE_ALL, fieldnames=JOB_APPLICATION_CSV_HEADERS)
-
     writer.writeheader()
-    writer.writerows(rows)
+    writer.writerows(_iter_rows(job_applications))
+
+
+def stream_csv_export(job_applications):
+    """
+    Generator yielding the CSV export of the given job applications line by line.
+    Meant to be used as the content of a `StreamingHttpResponse`.
+    """
+    writer = csv.DictWriter(_EchoBuffer(), quoting=csv.QUOTE_ALL, fieldnames=JOB_APPLICATION_CSV_HEADERS)
+    yield writer.writeheader()
+    for row in _iter_rows(job_applications):
+        yield writer.writerow(row)
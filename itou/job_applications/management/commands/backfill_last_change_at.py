@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Greatest
+
+from itou.job_applications.models import JobApplication, JobApplicationTransitionLog
+from itou.utils.iterators import chunks
+
+
+class Command(BaseCommand):
+    """
+    Fill `JobApplication.last_change_at` with the date of the last transition log,
+    or the creation date when there is none.
+
+    Existing job applications were filled by migration 0030: this command fixes job applications
+    saved without it since (e.g. by `bulk_create()`), or all of them with `--all`.
+
+    Only job applications without `last_change_at` are processed, unless `--all` is given.
+
+    To run the command:
+        django-admin backfill_last_change_at
+        django-admin backfill_last_change_at --all
+    """
+
+    help = "Fill the date of the last change of job applications."
+
+    # Number of job applications updated at once
+    BATCH_SIZE = 5000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", dest="all", action="store_true", help="Also update job applications having a last change date"
+        )
+
+    def handle(self, all=False, **options):
+        job_applications = JobApplication.objects.all()
+        if not all:
+            job_applications = job_applications.filter(last_change_at=None)
+
+        last_log_timestamp = (
+            JobApplicationTransitionLog.objects.filter(job_application=OuterRef("pk"))
+            .order_by("-timestamp")
+            .values("timestamp")[:1]
+        )
+        pks = list(job_applications.values_list("pk", flat=True))
+
+        for i, batch_pks in enumerate(chunks(pks, self.BATCH_SIZE), 1):
+            # PostgreSQL's GREATEST ignores NULL values: the creation date is used without logs.
+            JobApplication.objects.filter(pk__in=batch_pks).update(
+                last_change_at=Greatest("created_at", Subquery(last_log_timestamp))
+            )
+            self.stdout.write(f"Processed {min(i * self.BATCH_SIZE, len(pks))}/{len(pks)} job applications")
+
+        self.stdout.write("Done.")
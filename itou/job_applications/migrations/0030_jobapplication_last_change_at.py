@@ -0,0 +1,36 @@
+# Generated by Django 3.2.2 on 2021-06-14 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("job_applications", "0029_auto_20210223_1528"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobapplication",
+            name="last_change_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, null=True, verbose_name="Date du dernier changement d'état"
+            ),
+        ),
+        # Date of the last transition log, or the creation date without logs (GREATEST ignores NULL values).
+        migrations.RunSQL(
+            sql="""
+            UPDATE job_applications_jobapplication AS job_application
+            SET last_change_at = GREATEST(
+                job_application.created_at,
+                (
+                    SELECT MAX(log.timestamp)
+                    FROM job_applications_jobapplicationtransitionlog AS log
+                    WHERE log.job_application_id = job_application.id
+                )
+            )
+            WHERE job_application.last_change_at IS NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.2 on 2021-06-14 11:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built without blocking writes to the table, which can't be done in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("job_applications", "0030_jobapplication_last_change_at"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="jobapplication",
+            index=models.Index(fields=["to_siae", "-created_at"], name="job_app_to_siae_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="jobapplication",
+            index=models.Index(fields=["to_siae", "state"], name="job_app_to_siae_state_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="jobapplication",
+            index=models.Index(fields=["job_seeker", "-created_at"], name="job_app_job_seeker_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="jobapplication",
+            index=models.Index(
+                fields=["sender_prescriber_organization", "-created_at"], name="job_app_sender_org_created_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="jobapplication",
+            index=models.Index(
+                condition=models.Q(sender_prescriber_organization=None),
+                fields=["sender", "-created_at"],
+                name="job_app_sender_no_org_idx",
+            ),
+        ),
+    ]
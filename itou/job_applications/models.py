@@ -2,12 +2,13 @@ import datetime
 import logging
 import uuid
 
+import xworkflows
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core import mail
-from django.db import models
-from django.db.models import BooleanField, Case, Count, Exists, Max, OuterRef, When
-from django.db.models.functions import Greatest, TruncMonth
+from django.db import models, transaction
+from django.db.models import BooleanField, Case, Count, Exists, F, OuterRef, Q, When
+from django.db.models.functions import TruncMonth
 from django.urls import reverse
 from django.utils import timezone
 from django_xworkflows import models as xwf_models
@@ -131,14 +132,14 @@ class JobApplicationQuerySet(models.QuerySet):
         return self.annotate(has_suspended_approval=Exists(has_suspended_approval))
 
     def with_last_change(self):
-        return self.annotate(last_change=Greatest("created_at", Max("logs__timestamp")))
+        return self.annotate(last_change=F("last_change_at"))
 
     def with_is_pending_for_too_long(self):
         freshness_limit = timezone.now() - relativedelta(weeks=self.model.WEEKS_BEFORE_CONSIDERED_OLD)
         pending_states = JobApplicationWorkflow.PENDING_STATES
-        return self.with_last_change().annotate(
+        return self.annotate(
             is_pending_for_too_long=Case(
-                When(last_change__lt=freshness_limit, state__in=pending_states, then=True),
+                When(last_change_at__lt=freshness_limit, state__in=pending_states, then=True),
                 default=False,
                 output_field=BooleanField(),
             )
@@ -174,6 +175,15 @@ class JobApplicationQuerySet(models.QuerySet):
             .order_by("-month")
         )
 
+    def count_by_state(self):
+        """
+        Returns a dict {state: amount of job applications in this state},
+        computed in a single grouped query. States without job applications are missing.
+        Not chainable.
+        """
+        # Clear the default ordering, which would be added to the GROUP BY clause.
+        return dict(self.order_by().values_list("state").annotate(c=Count("pk")))
+
 
 class JobApplication(xwf_models.WorkflowEnabled, models.Model):
     """
@@ -356,6 +366,11 @@ class JobApplication(xwf_models.WorkflowEnabled, models.Model):
 
     created_at = models.DateTimeField(verbose_name="Date de création", default=timezone.now, db_index=True)
     updated_at = models.DateTimeField(verbose_name="Date de modification", blank=True, null=True, db_index=True)
+    # Date of the last transition, or of the creation. Denormalized from `logs` to be filtered on
+    # and sorted by without aggregating logs. Filled for old rows by migration 0030.
+    last_change_at = models.DateTimeField(
+        verbose_name="Date du dernier changement d'état", blank=True, null=True, db_index=True
+    )
 
     objects = models.Manager.from_queryset(JobApplicationQuerySet)()
 
@@ -363,6 +378,22 @@ class JobApplication(xwf_models.WorkflowEnabled, models.Model):
         verbose_name = "Candidature"
         verbose_name_plural = "Candidatures"
         ordering = ["-created_at"]
+        # Lists of job applications (and their exports) are filtered by recipient or sender
+        # and ordered by creation date, see `itou.www.apply.views.list_views`.
+        indexes = [
+            models.Index(fields=["to_siae", "-created_at"], name="job_app_to_siae_created_idx"),
+            models.Index(fields=["to_siae", "state"], name="job_app_to_siae_state_idx"),
+            models.Index(fields=["job_seeker", "-created_at"], name="job_app_job_seeker_created_idx"),
+            models.Index(
+                fields=["sender_prescriber_organization", "-created_at"], name="job_app_sender_org_created_idx"
+            ),
+            # Applications sent by prescribers without organization.
+            models.Index(
+                fields=["sender", "-created_at"],
+                name="job_app_sender_no_org_idx",
+                condition=Q(sender_prescriber_organization=None),
+            ),
+        ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -372,6 +403,8 @@ class JobApplication(xwf_models.WorkflowEnabled, models.Model):
 
     def save(self, *args, **kwargs):
         self.updated_at = timezone.now()
+        if self._state.adding and not self.last_change_at:
+            self.last_change_at = self.created_at
         return super().save(*args, **kwargs)
 
     @property
@@ -487,6 +520,11 @@ class JobApplication(xwf_models.WorkflowEnabled, models.Model):
 
     # Workflow transitions.
 
+    @xworkflows.before_transition()
+    def set_last_change_at(self, *args, **kwargs):
+        # Saved with the new state, and used as the timestamp of the transition log.
+        self.last_change_at = timezone.now()
+
     @xwf_models.transition()
     def process(self, *args, **kwargs):
         pass
@@ -496,13 +534,6 @@ class JobApplication(xwf_models.WorkflowEnabled, models.Model):
 
         accepted_by = kwargs.get("user")
 
-        # Mark other related job applications as obsolete.
-        for job_application in self.job_seeker.job_applications.exclude(pk=self.pk).pending():
-            job_application.render_obsolete(*args, **kwargs)
-
-        # Notification email.
-        emails = [self.email_accept]
-
         # Approval issuance logic.
         if not self.hiring_without_approval and self.to_siae.is_subject_to_eligibility_rules:
 
@@ -519,7 +550,6 @@ class JobApplication(xwf_models.WorkflowEnabled, models.Model):
                     # As a job seeker can have multiple contracts at the same time,
                     # the approval should start at the same time as most recent contract.
                     self.approval.update_start_date(new_start_date=self.hiring_start_at)
-                emails.append(self.email_deliver_approval(accepted_by))
             elif (
                 self.job_seeker.pole_emploi_id
                 or self.job_seeker.lack_of_pole_emploi_id_reason == self.job_seeker.REASON_NOT_REGISTERED
@@ -532,23 +562,41 @@ class JobApplication(xwf_models.WorkflowEnabled, models.Model):
                 )
                 new_approval.save()
                 self.approval = new_approval
-                emails.append(self.email_deliver_approval(accepted_by))
             elif self.job_seeker.lack_of_pole_emploi_id_reason == self.job_seeker.REASON_FORGOTTEN:
                 # Trigger a manual approval creation.
                 self.approval_delivery_mode = self.APPROVAL_DELIVERY_MODE_MANUAL
-                emails.append(self.email_manual_approval_delivery_required_notification(accepted_by))
             else:
                 raise xwf_models.AbortTransition("Job seeker has an invalid PE status, cannot issue approval.")
 
-        # Send emails in batch.
-        connection = mail.get_connection()
-        connection.send_messages(emails)
-
         if self.approval:
+            if not accepted_by:
+                raise RuntimeError("Unable to determine the recipient email address.")
             self.approval_number_sent_by_email = True
             self.approval_number_sent_at = timezone.now()
             self.approval_delivery_mode = self.APPROVAL_DELIVERY_MODE_AUTOMATIC
 
+    @xworkflows.after_transition(JobApplicationWorkflow.TRANSITION_ACCEPT)
+    def enqueue_accept_side_effects(self, *args, **kwargs):
+        """
+        Obsoleting other pending job applications and sending emails are
+        deferred to Huey once the acceptance is committed so that the request
+        only waits for the state change and the approval allocation.
+        """
+        from itou.job_applications.tasks import (
+            huey_notify_job_application_accepted,
+            huey_render_obsolete_job_applications,
+        )
+
+        accepted_by = kwargs.get("user")
+        user_pk = accepted_by.pk if accepted_by else None
+        idempotency_key = uuid.uuid4().hex
+
+        def enqueue():
+            huey_render_obsolete_job_applications(self.pk, user_pk=user_pk)
+            huey_notify_job_application_accepted(self.pk, idempotency_key, user_pk=user_pk)
+
+        transaction.on_commit(enqueue)
+
     @xwf_models.transition()
     def refuse(self, *args, **kwargs):
         # Send notification.
@@ -701,6 +749,12 @@ class JobApplicationTransitionLog(xwf_models.BaseTransitionLog):
     def __str__(self):
         return str(self.id)
 
+    @classmethod
+    def log_transition(cls, transition, from_state, to_state, modified_object, **kwargs):
+        # Keep the log in sync with `JobApplication.last_change_at`.
+        kwargs.setdefault("timestamp", modified_object.last_change_at)
+        return super().log_transition(transition, from_state, to_state, modified_object, **kwargs)
+
     @property
     def pretty_to_state(self):
         choices = dict(JobApplicationWorkflow.STATE_CHOICES)
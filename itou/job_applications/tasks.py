@@ -0,0 +1,83 @@
+from django.core import mail
+from django.db import transaction
+from django.utils import timezone
+from huey.contrib.djhuey import HUEY, db_task
+
+from itou.job_applications.models import JobApplication, JobApplicationTransitionLog, JobApplicationWorkflow
+from itou.users.models import User
+
+
+# Side effects of `JobApplication.accept()` are run by Huey once the acceptance
+# is committed. Tasks are retried because a worker may be restarted while
+# processing them (deployment, scaling…).
+RETRIES = 3
+RETRY_DELAY = 30  # Seconds.
+
+
+@db_task(retries=RETRIES, retry_delay=RETRY_DELAY)
+def huey_render_obsolete_job_applications(job_application_pk, user_pk=None):
+    """
+    Mark all other pending job applications of the job seeker as obsolete
+    with a bulk update, and log the transitions with a bulk insert.
+
+    Idempotent: only job applications that are still pending are updated,
+    a retry (or a duplicate task) is a no-op.
+    """
+    job_application = JobApplication.objects.only("job_seeker_id").get(pk=job_application_pk)
+    with transaction.atomic():
+        job_applications = list(
+            JobApplication.objects.filter(job_seeker_id=job_application.job_seeker_id)
+            .exclude(pk=job_application_pk)
+            .pending()
+            .select_for_update()
+            .only("pk", "state")
+        )
+        if not job_applications:
+            return
+        now = timezone.now()
+        JobApplication.objects.filter(pk__in=[obj.pk for obj in job_applications]).update(
+            state=JobApplicationWorkflow.STATE_OBSOLETE, updated_at=now, last_change_at=now
+        )
+        JobApplicationTransitionLog.objects.bulk_create(
+            [
+                JobApplicationTransitionLog(
+                    job_application_id=obj.pk,
+                    transition=JobApplicationWorkflow.TRANSITION_RENDER_OBSOLETE,
+                    from_state=obj.state.name,
+                    to_state=JobApplicationWorkflow.STATE_OBSOLETE,
+                    timestamp=now,
+                    user_id=user_pk,
+                )
+                for obj in job_applications
+            ]
+        )
+
+
+@db_task(retries=RETRIES, retry_delay=RETRY_DELAY)
+def huey_notify_job_application_accepted(job_application_pk, idempotency_key, user_pk=None):
+    """
+    Build and send the emails of an accepted job application.
+
+    `idempotency_key` is generated once per acceptance: it's stored in Huey's
+    storage after the emails have been handed over to the email backend so
+    that a retried or duplicated task does not notify people twice.
+    """
+    storage_key = f"job_application_accepted_emails:{idempotency_key}"
+    if HUEY.get(storage_key, peek=True):
+        return
+
+    job_application = JobApplication.objects.select_related(
+        "approval", "job_seeker", "sender", "sender_prescriber_organization", "sender_siae", "to_siae"
+    ).get(pk=job_application_pk)
+    accepted_by = User.objects.get(pk=user_pk) if user_pk else None
+
+    emails = [job_application.email_accept]
+    if job_application.approval:
+        emails.append(job_application.email_deliver_approval(accepted_by))
+    elif job_application.approval_delivery_mode == JobApplication.APPROVAL_DELIVERY_MODE_MANUAL:
+        emails.append(job_application.email_manual_approval_delivery_required_notification(accepted_by))
+
+    connection = mail.get_connection()
+    connection.send_messages(emails)
+
+    HUEY.put(storage_key, True)
@@ -4,15 +4,18 @@ from unittest.mock import PropertyMock, patch
 
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
-from django.core import mail
+from django.core import mail, management
+from django.db import connection
+from django.db.models import Q
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django_xworkflows import models as xwf_models
 
 from itou.approvals.factories import ApprovalFactory, PoleEmploiApprovalFactory
 from itou.eligibility.models import EligibilityDiagnosis
-from itou.job_applications.csv_export import generate_csv_export
+from itou.job_applications.csv_export import generate_csv_export, stream_csv_export
 from itou.job_applications.factories import (
     JobApplicationFactory,
     JobApplicationSentByAuthorizedPrescriberOrganizationFactory,
@@ -27,10 +30,12 @@ from itou.job_applications.models import JobApplication, JobApplicationWorkflow
 from itou.job_applications.notifications import NewQualifiedJobAppEmployersNotification
 from itou.jobs.factories import create_test_romes_and_appellations
 from itou.jobs.models import Appellation
+from itou.prescribers.factories import PrescriberOrganizationWithMembershipFactory
 from itou.siaes.factories import SiaeFactory, SiaeWithMembershipAndJobsFactory
 from itou.siaes.models import Siae
 from itou.users.factories import JobSeekerFactory, SiaeStaffFactory, UserFactory
 from itou.users.models import User
+from itou.utils.profiling.assertions import QueryPlanAssertionsMixin
 from itou.utils.templatetags import format_filters
 
 
@@ -206,6 +211,42 @@ class JobApplicationQuerySetTest(TestCase):
         qs = JobApplication.objects.with_is_pending_for_too_long().get(pk=job_app.pk)
         self.assertFalse(qs.is_pending_for_too_long)
 
+    def test_last_change_at(self):
+        created_at = timezone.now() - relativedelta(days=5)
+        job_app = JobApplicationSentByJobSeekerFactory(created_at=created_at)
+        self.assertEqual(job_app.last_change_at, created_at)
+
+        job_app.process()
+        job_app.refresh_from_db()
+        self.assertGreater(job_app.last_change_at, created_at)
+        self.assertEqual(job_app.last_change_at, job_app.logs.get().timestamp)
+
+    def test_backfill_last_change_at(self):
+        job_app = JobApplicationSentByJobSeekerFactory()
+        job_app.process()
+        processed_at = job_app.logs.get().timestamp
+        other_job_app = JobApplicationSentByJobSeekerFactory()
+        JobApplication.objects.update(last_change_at=None)
+
+        management.call_command("backfill_last_change_at", stdout=io.StringIO())
+        job_app.refresh_from_db()
+        other_job_app.refresh_from_db()
+        self.assertEqual(job_app.last_change_at, processed_at)
+        self.assertEqual(other_job_app.last_change_at, other_job_app.created_at)
+
+    def test_count_by_state(self):
+        siae = SiaeFactory()
+        JobApplicationSentByJobSeekerFactory.create_batch(2, to_siae=siae)
+        JobApplicationSentByJobSeekerFactory(to_siae=siae, state=JobApplicationWorkflow.STATE_ACCEPTED)
+        # Another SIAE.
+        JobApplicationSentByJobSeekerFactory(state=JobApplicationWorkflow.STATE_ACCEPTED)
+
+        with self.assertNumQueries(1):
+            counts_by_state = siae.job_applications_received.count_by_state()
+        self.assertEqual(
+            counts_by_state, {JobApplicationWorkflow.STATE_NEW: 2, JobApplicationWorkflow.STATE_ACCEPTED: 1}
+        )
+
 
 class JobApplicationFactoriesTest(TestCase):
     def test_job_application_factory(self):
@@ -643,7 +684,8 @@ class JobApplicationWorkflowTest(TestCase):
         self.assertEqual(job_seeker.job_applications.pending().count(), 4)
 
         job_application = job_seeker.job_applications.filter(state=JobApplicationWorkflow.STATE_PROCESSING).first()
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
 
         self.assertEqual(job_seeker.job_applications.filter(state=JobApplicationWorkflow.STATE_ACCEPTED).count(), 1)
         self.assertEqual(job_seeker.job_applications.filter(state=JobApplicationWorkflow.STATE_OBSOLETE).count(), 3)
@@ -670,7 +712,8 @@ class JobApplicationWorkflowTest(TestCase):
         self.assertEqual(job_seeker.job_applications.count(), 6)
 
         job_application = job_seeker.job_applications.filter(state=JobApplicationWorkflow.STATE_OBSOLETE).first()
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
 
         self.assertEqual(job_seeker.job_applications.filter(state=JobApplicationWorkflow.STATE_ACCEPTED).count(), 2)
         self.assertEqual(job_seeker.job_applications.filter(state=JobApplicationWorkflow.STATE_OBSOLETE).count(), 4)
@@ -680,6 +723,48 @@ class JobApplicationWorkflowTest(TestCase):
         self.assertIn("Candidature acceptée", mail.outbox[0].subject)
         self.assertIn("PASS IAE pour", mail.outbox[1].subject)
 
+    def test_accept_side_effects_are_deferred_until_commit(self):
+        job_seeker = JobSeekerFactory()
+        kwargs = {"job_seeker": job_seeker, "sender": job_seeker, "sender_kind": JobApplication.SENDER_KIND_JOB_SEEKER}
+        job_application = JobApplicationFactory(state=JobApplicationWorkflow.STATE_PROCESSING, **kwargs)
+        other_job_application = JobApplicationFactory(state=JobApplicationWorkflow.STATE_NEW, **kwargs)
+        user = job_application.to_siae.members.first()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            job_application.accept(user=user)
+            # Nothing happens before the transaction is committed.
+            other_job_application.refresh_from_db()
+            self.assertTrue(other_job_application.state.is_new)
+            self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+
+        other_job_application.refresh_from_db()
+        self.assertTrue(other_job_application.state.is_obsolete)
+        log = other_job_application.logs.get()
+        self.assertEqual(log.transition, JobApplicationWorkflow.TRANSITION_RENDER_OBSOLETE)
+        self.assertEqual(log.from_state, JobApplicationWorkflow.STATE_NEW)
+        self.assertEqual(log.to_state, JobApplicationWorkflow.STATE_OBSOLETE)
+        self.assertEqual(log.user, user)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_accept_side_effects_are_idempotent(self):
+        job_seeker = JobSeekerFactory()
+        kwargs = {"job_seeker": job_seeker, "sender": job_seeker, "sender_kind": JobApplication.SENDER_KIND_JOB_SEEKER}
+        job_application = JobApplicationFactory(state=JobApplicationWorkflow.STATE_PROCESSING, **kwargs)
+        other_job_application = JobApplicationFactory(state=JobApplicationWorkflow.STATE_NEW, **kwargs)
+        user = job_application.to_siae.members.first()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            job_application.accept(user=user)
+        # Simulate a retry of the same tasks.
+        callbacks[0]()
+        callbacks[0]()
+
+        self.assertEqual(other_job_application.logs.count(), 1)
+        self.assertEqual(len(mail.outbox), 2)
+
     def test_accept_job_application_sent_by_job_seeker_with_valid_approval(self):
         job_seeker = JobSeekerFactory()
         pe_approval = PoleEmploiApprovalFactory(
@@ -688,7 +773,8 @@ class JobApplicationWorkflowTest(TestCase):
         job_application = JobApplicationSentByJobSeekerFactory(
             job_seeker=job_seeker, state=JobApplicationWorkflow.STATE_PROCESSING
         )
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
         self.assertIsNotNone(job_application.approval)
         self.assertEqual(job_application.approval.number, pe_approval.number)
         self.assertTrue(job_application.approval_number_sent_by_email)
@@ -705,7 +791,8 @@ class JobApplicationWorkflowTest(TestCase):
         job_application = JobApplicationSentByJobSeekerFactory(
             job_seeker=job_seeker, state=JobApplicationWorkflow.STATE_PROCESSING
         )
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
         self.assertIsNone(job_application.approval)
         self.assertEqual(job_application.approval_delivery_mode, JobApplication.APPROVAL_DELIVERY_MODE_MANUAL)
         # Check sent email.
@@ -719,7 +806,8 @@ class JobApplicationWorkflowTest(TestCase):
         )
         # A valid Pôle emploi ID should trigger an automatic approval delivery.
         self.assertNotEqual(job_application.job_seeker.pole_emploi_id, "")
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
         self.assertIsNotNone(job_application.approval)
         self.assertTrue(job_application.approval_number_sent_by_email)
         self.assertEqual(job_application.approval_delivery_mode, job_application.APPROVAL_DELIVERY_MODE_AUTOMATIC)
@@ -743,7 +831,8 @@ class JobApplicationWorkflowTest(TestCase):
         )
         # A valid Pôle emploi ID should trigger an automatic approval delivery.
         self.assertNotEqual(job_application.job_seeker.pole_emploi_id, "")
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
         self.assertIsNotNone(job_application.approval)
         self.assertTrue(job_application.approval_number_sent_by_email)
         self.assertEqual(job_application.approval_delivery_mode, job_application.APPROVAL_DELIVERY_MODE_AUTOMATIC)
@@ -766,7 +855,8 @@ class JobApplicationWorkflowTest(TestCase):
         )
         # A valid Pôle emploi ID should trigger an automatic approval delivery.
         self.assertNotEqual(job_application.job_seeker.pole_emploi_id, "")
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
         self.assertIsNotNone(job_application.approval)
         self.assertTrue(job_application.approval_number_sent_by_email)
         self.assertEqual(job_application.approval_delivery_mode, job_application.APPROVAL_DELIVERY_MODE_AUTOMATIC)
@@ -796,7 +886,8 @@ class JobApplicationWorkflowTest(TestCase):
         )
         # A valid Pôle emploi ID should trigger an automatic approval delivery.
         self.assertNotEqual(job_application.job_seeker.pole_emploi_id, "")
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
         self.assertTrue(job_application.to_siae.is_subject_to_eligibility_rules)
         self.assertIsNotNone(job_application.approval)
         self.assertTrue(job_application.approval_number_sent_by_email)
@@ -815,7 +906,8 @@ class JobApplicationWorkflowTest(TestCase):
         job_application = JobApplicationWithoutApprovalFactory(state=JobApplicationWorkflow.STATE_PROCESSING)
         # A valid Pôle emploi ID should trigger an automatic approval delivery.
         self.assertNotEqual(job_application.job_seeker.pole_emploi_id, "")
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
         self.assertTrue(job_application.to_siae.is_subject_to_eligibility_rules)
         self.assertIsNone(job_application.approval)
         self.assertFalse(job_application.approval_number_sent_by_email)
@@ -828,7 +920,8 @@ class JobApplicationWorkflowTest(TestCase):
         job_application = JobApplicationSentByAuthorizedPrescriberOrganizationFactory(
             state=JobApplicationWorkflow.STATE_PROCESSING, to_siae__kind=Siae.KIND_GEIQ
         )
-        job_application.accept(user=job_application.to_siae.members.first())
+        with self.captureOnCommitCallbacks(execute=True):
+            job_application.accept(user=job_application.to_siae.members.first())
         self.assertFalse(job_application.to_siae.is_subject_to_eligibility_rules)
         self.assertIsNone(job_application.approval)
         self.assertFalse(job_application.approval_number_sent_by_email)
@@ -959,3 +1052,177 @@ class JobApplicationCsvExportTest(TestCase):
 
         self.assertIn("Candidature déclinée", csv_output.getvalue())
         self.assertIn("Candidat non venu ou non joignable", csv_output.getvalue())
+
+    def test_csv_export_number_of_queries_does_not_depend_on_rows(self):
+        JobApplicationFactory()
+        JobApplicationWithApprovalFactory()
+
+        with CaptureQueriesContext(connection) as context:
+            generate_csv_export(JobApplication.objects, io.StringIO())
+        num_queries = len(context.captured_queries)
+
+        JobApplicationFactory.create_batch(3)
+        JobApplicationWithApprovalFactory.create_batch(3)
+        job_seeker = JobSeekerFactory()
+        PoleEmploiApprovalFactory(pole_emploi_id=job_seeker.pole_emploi_id, birthdate=job_seeker.birthdate)
+        JobApplicationFactory(job_seeker=job_seeker)
+
+        with self.assertNumQueries(num_queries):
+            generate_csv_export(JobApplication.objects, io.StringIO())
+
+    def test_stream_csv_export(self):
+        job_application = JobApplicationWithApprovalFactory()
+
+        csv_output = io.StringIO()
+        generate_csv_export(JobApplication.objects, csv_output)
+
+        streamed_output = "".join(stream_csv_export(JobApplication.objects))
+        self.assertEqual(streamed_output, csv_output.getvalue())
+        self.assertIn(job_application.approval.number, streamed_output)
+
+
+class JobApplicationQueryPlansTest(QueryPlanAssertionsMixin, TestCase):
+    """
+    Check that the queries of job application lists, exports and filters use indexes
+    and only read the rows of one recipient or sender.
+    """
+
+    NB_JOB_APPLICATIONS = 2000
+    # Each SIAE, organization or job seeker has less than 10% of job applications.
+    MAX_ROWS = NB_JOB_APPLICATIONS // 10
+
+    @classmethod
+    def setUpTestData(cls):
+        siaes = SiaeFactory.create_batch(20)
+        organizations = PrescriberOrganizationWithMembershipFactory.create_batch(10)
+        job_seekers = JobSeekerFactory.create_batch(50)
+        prescribers = {organization.pk: organization.members.first() for organization in organizations}
+        states = [state.name for state in JobApplicationWorkflow.states]
+
+        job_applications = []
+        for i in range(cls.NB_JOB_APPLICATIONS):
+            job_seeker = job_seekers[i % len(job_seekers)]
+            # A third of job applications are sent by job seekers.
+            organization = organizations[i % len(organizations)] if i % 3 else None
+            job_applications.append(
+                JobApplicationFactory.build(
+                    job_seeker=job_seeker,
+                    to_siae=siaes[i % len(siaes)],
+                    sender=prescribers[organization.pk] if organization else job_seeker,
+                    sender_kind=(
+                        JobApplication.SENDER_KIND_PRESCRIBER
+                        if organization
+                        else JobApplication.SENDER_KIND_JOB_SEEKER
+                    ),
+                    sender_prescriber_organization=organization,
+                    state=states[i % len(states)],
+                    created_at=timezone.now() - datetime.timedelta(days=i % 365),
+                )
+            )
+        JobApplication.objects.bulk_create(job_applications)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {JobApplication._meta.db_table}")
+
+        cls.siae = siaes[0]
+        cls.organization = organizations[0]
+        cls.prescriber = prescribers[cls.organization.pk]
+        cls.job_seeker = job_seekers[0]
+
+    def test_list_for_siae(self):
+        job_applications = self.siae.job_applications_received
+        with self.seqscan_disabled():
+            self.assertUsesIndexScan(
+                job_applications.with_list_related_data(),
+                max_rows=self.MAX_ROWS,
+                index_names=["job_app_to_siae_created_idx"],
+            )
+            # Sorted by the index.
+            self.assertUsesIndexScan(
+                job_applications.order_by("-created_at"),
+                max_rows=self.MAX_ROWS,
+                index_names=["job_app_to_siae_created_idx"],
+                without_sort=True,
+            )
+            self.assertUsesIndexScan(
+                job_applications.with_list_related_data().filter(
+                    state__in=JobApplicationWorkflow.PENDING_STATES,
+                    created_at__gte=timezone.now() - datetime.timedelta(days=30),
+                ),
+                max_rows=self.MAX_ROWS,
+                index_names=["job_app_to_siae_created_idx", "job_app_to_siae_state_idx"],
+            )
+            # Dashboard counters.
+            self.assertUsesIndexScan(
+                job_applications.filter(state__in=JobApplicationWorkflow.PENDING_STATES).order_by(),
+                max_rows=self.MAX_ROWS,
+                index_names=["job_app_to_siae_state_idx"],
+            )
+            self.assertUsesIndexScan(job_applications.order_by(), max_rows=self.MAX_ROWS)
+
+    def test_list_for_prescriber(self):
+        job_applications = JobApplication.objects.filter(
+            (Q(sender=self.prescriber) & Q(sender_prescriber_organization__isnull=True))
+            | Q(sender_prescriber_organization=self.organization)
+        )
+        with self.seqscan_disabled():
+            self.assertUsesIndexScan(job_applications.with_list_related_data(), max_rows=self.MAX_ROWS)
+            self.assertUsesIndexScan(
+                self.prescriber.job_applications_sent.with_list_related_data(), max_rows=self.MAX_ROWS
+            )
+            # Each part of the list is sorted by its index.
+            self.assertUsesIndexScan(
+                JobApplication.objects.filter(sender_prescriber_organization=self.organization).order_by(
+                    "-created_at"
+                ),
+                max_rows=self.MAX_ROWS,
+                index_names=["job_app_sender_org_created_idx"],
+                without_sort=True,
+            )
+            self.assertUsesIndexScan(
+                JobApplication.objects.filter(
+                    sender=self.prescriber, sender_prescriber_organization__isnull=True
+                ).order_by("-created_at"),
+                max_rows=self.MAX_ROWS,
+                index_names=["job_app_sender_no_org_idx"],
+                without_sort=True,
+            )
+
+    def test_list_for_job_seeker(self):
+        job_applications = self.job_seeker.job_applications
+        with self.seqscan_disabled():
+            self.assertUsesIndexScan(
+                job_applications.with_list_related_data(),
+                max_rows=self.MAX_ROWS,
+                index_names=["job_app_job_seeker_created_idx"],
+            )
+            self.assertUsesIndexScan(
+                job_applications.order_by("-created_at"),
+                max_rows=self.MAX_ROWS,
+                index_names=["job_app_job_seeker_created_idx"],
+                without_sort=True,
+            )
+
+    def test_exports(self):
+        job_applications = self.siae.job_applications_received
+        now = timezone.now()
+        with self.seqscan_disabled():
+            self.assertUsesIndexScan(job_applications.with_monthly_counts(), max_rows=self.MAX_ROWS)
+            self.assertUsesIndexScan(
+                job_applications.created_on_given_year_and_month(now.year, now.month),
+                max_rows=self.MAX_ROWS,
+                index_names=["job_app_to_siae_created_idx"],
+            )
+
+    def test_filters_choices(self):
+        job_applications = self.siae.job_applications_received
+        with self.seqscan_disabled():
+            # `get_unique_fk_objects()` isn't chainable: check the query it runs.
+            self.assertUsesIndexScan(
+                job_applications.order_by("sender").distinct("sender").select_related("sender"),
+                max_rows=self.MAX_ROWS,
+            )
+            self.assertUsesIndexScan(
+                job_applications.order_by("job_seeker").distinct("job_seeker").select_related("job_seeker"),
+                max_rows=self.MAX_ROWS,
+            )
@@ -2,19 +2,40 @@ import psycopg2
 from django.conf import settings
 
 
+_connection = None
+
+
+def get_connection():
+    """
+    Connection to the metabase database, opened once and reused by all `MetabaseDatabaseCursor`
+    of the process. It's checked before being reused and replaced if the server closed it.
+    """
+    global _connection
+    if _connection is not None and not _connection.closed:
+        try:
+            with _connection.cursor() as cur:
+                cur.execute("SELECT 1")
+            _connection.rollback()
+            return _connection
+        except psycopg2.OperationalError:
+            _connection.close()
+
+    _connection = psycopg2.connect(
+        host=settings.METABASE_HOST,
+        port=settings.METABASE_PORT,
+        dbname=settings.METABASE_DATABASE,
+        user=settings.METABASE_USER,
+        password=settings.METABASE_PASSWORD,
+    )
+    return _connection
+
+
 class MetabaseDatabaseCursor:
     def __enter__(self):
-        self.conn = psycopg2.connect(
-            host=settings.METABASE_HOST,
-            port=settings.METABASE_PORT,
-            dbname=settings.METABASE_DATABASE,
-            user=settings.METABASE_USER,
-            password=settings.METABASE_PASSWORD,
-        )
+        self.conn = get_connection()
         self.cur = self.conn.cursor()
         return self.cur, self.conn
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         self.conn.commit()
         self.cur.close()
-        self.conn.close()
@@ -1,3 +1,5 @@
+import functools
+
 from django.conf import settings
 from sqlalchemy import create_engine
 
@@ -19,7 +21,11 @@ If SQLAlchemy is not installed, a fallback is only provided for sqlite`
 """
 
 
+@functools.lru_cache(maxsize=None)
 def get_pg_engine():
+    """
+    Engine shared by the whole process: its pool keeps connections open between chunks.
+    """
     return create_engine(
         f"postgresql://{settings.METABASE_USER}:{settings.METABASE_PASSWORD}"
         f"@{settings.METABASE_HOST}:{settings.METABASE_PORT}/{settings.METABASE_DATABASE}",
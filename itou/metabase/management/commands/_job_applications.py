@@ -115,6 +115,12 @@ TABLE_COLUMNS = [
         "comment": "Etat de la candidature",
         "fn": lambda o: get_choice(choices=JobApplicationWorkflow.STATE_CHOICES, key=o.state),
     },
+    {
+        "name": "date_dernier_changement_état",
+        "type": "date",
+        "comment": "Date du dernier changement d''état de la candidature",
+        "fn": lambda o: o.last_change_at,
+    },
     {
         "name": "origine",
         "type": "varchar",
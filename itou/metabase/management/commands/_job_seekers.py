@@ -214,7 +214,7 @@ TABLE_COLUMNS += [
 
 
 # Add one column for each of the 15 criteria.
-for criteria in AdministrativeCriteria.objects.order_by("id").all():
+for criteria in sorted(AdministrativeCriteria.objects.all_from_referential(), key=lambda criteria: criteria.id):
     column_comment = _format_criteria_name_as_column_comment(criteria)
     column_name = format_criteria_name_as_column_name(criteria)
 
@@ -233,6 +233,8 @@ class Command(BaseCommand):
 
         Do this dataframe chunk by dataframe chunk to solve
         psycopg2.OperationalError "server closed the connection unexpectedly" error.
+        Chunks share the connection of the engine, which is checked before each use
+        (`pool_pre_ping`) and replaced if it was closed.
         """
         if self.dry_run:
             vue_name += "_dry_run"
@@ -243,11 +245,10 @@ class Command(BaseCommand):
 
         self.log(f"Storing {len(df_chunks)} chunks of (max) {rows_per_chunk} rows each ...")
         if_exists = "replace"  # For the 1st chunk, drop old existing table if needed.
+        pg_engine = get_pg_engine()
         for df_chunk in tqdm(df_chunks):
-            pg_engine = get_pg_engine()
             df_chunk.to_sql(
                 name=f"{vue_name}_new",
-                # Use a new connection for each chunk to avoid random disconnections.
                 con=pg_engine,
                 if_exists=if_exists,
                 index=False,
@@ -255,7 +256,6 @@ class Command(BaseCommand):
                 # INSERT by batch and not one by one. Increases speed x100.
                 method="multi",
             )
-            pg_engine.dispose()
             if_exists = "append"  # For all other chunks, append to table in progress.
 
         self.switch_table_atomically(table_name=vue_name)
@@ -0,0 +1,49 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from itou.asp.resolvers import CommuneIndex
+from itou.users.models import JobSeekerProfile
+from itou.utils.iterators import chunks
+
+
+class Command(BaseCommand):
+    """
+    Format addresses of job seekers in HEXA format (needed by employee records) in bulk.
+
+    Only profiles without an HEXA address are processed, unless `--all` is given.
+
+    To run the command:
+        django-admin update_hexa_addresses
+        django-admin update_hexa_addresses --all
+    """
+
+    help = "Format addresses of job seekers in HEXA format."
+
+    # Number of profiles geocoded and saved at once
+    BATCH_SIZE = 500
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", dest="all", action="store_true", help="Also format profiles already having an HEXA address"
+        )
+
+    def handle(self, all=False, **options):
+        profiles = JobSeekerProfile.objects.all()
+        if not all:
+            profiles = profiles.filter(hexa_commune=None)
+
+        pks = list(profiles.values_list("pk", flat=True))
+        errors = Counter()
+        # Current communes are loaded once for all batches
+        commune_index = CommuneIndex()
+
+        for i, batch_pks in enumerate(chunks(pks, self.BATCH_SIZE), 1):
+            errors += JobSeekerProfile.bulk_update_hexa_address(
+                JobSeekerProfile.objects.filter(pk__in=batch_pks), commune_index=commune_index
+            )
+            self.stdout.write(f"Processed {min(i * self.BATCH_SIZE, len(pks))}/{len(pks)} profiles")
+
+        self.stdout.write(f"Formatted addresses: {len(pks) - sum(errors.values())}")
+        for error, count in errors.most_common():
+            self.stdout.write(f"{count} x {error}")
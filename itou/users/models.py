@@ -1,4 +1,5 @@
 import uuid
+from collections import Counter
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
@@ -13,8 +14,9 @@ from django.utils.safestring import mark_safe
 
 from itou.approvals.models import ApprovalsWrapper
 from itou.asp.models import AllocationDuration, Commune, EducationLevel, LaneExtension, LaneType, RSAAllocation
+from itou.asp.resolvers import CommuneIndex
 from itou.utils.address.departments import department_from_postcode
-from itou.utils.address.format import format_address
+from itou.utils.address.format import ERROR_UNKNOWN_LANE_TYPE, format_address, format_addresses
 from itou.utils.address.models import AddressMixin
 from itou.utils.validators import validate_birthdate, validate_pole_emploi_id
 
@@ -385,6 +387,16 @@ class JobSeekerProfile(models.Model):
     ERROR_HEXA_COMMUNE = "La commune INSEE est obligatoire"
     ERROR_HEXA_LOOKUP_COMMUNE = "Impossible de trouver la commune à partir du code INSEE"
 
+    HEXA_ADDRESS_FIELDS = [
+        "hexa_lane_number",
+        "hexa_std_extension",
+        "hexa_non_std_extension",
+        "hexa_lane_type",
+        "hexa_lane_name",
+        "hexa_post_code",
+        "hexa_commune",
+    ]
+
     ERROR_JOBSEEKER_TITLE = "La civilité du demandeur d'emploi est obligatoire"
     ERROR_JOBSEEKER_EDUCATION_LEVEL = "Le niveau de formation du demandeur d'emploi est obligatoire"
     ERROR_JOBSEEKER_PE_FIELDS = "L'identifiant et la durée d'inscription à Pôle emploi vont de pair"
@@ -579,6 +591,18 @@ class JobSeekerProfile(models.Model):
         if error:
             raise ValidationError(error)
 
+        # Special field: Commune object contains both city name and INSEE code
+        commune = Commune.objects.by_insee_code(result.get("insee_code"))
+
+        if not commune:
+            raise ValidationError(self.ERROR_HEXA_LOOKUP_COMMUNE)
+
+        self._set_hexa_address(result, commune)
+        self.save()
+
+        return self
+
+    def _set_hexa_address(self, result, commune):
         # Fill matching fields
         self.hexa_lane_type = result.get("lane_type")
         self.hexa_lane_number = result.get("number")
@@ -586,17 +610,51 @@ class JobSeekerProfile(models.Model):
         self.hexa_non_std_extension = result.get("non_std_extension")
         self.hexa_lane_name = result.get("lane")
         self.hexa_post_code = result.get("post_code")
+        self.hexa_commune = commune
 
-        # Special field: Commune object contains both city name and INSEE code
-        insee_code = result.get("insee_code")
-        self.hexa_commune = Commune.objects.by_insee_code(insee_code)
+    @classmethod
+    def bulk_update_hexa_address(cls, profiles, commune_index=None):
+        """
+        Bulk version of `update_hexa_address()` for a queryset of profiles:
+        - unique addresses are geocoded concurrently,
+        - INSEE codes are resolved against the current communes, loaded with a single query,
+        - formatted addresses are saved with a single `bulk_update`.
 
-        if not self.hexa_commune:
-            raise ValidationError(self.ERROR_HEXA_LOOKUP_COMMUNE)
+        A `CommuneIndex` can be given to share loaded communes between several calls.
 
-        self.save()
+        Profiles which can't be formatted are left untouched.
 
-        return self
+        Returns a `Counter` of errors: {error type: number of profiles}.
+        """
+        profiles = list(profiles.select_related("user"))
+        results = format_addresses([profile.user for profile in profiles])
+
+        if commune_index is None:
+            insee_codes = {result.get("insee_code") for result, _ in results if result}
+            commune_index = CommuneIndex(Commune.objects.all().current().filter(code__in=insee_codes))
+
+        errors = Counter()
+        formatted_profiles = []
+
+        for profile, (result, error) in zip(profiles, results):
+            if error:
+                # Lane type errors contain address details
+                if error.startswith(ERROR_UNKNOWN_LANE_TYPE):
+                    error = ERROR_UNKNOWN_LANE_TYPE
+                errors[error] += 1
+                continue
+
+            commune = commune_index.by_insee_code(result.get("insee_code"))
+            if not commune:
+                errors[cls.ERROR_HEXA_LOOKUP_COMMUNE] += 1
+                continue
+
+            profile._set_hexa_address(result, commune)
+            formatted_profiles.append(profile)
+
+        cls.objects.bulk_update(formatted_profiles, cls.HEXA_ADDRESS_FIELDS)
+
+        return errors
 
     @property
     def is_employed(self):
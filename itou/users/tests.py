@@ -1,4 +1,5 @@
 import uuid
+from collections import Counter
 from unittest import mock
 
 from django.core.exceptions import ValidationError
@@ -11,7 +12,8 @@ from itou.job_applications.models import JobApplicationWorkflow
 from itou.prescribers.factories import PrescriberMembershipFactory
 from itou.siaes.factories import SiaeFactory
 from itou.users.factories import JobSeekerFactory, JobSeekerProfileFactory, PrescriberFactory, UserFactory
-from itou.users.models import User
+from itou.users.models import JobSeekerProfile, User
+from itou.utils.address.format import ERROR_INCOMPLETE_ADDRESS_DATA
 from itou.utils.mocks.address_format import BAN_GEOCODING_API_RESULTS_MOCK, RESULTS_BY_ADDRESS
 
 
@@ -249,6 +251,34 @@ class JobSeekerProfileModelTest(TestCase):
         self.profile.update_hexa_address()
         self.profile.clean()
 
+    @mock.patch(
+        "itou.utils.address.format.get_geocoding_data",
+        side_effect=mock_get_geocoding_data,
+    )
+    def test_bulk_update_hexa_address(self, _mock):
+        data = BAN_GEOCODING_API_RESULTS_MOCK[0]
+        address = {"user__address_line_1": data["address_line_1"], "user__post_code": data["post_code"]}
+        # Same address: geocoded once
+        profiles = [JobSeekerProfileFactory(**address), JobSeekerProfileFactory(**address)]
+        # No matching commune
+        data = BAN_GEOCODING_API_RESULTS_MOCK[1]
+        JobSeekerProfileFactory(user__address_line_1=data["address_line_1"], user__post_code=data["post_code"])
+        # Incomplete address
+        JobSeekerProfileFactory(user__post_code="")
+
+        errors = JobSeekerProfile.bulk_update_hexa_address(JobSeekerProfile.objects.exclude(pk=self.profile.pk))
+
+        self.assertEqual(
+            errors,
+            Counter({JobSeekerProfile.ERROR_HEXA_LOOKUP_COMMUNE: 1, ERROR_INCOMPLETE_ADDRESS_DATA: 1}),
+        )
+        self.assertEqual(_mock.call_count, 2)
+        for profile in profiles:
+            profile.refresh_from_db()
+            self.assertTrue(profile.hexa_address_filled)
+            self.assertEqual(profile.hexa_commune.code, "67152")
+            self.assertEqual(profile.hexa_lane_type, "RUE")
+
     @mock.patch(
         "itou.utils.address.format.get_geocoding_data",
         side_effect=mock_get_geocoding_data,
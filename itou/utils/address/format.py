@@ -1,6 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from unidecode import unidecode
 
-from itou.asp.models import LaneExtension, LaneType, find_lane_type_aliases
+from itou.asp import resolvers
 from itou.utils.apis.geocoding import get_geocoding_data
 
 
@@ -8,6 +10,10 @@ ERROR_HEXA_CONVERSION = "Impossible de transformer cet objet en adresse HEXA"
 ERROR_GEOCODING_API = "Erreur de geocoding, impossible d'obtenir un résultat"
 ERROR_INCOMPLETE_ADDRESS_DATA = "Données d'adresse incomplètes"
 ERROR_UNKNOWN_ADDRESS_LANE = "Impossible d'obtenir le nom de la voie"
+ERROR_UNKNOWN_LANE_TYPE = "Impossible de trouver le type de voie"
+
+# Max number of concurrent calls to the geocoding API in `format_addresses()`
+GEOCODING_WORKERS = 8
 
 
 def format_address(obj):
@@ -49,6 +55,13 @@ def format_address(obj):
     # first we use geo API to get a 'lane' and a number
     address = get_geocoding_data(obj.address_line_1, post_code=obj.post_code)
 
+    return _format_geocoding_data(address)
+
+
+def _format_geocoding_data(address):
+    """
+    Second part of `format_address()`: build the ASP address from geocoding API results.
+    """
     if not address:
         return None, ERROR_GEOCODING_API
 
@@ -65,7 +78,7 @@ def format_address(obj):
 
         if extension:
             extension = extension[0]
-            ext = LaneExtension.with_similar_name_or_value(extension)
+            ext = resolvers.lane_extension_with_similar_name_or_value(extension)
             if ext:
                 result["std_extension"] = ext.name or ""
             else:
@@ -85,20 +98,20 @@ def format_address(obj):
     lt = (
         # The API field is similar to know lane type,
         # example: got "Av" for name "AV" (Avenue)
-        LaneType.with_similar_name(lane_type)
+        resolvers.lane_type_with_similar_name(lane_type)
         # The API field is similar to an exiting value
         # example: got "allee" for "Allée"
-        or LaneType.with_similar_value(lane_type)
+        or resolvers.lane_type_with_similar_value(lane_type)
         # Maybe the geo API mispelled the lane type (happens sometimes)
         # so we use an aliases table as a last change to get the type
         # example: got "R" or "r" instead of "Rue"
-        or find_lane_type_aliases(lane)
+        or resolvers.find_lane_type_aliases(lane)
     )
 
     if lt:
         result["lane_type"] = lt.name
     else:
-        return None, f"Impossible de trouver le type de voie : {lane_type} pour l'adresse : {address}"
+        return None, f"{ERROR_UNKNOWN_LANE_TYPE} : {lane_type} pour l'adresse : {address}"
 
     # INSEE code: must double check with ASP ref file
     result["insee_code"] = address.get("insee_code")
@@ -106,3 +119,34 @@ def format_address(obj):
     result["city"] = address.get("city")
 
     return result, None
+
+
+def format_addresses(objs, max_workers=GEOCODING_WORKERS):
+    """
+    Bulk version of `format_address()`.
+
+    Each unique address (`address_line_1` and `post_code`) is geocoded once,
+    and calls to the geocoding API are made concurrently.
+
+    Returns a list of (result, error) tuples, in the same order as `objs`.
+    """
+    keys = [(obj.address_line_1, obj.post_code) if obj else None for obj in objs]
+    unique_keys = list({key for key in keys if key and all(key)})
+
+    def geocode(key):
+        address_line_1, post_code = key
+        return get_geocoding_data(address_line_1, post_code=post_code)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        geocoding_data = dict(zip(unique_keys, executor.map(geocode, unique_keys)))
+
+    results = []
+    for key in keys:
+        if not key:
+            results.append((None, ERROR_HEXA_CONVERSION))
+        elif not all(key):
+            results.append((None, ERROR_INCOMPLETE_ADDRESS_DATA))
+        else:
+            results.append(_format_geocoding_data(geocoding_data[key]))
+
+    return results
@@ -1,57 +1,184 @@
+"""
+API Entreprise client.
+
+Calls are made during signups and SIAE creations, with a client shared by all threads
+of a process (see `get_client()`):
+* connections are pooled and kept alive between calls;
+* calls are rate-limited (token bucket) to stay under the quotas of API Entreprise;
+* results are cached by SIRET, including unknown SIRETs (422 errors) for a shorter time;
+* calls, errors, rate-limited calls and the total duration of calls are counted
+  (see `ApiEntrepriseClient.get_metrics()`).
+
+In tests, pass `itou.utils.mocks.api_entreprise.ApiEntrepriseMockTransport` to
+`ApiEntrepriseClient` to answer calls locally.
+"""
 import logging
+import threading
+import time
 
 import httpx
 from django.conf import settings
-from django.utils.http import urlencode
 
 from itou.utils.address.departments import department_from_postcode
+from itou.utils.cache import CacheNamespace
 
 
 logger = logging.getLogger(__name__)
 
 
-class EtablissementAPI:
+class TokenBucket:
     """
-    https://doc.entreprise.api.gouv.fr/?json#etablissements-v2
+    Thread-safe token bucket: up to `capacity` calls at once, then `rate` calls per second.
     """
 
-    ERROR_IS_CLOSED = "La base Sirene indique que l'état administratif de l'établissement est fermé."
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=0):
+        """
+        Takes a token, waiting up to `timeout` seconds for one.
+        Returns False if there was none.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class ApiEntrepriseClient:
+
+    ERROR_UNKNOWN_SIRET = "SIRET non reconnu."
+    ERROR_CONNECTION = "Problème de connexion à la base Sirene. Veuillez réessayer ultérieurement."
+
+    # Results by SIRET.
+    CACHE = CacheNamespace("api_entreprise", timeout=24 * 60 * 60)
+    UNKNOWN_SIRET_CACHE_TIMEOUT = 60 * 60  # in seconds.
+
+    METRICS = ["calls", "errors", "rate_limited", "duration_ms"]
+
+    TIMEOUT = 10  # in seconds.
+    # Maximum time (in seconds) waited for the rate limiter, users are waiting too.
+    RATE_LIMIT_TIMEOUT = 5
+
+    def __init__(self, transport=None):
+        self.http_client = httpx.Client(
+            headers={"Authorization": f"Bearer {settings.API_ENTREPRISE_TOKEN}"},
+            timeout=self.TIMEOUT,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            transport=transport,
+        )
+        self.rate_limiter = TokenBucket(
+            rate=settings.API_ENTREPRISE_RATE_LIMIT / 60, capacity=settings.API_ENTREPRISE_RATE_LIMIT_BURST
+        )
 
-    def __init__(self, siret, object="Inscription aux emplois de l'inclusion"):
-        self.data, self.error = self.get(siret, object)
+    def get_etablissement(self, siret, object):
+        """
+        Returns a tuple (data, error).
+        """
+        cached = self.CACHE.get(siret)
+        if cached is not None:
+            return cached
 
-    def get(self, siret, object):
+        if not self.rate_limiter.acquire(timeout=self.RATE_LIMIT_TIMEOUT):
+            logger.warning("API Entreprise rate limit reached, call for `%s` aborted.", siret)
+            self.CACHE.count("rate_limited")
+            return None, self.ERROR_CONNECTION
 
         data = None
         error = None
+        # Other errors than unknown SIRETs are not cached.
+        cache_timeout = None
 
-        query_string = urlencode(
-            {
-                "recipient": settings.API_ENTREPRISE_RECIPIENT,
-                "context": settings.API_ENTREPRISE_CONTEXT,
-                "object": object,
-            }
-        )
-
-        url = f"{settings.API_ENTREPRISE_BASE_URL}/etablissements/{siret}?{query_string}"
-        headers = {"Authorization": f"Bearer {settings.API_ENTREPRISE_TOKEN}"}
+        url = f"{settings.API_ENTREPRISE_BASE_URL}/etablissements/{siret}"
+        params = {
+            "recipient": settings.API_ENTREPRISE_RECIPIENT,
+            "context": settings.API_ENTREPRISE_CONTEXT,
+            "object": object,
+        }
 
+        started_at = time.perf_counter()
         try:
-            r = httpx.get(url, headers=headers)
+            r = self.http_client.get(url, params=params)
             r.raise_for_status()
             data = r.json()
-        except httpx.HTTPError as e:
+            cache_timeout = self.CACHE.timeout
+        except httpx.HTTPStatusError as e:
             if e.response.status_code == 422:
-                error = "SIRET non reconnu."
+                error = self.ERROR_UNKNOWN_SIRET
+                cache_timeout = self.UNKNOWN_SIRET_CACHE_TIMEOUT
             else:
                 logger.error("Error while fetching `%s`: %s", url, e)
-                error = "Problème de connexion à la base Sirene. Veuillez réessayer ultérieurement."
+                error = self.ERROR_CONNECTION
+        except httpx.HTTPError as e:
+            # Timeouts, connection errors…
+            logger.error("Error while fetching `%s`: %s", url, e)
+            error = self.ERROR_CONNECTION
+        finally:
+            self.CACHE.count("calls")
+            self.CACHE.count("duration_ms", round((time.perf_counter() - started_at) * 1000))
 
         if data and data.get("errors"):
             error = data["errors"][0]
+            cache_timeout = None
+
+        if cache_timeout is None:
+            self.CACHE.count("errors")
+        else:
+            self.CACHE.set(siret, (data, error), cache_timeout)
 
         return data, error
 
+    def get_metrics(self):
+        """
+        Returns a dict: {metric: int}, with cache hits and misses.
+        """
+        return self.CACHE.get_stats(stats=["hits", "misses"] + self.METRICS)
+
+    def reset_metrics(self):
+        self.CACHE.reset_stats(stats=["hits", "misses"] + self.METRICS)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the client shared by all threads of the process.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApiEntrepriseClient()
+    return _client
+
+
+class EtablissementAPI:
+    """
+    https://doc.entreprise.api.gouv.fr/?json#etablissements-v2
+    """
+
+    ERROR_IS_CLOSED = "La base Sirene indique que l'état administratif de l'établissement est fermé."
+
+    def __init__(self, siret, object="Inscription aux emplois de l'inclusion"):
+        self.data, self.error = self.get(siret, object)
+
+    def get(self, siret, object):
+        return get_client().get_etablissement(siret, object)
+
     @property
     def name(self):
         return self.data["etablissement"]["adresse"]["l1"]
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class UtilsConfig(AppConfig):
+    name = "itou.utils"
+
+    def ready(self):
+        """
+        When the app is loaded:
+        register receivers invalidating cached organization contexts.
+        """
+        import itou.utils.perms.signals  # noqa F401
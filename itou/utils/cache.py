@@ -0,0 +1,135 @@
+"""
+Helpers on top of the default cache (Redis, see `settings.CACHES`).
+
+Cached values are grouped in namespaces, e.g. a referential or aggregates of organizations:
+
+    siae_stats = CacheNamespace("siae_stats", timeout=60 * 60)
+    stats = siae_stats.get_or_set(siae.pk, lambda: compute_stats(siae))
+    siae_stats.delete(siae.pk)  # The stats of an SIAE changed.
+    siae_stats.invalidate()  # All of them changed.
+
+Keys of a namespace contain:
+* its `version`, to be increased when the format of its values changes, so that
+  a release doesn't read values cached by the previous one (and vice versa);
+* its generation, stored in the cache and changed by `invalidate()`: keys of the
+  previous generation are no longer read and expire on their own.
+
+When a value is missing, a single process computes it while the others wait for it
+instead of computing it at the same time ("cache stampede").
+
+Hits and misses are counted by namespace, see `get_stats()` and the `cache_stats` command.
+Other stats can be counted with `count()`.
+"""
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+# Namespaces by name.
+NAMESPACES = {}
+
+# Returned by `cache.get()` for missing keys, as `None` can be cached.
+_MISSING = object()
+
+
+class CacheNamespace:
+
+    # Maximum time (in seconds) waited for a value being computed by another process.
+    LOCK_TIMEOUT = 10
+    LOCK_POLL_INTERVAL = 0.05  # in seconds.
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT, version=1):
+        if name in NAMESPACES:
+            raise ValueError(f"Cache namespace `{name}` already exists.")
+        self.name = name
+        self.timeout = timeout
+        self.version = version
+        NAMESPACES[name] = self
+
+    def __repr__(self):
+        return f"<CacheNamespace: {self.name}>"
+
+    @property
+    def generation_key(self):
+        return f"{self.name}:generation"
+
+    def get_generation(self):
+        return cache.get_or_set(self.generation_key, uuid.uuid4().hex[:8], None)
+
+    def make_key(self, key):
+        return f"{self.name}:v{self.version}:{self.get_generation()}:{key}"
+
+    def get(self, key, default=None):
+        value = cache.get(self.make_key(key), _MISSING)
+        self.count("hits" if value is not _MISSING else "misses")
+        return default if value is _MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        cache.set(self.make_key(key), value, self.timeout if timeout is DEFAULT_TIMEOUT else timeout)
+
+    def delete(self, key):
+        cache.delete(self.make_key(key))
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT):
+        """
+        Returns the value of `key`, computed by the `default` callable and cached if it's missing.
+        """
+        cache_key = self.make_key(key)
+        value = cache.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            self.count("hits")
+            return value
+        self.count("misses")
+
+        lock_key = f"{cache_key}:lock"
+        locked = cache.add(lock_key, True, self.LOCK_TIMEOUT)
+        # `add()` returns `None` (not `False`) when the cache server is unavailable
+        # (`IGNORE_EXCEPTIONS`): there's no lock to wait for, compute the value right away.
+        if locked is False:
+            # Another process is computing the value: wait for it, then compute it anyway.
+            deadline = time.monotonic() + self.LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(self.LOCK_POLL_INTERVAL)
+                value = cache.get(cache_key, _MISSING)
+                if value is not _MISSING:
+                    return value
+
+        try:
+            value = default()
+            cache.set(cache_key, value, self.timeout if timeout is DEFAULT_TIMEOUT else timeout)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return value
+
+    def invalidate(self):
+        """
+        Invalidate all keys of the namespace.
+        """
+        cache.delete(self.generation_key)
+
+    # Hits and misses.
+
+    def get_stats_key(self, stat):
+        return f"{self.name}:stats:{stat}"
+
+    def count(self, stat, amount=1):
+        stats_key = self.get_stats_key(stat)
+        try:
+            cache.incr(stats_key, amount)
+        except ValueError:
+            # First time (or evicted).
+            cache.set(stats_key, amount, None)
+
+    def get_stats(self, stats=("hits", "misses")):
+        """
+        Returns a dict: {stat: int}
+        """
+        keys = {stat: self.get_stats_key(stat) for stat in stats}
+        values = cache.get_many(keys.values())
+        return {stat: values.get(key, 0) for stat, key in keys.items()}
+
+    def reset_stats(self, stats=("hits", "misses")):
+        cache.delete_many([self.get_stats_key(stat) for stat in stats])
@@ -0,0 +1,42 @@
+"""
+PostGIS backend (`settings.DATABASES["default"]["ENGINE"]`) adding to Django's:
+
+* health checks of persistent connections (`CONN_MAX_AGE`): with `CONN_HEALTH_CHECKS`,
+  a connection kept between two requests (or two Huey tasks) is checked before its
+  first use and replaced if the server closed it meanwhile (restart, failover, idle timeout…).
+  Django only supports this option from 4.1, this is a backport of its behaviour.
+* metrics: number of connections opened by each `DatabaseWrapper` (i.e. by each thread)
+  and time spent opening them (including the initialization of the connection state),
+  reported by `QueryProfilingMiddleware` and Huey task metrics (see `itou.utils.queues`).
+"""
+import time
+
+from django.contrib.gis.db.backends.postgis.base import DatabaseWrapper as PostGISDatabaseWrapper
+
+
+class DatabaseWrapper(PostGISDatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections_opened = 0
+        self.connect_duration = 0.0  # in seconds.
+        self.health_check_needed = False
+
+    def connect(self):
+        started_at = time.perf_counter()
+        super().connect()
+        self.connect_duration += time.perf_counter() - started_at
+        self.connections_opened += 1
+        self.health_check_needed = False
+
+    def close_if_unusable_or_obsolete(self):
+        # Called at the start and at the end of each request and Huey task.
+        super().close_if_unusable_or_obsolete()
+        if self.connection is not None and self.settings_dict.get("CONN_HEALTH_CHECKS"):
+            self.health_check_needed = True
+
+    def ensure_connection(self):
+        if self.health_check_needed and self.connection is not None:
+            self.health_check_needed = False
+            if not self.in_atomic_block and not self.is_usable():
+                self.close()
+        super().ensure_connection()
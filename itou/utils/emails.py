@@ -1,4 +1,6 @@
+import logging
 import re
+import threading
 
 from django.conf import settings
 from django.core import mail
@@ -6,14 +8,17 @@ from django.core.mail import get_connection
 from django.core.mail.backends.base import BaseEmailBackend
 from django.core.mail.message import EmailMessage
 from django.template.loader import get_template
-from huey.contrib.djhuey import task
+from django.utils import timezone
 
+from itou.utils import queues
 from itou.utils.iterators import chunks
 
 
 # This is the "real" email backend used by the async wrapper / email backend
 ASYNC_EMAIL_BACKEND = "anymail.backends.mailjet.EmailBackend"
 
+logger = logging.getLogger(__name__)
+
 
 def remove_extra_line_breaks(text):
     """
@@ -127,17 +132,58 @@ def _deserializeEmailMessage(serialized_email_message):
     """
     Creates a "light" version of the original `EmailMessage` passed to the email backend.
 
-    In order to be serializable, we:
-    * only get the fields actually used by the app (defined in counterpart `_serializeEmailMessage`)
-    * add a reference to the "synchronous" email backend (for convenience)
+    In order to be serializable, we only get the fields actually used by the app
+    (defined in counterpart `_serializeEmailMessage`).
 
     *Tip*: use non-serializable objects only when deserialization is over... (f.i. email backends)
     """
-    return EmailMessage(connection=get_connection(backend=ASYNC_EMAIL_BACKEND), **serialized_email_message)
+    return EmailMessage(**serialized_email_message)
+
+
+EMAILS_QUEUE = queues.get_queue("emails")
+
+# Delivery counters are stored in the queue storage, see `get_email_delivery_stats()`
+_STATS_KEY = "email_delivery_stats"
+_STATS_COUNTERS = ("sent", "retried", "failed")
+_stats_lock = threading.Lock()
 
 
-@task(retries=_NB_RETRIES, retry_delay=settings.SEND_EMAIL_DELAY_BETWEEN_RETRIES_IN_SECONDS)
-def _async_send_messages(serializable_email_messages):
+def _update_email_delivery_stats(**increments):
+    # Emails are sent by the thread workers of a single consumer (see `settings.HUEY_QUEUES`):
+    # a thread lock is enough to update counters.
+    with _stats_lock:
+        stats = EMAILS_QUEUE.get(_STATS_KEY, peek=True) or {
+            "since": timezone.now(),
+            **dict.fromkeys(_STATS_COUNTERS, 0),
+        }
+        for counter, increment in increments.items():
+            stats[counter] += increment
+        EMAILS_QUEUE.put(_STATS_KEY, stats)
+
+
+def get_email_delivery_stats():
+    """
+    Returns a dict with:
+    * queue_depth: number of emails tasks waiting to be processed
+    * sent, retried, failed: number of messages since the `since` datetime
+        (retried messages are rescheduled, failed ones have no retry left)
+    * sent_per_minute: throughput since the `since` datetime
+    """
+    stats = EMAILS_QUEUE.get(_STATS_KEY, peek=True) or {"since": None, **dict.fromkeys(_STATS_COUNTERS, 0)}
+    stats["queue_depth"] = EMAILS_QUEUE.pending_count()
+    stats["sent_per_minute"] = 0
+    if stats["since"]:
+        elapsed_minutes = (timezone.now() - stats["since"]).total_seconds() / 60
+        stats["sent_per_minute"] = round(stats["sent"] / max(elapsed_minutes, 1), 2)
+    return stats
+
+
+def reset_email_delivery_stats():
+    EMAILS_QUEUE.get(_STATS_KEY)
+
+
+@queues.task("emails")
+def _async_send_messages(serializable_email_messages, retries_left=_NB_RETRIES):
     """Async email sending "delegate"
 
     This function sends emails with the backend defined in `ASYNC_EMAIL_BACKEND`
@@ -167,17 +213,43 @@ def _async_send_messages(serializable_email_messages):
     If there are many async tasks to be defined or for specific objects,
     it may be better to use a custom serializer.
 
+    All messages are sent over a single connection to the "real" backend.
+    Retries are done per message: only the messages which could not be sent
+    are scheduled again (Huey `retries` would send the whole list again).
+
     By design (see `BaseEmailBackend.send_messages`), this function must return
     the number of email correctly processed.
     """
 
     count = 0
-
-    for email in serializable_email_messages:
-        message = _deserializeEmailMessage(email)
-        for sanitized_message in sanitize_mailjet_recipients(message):
-            sanitized_message.send()
-            count += 1
+    failed_messages = []
+
+    messages = [
+        sanitized_message
+        for email in serializable_email_messages
+        for sanitized_message in sanitize_mailjet_recipients(_deserializeEmailMessage(email))
+    ]
+
+    # The connection (f.i. HTTP session for Anymail) is opened once and reused for all messages
+    with get_connection(backend=ASYNC_EMAIL_BACKEND) as connection:
+        for message in messages:
+            try:
+                connection.send_messages([message])
+            except Exception:
+                logger.exception("Could not send email: %s", message.subject)
+                failed_messages.append(_serializeEmailMessage(message))
+            else:
+                count += 1
+
+    if failed_messages and retries_left > 0:
+        _async_send_messages.schedule(
+            (failed_messages, retries_left - 1), delay=settings.SEND_EMAIL_DELAY_BETWEEN_RETRIES_IN_SECONDS
+        )
+        _update_email_delivery_stats(sent=count, retried=len(failed_messages))
+    else:
+        if failed_messages:
+            logger.error("Giving up sending %s email(s) after %s retries", len(failed_messages), _NB_RETRIES)
+        _update_email_delivery_stats(sent=count, failed=len(failed_messages))
 
     # This part is processed by an external worker. Return count is irrelevant, so:
     return count
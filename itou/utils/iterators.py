@@ -8,3 +8,18 @@ def chunks(lst, n):
     """
     for i in range(0, len(lst), n):
         yield lst[i : i + n]
+
+
+def chunked_iterator(iterable, n):
+    """
+    Yield successive lists of at most `n` items from any iterable
+    (e.g. a `QuerySet.iterator()`) without materialising it.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == n:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
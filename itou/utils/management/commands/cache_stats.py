@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from itou.utils.cache import NAMESPACES
+
+
+class Command(BaseCommand):
+    """
+    Show hits and misses of cache namespaces (see `itou.utils.cache.CacheNamespace`).
+
+    To run the command:
+        django-admin cache_stats
+        django-admin cache_stats --reset
+    """
+
+    help = "Show hits and misses of cache namespaces."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", dest="reset", action="store_true", help="Reset stats after showing them")
+
+    def handle(self, reset=False, **options):
+        for name, namespace in sorted(NAMESPACES.items()):
+            stats = namespace.get_stats()
+            total = stats["hits"] + stats["misses"]
+            hit_rate = stats["hits"] / total if total else 0
+            self.stdout.write(f"{name}: {stats['hits']} hits, {stats['misses']} misses (hit rate {hit_rate:.1%})")
+            if reset:
+                namespace.reset_stats()
@@ -0,0 +1,46 @@
+import datetime
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from itou.utils.pdf import get_pdf_storage
+
+
+class Command(BaseCommand):
+    """
+    Delete stored PDF documents older than `settings.PDF_RETENTION_DAYS` days
+    (see `itou.utils.pdf`): they contain personal data. They're rendered again if needed.
+
+    To run the command:
+        django-admin delete_old_pdfs
+        django-admin delete_old_pdfs --dry-run
+    """
+
+    help = "Delete stored PDF documents older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", dest="dry_run", action="store_true", help="Only print what would be done")
+
+    def walk(self, storage, folder=""):
+        directories, filenames = storage.listdir(folder)
+        for filename in filenames:
+            yield os.path.join(folder, filename)
+        for directory in directories:
+            yield from self.walk(storage, os.path.join(folder, directory))
+
+    def handle(self, dry_run=False, **options):
+        storage = get_pdf_storage()
+        deleted_before = timezone.now() - datetime.timedelta(days=settings.PDF_RETENTION_DAYS)
+
+        count = 0
+        for path in self.walk(storage):
+            if storage.get_modified_time(path) >= deleted_before:
+                continue
+            count += 1
+            if not dry_run:
+                storage.delete(path)
+
+        prefix = "DRY-RUN: " if dry_run else ""
+        self.stdout.write(f"{prefix}{count} document(s) older than {settings.PDF_RETENTION_DAYS} days deleted")
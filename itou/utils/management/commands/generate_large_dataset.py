@@ -0,0 +1,385 @@
+import datetime
+import random
+import uuid
+
+import factory.random
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from itou.approvals.factories import ApprovalFactory, PoleEmploiApprovalFactory
+from itou.approvals.models import Approval, PoleEmploiApproval
+from itou.cities.models import City
+from itou.job_applications.factories import JobApplicationFactory
+from itou.job_applications.models import JobApplication, JobApplicationTransitionLog, JobApplicationWorkflow
+from itou.jobs.models import Appellation
+from itou.prescribers.factories import PrescriberOrganizationFactory
+from itou.prescribers.models import PrescriberMembership, PrescriberOrganization
+from itou.siaes.factories import SiaeConventionFactory, SiaeFactory
+from itou.siaes.models import Siae, SiaeConvention, SiaeJobDescription, SiaeMembership
+from itou.users.factories import DEFAULT_PASSWORD, JobSeekerFactory, PrescriberFactory, SiaeStaffFactory
+from itou.users.models import User
+
+
+# Share of job applications by state, and the transitions leading to each state.
+STATES = {
+    JobApplicationWorkflow.STATE_NEW: (15, []),
+    JobApplicationWorkflow.STATE_PROCESSING: (10, [JobApplicationWorkflow.TRANSITION_PROCESS]),
+    JobApplicationWorkflow.STATE_POSTPONED: (
+        5,
+        [JobApplicationWorkflow.TRANSITION_PROCESS, JobApplicationWorkflow.TRANSITION_POSTPONE],
+    ),
+    JobApplicationWorkflow.STATE_ACCEPTED: (
+        20,
+        [JobApplicationWorkflow.TRANSITION_PROCESS, JobApplicationWorkflow.TRANSITION_ACCEPT],
+    ),
+    JobApplicationWorkflow.STATE_REFUSED: (
+        35,
+        [JobApplicationWorkflow.TRANSITION_PROCESS, JobApplicationWorkflow.TRANSITION_REFUSE],
+    ),
+    JobApplicationWorkflow.STATE_CANCELLED: (
+        2,
+        [
+            JobApplicationWorkflow.TRANSITION_PROCESS,
+            JobApplicationWorkflow.TRANSITION_ACCEPT,
+            JobApplicationWorkflow.TRANSITION_CANCEL,
+        ],
+    ),
+    JobApplicationWorkflow.STATE_OBSOLETE: (13, [JobApplicationWorkflow.TRANSITION_RENDER_OBSOLETE]),
+}
+
+# Share of job applications by sender kind.
+SENDER_KINDS = {
+    JobApplication.SENDER_KIND_JOB_SEEKER: 35,
+    JobApplication.SENDER_KIND_PRESCRIBER: 50,
+    JobApplication.SENDER_KIND_SIAE_STAFF: 15,
+}
+
+MESSAGES = [
+    "Bonjour, je suis très motivé par ce poste et disponible immédiatement.",
+    "Candidat orienté suite à un entretien, il a déjà une expérience dans ce domaine.",
+    "Madame, Monsieur, je souhaiterais rejoindre votre structure pour reprendre une activité.",
+    "",
+]
+
+
+class Command(BaseCommand):
+    """
+    Generate a volume of data close to production's, to reproduce performance issues locally:
+    SIAEs with members and job descriptions, prescriber organizations with members,
+    job seekers, job applications with their transition logs, PASS IAE and PE approvals.
+
+    Objects are built with the factories and inserted in bulk. Generated users
+    can log in with the factories' `DEFAULT_PASSWORD`.
+
+    Cities and appellations (ROME) are not generated: load them first so that
+    SIAEs get coordinates (needed by the search) and job descriptions.
+
+    With `--seed`, cities, appellations and the distribution of objects are the same
+    from one run to another (emails, SIRETs and ASP IDs are unique per run).
+
+    Existing data is kept and PASS IAE numbers are consumed: never run this in production.
+
+    To run the command:
+        django-admin generate_large_dataset
+        django-admin generate_large_dataset --scale=0.1 --seed=42
+    """
+
+    help = "Generate a large dataset, close to production's volume."
+
+    NB_SIAES = 5_000
+    NB_MEMBERS_PER_SIAE = 2
+    NB_JOB_DESCRIPTIONS_PER_SIAE = 3
+    NB_PRESCRIBER_ORGANIZATIONS = 2_000
+    NB_MEMBERS_PER_PRESCRIBER_ORGANIZATION = 2
+    NB_JOB_SEEKERS = 100_000
+    NB_JOB_APPLICATIONS = 500_000
+    NB_PE_APPROVALS = 50_000
+
+    # Number of objects built and inserted at once
+    BATCH_SIZE = 5_000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale", dest="scale", type=float, default=1.0, help="Multiply the number of generated objects"
+        )
+        parser.add_argument("--seed", dest="seed", type=int, help="Seed of the random generator")
+
+    def scaled(self, count):
+        return max(1, round(count * self.scale))
+
+    def build_users(self, factory, count, kind):
+        users = []
+        for i in range(count):
+            name = f"{kind}-{self.run_id}-{i}"
+            # Hashing a password for each user would take hours.
+            user = factory.build(username=name, email=f"{name}@example.com", password=None)
+            user.password = self.password
+            users.append(user)
+        return users
+
+    def create_siaes(self):
+        count = self.scaled(self.NB_SIAES)
+        conventions = SiaeConvention.objects.bulk_create(
+            [
+                SiaeConventionFactory.build(
+                    asp_id=self.first_asp_id + i, siret_signature=f"9{self.run_number}{i:010d}"
+                )
+                for i in range(count)
+            ],
+            batch_size=self.BATCH_SIZE,
+        )
+
+        siaes = []
+        for i, convention in enumerate(conventions):
+            siae = SiaeFactory.build(convention=convention, siret=convention.siret_signature)
+            if self.cities:
+                city = random.choice(self.cities)
+                siae.coords = city.coords
+                siae.city = city.name
+                siae.department = city.department
+                siae.post_code = city.post_codes[0] if city.post_codes else ""
+            siaes.append(siae)
+        self.siaes = Siae.objects.bulk_create(siaes, batch_size=self.BATCH_SIZE)
+
+        members = User.objects.bulk_create(
+            self.build_users(SiaeStaffFactory, count * self.NB_MEMBERS_PER_SIAE, "siae-staff"),
+            batch_size=self.BATCH_SIZE,
+        )
+        self.siae_members = {}
+        memberships = []
+        for i, siae in enumerate(self.siaes):
+            siae_members = members[i * self.NB_MEMBERS_PER_SIAE : (i + 1) * self.NB_MEMBERS_PER_SIAE]
+            self.siae_members[siae.pk] = siae_members
+            for j, user in enumerate(siae_members):
+                memberships.append(SiaeMembership(siae=siae, user=user, is_siae_admin=j == 0))
+        SiaeMembership.objects.bulk_create(memberships, batch_size=self.BATCH_SIZE)
+
+        self.job_descriptions = {}
+        if self.appellation_pks:
+            job_descriptions = []
+            for siae in self.siaes:
+                nb_job_descriptions = min(self.NB_JOB_DESCRIPTIONS_PER_SIAE, len(self.appellation_pks))
+                for appellation_pk in random.sample(self.appellation_pks, nb_job_descriptions):
+                    job_descriptions.append(SiaeJobDescription(siae=siae, appellation_id=appellation_pk))
+            for job_description in SiaeJobDescription.objects.bulk_create(
+                job_descriptions, batch_size=self.BATCH_SIZE
+            ):
+                self.job_descriptions.setdefault(job_description.siae_id, []).append(job_description)
+        else:
+            self.stdout.write("No appellations: job descriptions skipped (import ROME data first).")
+
+        self.stdout.write(f"SIAEs: {len(self.siaes)}, members: {len(members)}")
+
+    def create_prescriber_organizations(self):
+        count = self.scaled(self.NB_PRESCRIBER_ORGANIZATIONS)
+        organizations = []
+        for i in range(count):
+            # A third of organizations are authorized.
+            organization = PrescriberOrganizationFactory.build(siret=f"8{self.run_number}{i:010d}")
+            if i % 3 == 0:
+                organization.is_authorized = True
+                organization.authorization_status = PrescriberOrganization.AuthorizationStatus.VALIDATED
+            organizations.append(organization)
+        self.organizations = PrescriberOrganization.objects.bulk_create(organizations, batch_size=self.BATCH_SIZE)
+
+        members = User.objects.bulk_create(
+            self.build_users(PrescriberFactory, count * self.NB_MEMBERS_PER_PRESCRIBER_ORGANIZATION, "prescriber"),
+            batch_size=self.BATCH_SIZE,
+        )
+        self.organization_members = {}
+        memberships = []
+        n = self.NB_MEMBERS_PER_PRESCRIBER_ORGANIZATION
+        for i, organization in enumerate(self.organizations):
+            organization_members = members[i * n : (i + 1) * n]
+            self.organization_members[organization.pk] = organization_members
+            for j, user in enumerate(organization_members):
+                memberships.append(PrescriberMembership(organization=organization, user=user, is_admin=j == 0))
+        PrescriberMembership.objects.bulk_create(memberships, batch_size=self.BATCH_SIZE)
+
+        self.stdout.write(f"Prescriber organizations: {len(self.organizations)}, members: {len(members)}")
+
+    def create_job_seekers(self):
+        count = self.scaled(self.NB_JOB_SEEKERS)
+        self.job_seekers = []
+        for start in range(0, count, self.BATCH_SIZE):
+            job_seekers = self.build_users(JobSeekerFactory, min(self.BATCH_SIZE, count - start), f"job-seeker{start}")
+            for job_seeker in job_seekers:
+                if self.cities:
+                    city = random.choice(self.cities)
+                    job_seeker.city = city.name
+                    job_seeker.department = city.department
+                    job_seeker.post_code = city.post_codes[0] if city.post_codes else ""
+            self.job_seekers += User.objects.bulk_create(job_seekers)
+        self.stdout.write(f"Job seekers: {len(self.job_seekers)}")
+
+    def get_approval_numbers(self, count):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [Approval.NUMBER_SEQUENCE_NAME, count])
+            return [f"{Approval.ASP_ITOU_PREFIX}{number:07d}" for number, in cursor.fetchall()]
+
+    def build_job_application(self, now):
+        job_seeker = random.choice(self.job_seekers)
+        to_siae = random.choice(self.siaes)
+        sender_kind = random.choices(list(SENDER_KINDS), weights=list(SENDER_KINDS.values()))[0]
+        state = random.choices(list(STATES), weights=[weight for weight, _ in STATES.values()])[0]
+        created_at = now - datetime.timedelta(days=random.randint(0, 3 * 365), seconds=random.randint(0, 86400))
+
+        kwargs = {"sender_kind": sender_kind, "sender": job_seeker}
+        if sender_kind == JobApplication.SENDER_KIND_PRESCRIBER:
+            organization = random.choice(self.organizations)
+            kwargs["sender_prescriber_organization"] = organization
+            kwargs["sender"] = random.choice(self.organization_members[organization.pk])
+        elif sender_kind == JobApplication.SENDER_KIND_SIAE_STAFF:
+            kwargs["sender_siae"] = to_siae
+            kwargs["sender"] = random.choice(self.siae_members[to_siae.pk])
+
+        return JobApplicationFactory.build(
+            job_seeker=job_seeker,
+            to_siae=to_siae,
+            state=state,
+            created_at=created_at,
+            hiring_start_at=(created_at + datetime.timedelta(days=7)).date(),
+            hiring_end_at=(created_at + datetime.timedelta(days=7 + 365)).date(),
+            message=random.choice(MESSAGES),
+            answer=random.choice(MESSAGES),
+            **kwargs,
+        )
+
+    def create_job_applications_batch(self, count, now):
+        job_applications = [self.build_job_application(now) for _ in range(count)]
+        logs = []
+        for job_application in job_applications:
+            timestamp = job_application.created_at
+            from_state = JobApplicationWorkflow.STATE_NEW
+            for transition in STATES[job_application.state][1]:
+                timestamp += datetime.timedelta(days=random.randint(1, 15))
+                to_state = JobApplicationWorkflow.transitions[transition].target.name
+                logs.append(
+                    JobApplicationTransitionLog(
+                        job_application=job_application,
+                        transition=transition,
+                        from_state=from_state,
+                        to_state=to_state,
+                        timestamp=timestamp,
+                        user=job_application.sender,
+                    )
+                )
+                from_state = to_state
+            job_application.last_change_at = timestamp
+
+        # Hired job seekers get a PASS IAE, shared by all their hirings.
+        hired = [
+            job_application
+            for job_application in job_applications
+            if job_application.state == JobApplicationWorkflow.STATE_ACCEPTED
+            and job_application.job_seeker_id not in self.approvals
+        ]
+        new_approvals = {}
+        for job_application in hired:
+            new_approvals.setdefault(
+                job_application.job_seeker_id,
+                ApprovalFactory.build(
+                    user=job_application.job_seeker,
+                    start_at=job_application.hiring_start_at,
+                    end_at=Approval.get_default_end_date(job_application.hiring_start_at),
+                    created_by=job_application.sender,
+                ),
+            )
+        for approval, number in zip(new_approvals.values(), self.get_approval_numbers(len(new_approvals))):
+            approval.number = number
+        Approval.objects.bulk_create(new_approvals.values())
+        self.approvals.update(new_approvals)
+        for job_application in job_applications:
+            if job_application.state == JobApplicationWorkflow.STATE_ACCEPTED:
+                job_application.approval = self.approvals[job_application.job_seeker_id]
+                job_application.approval_delivery_mode = JobApplication.APPROVAL_DELIVERY_MODE_AUTOMATIC
+                job_application.approval_number_sent_by_email = True
+                job_application.approval_number_sent_at = job_application.last_change_at
+
+        JobApplication.objects.bulk_create(job_applications)
+        JobApplicationTransitionLog.objects.bulk_create(logs)
+        JobApplication.selected_jobs.through.objects.bulk_create(
+            [
+                JobApplication.selected_jobs.through(
+                    jobapplication_id=job_application.pk,
+                    siaejobdescription_id=random.choice(self.job_descriptions[job_application.to_siae_id]).pk,
+                )
+                for job_application in job_applications
+                if job_application.to_siae_id in self.job_descriptions
+            ]
+        )
+        return len(logs)
+
+    def create_job_applications(self):
+        count = self.scaled(self.NB_JOB_APPLICATIONS)
+        now = timezone.now()
+        self.approvals = {}
+        nb_logs = 0
+        for start in range(0, count, self.BATCH_SIZE):
+            with transaction.atomic():
+                nb_logs += self.create_job_applications_batch(min(self.BATCH_SIZE, count - start), now)
+            self.stdout.write(f"Job applications: {min(start + self.BATCH_SIZE, count)}/{count}")
+        self.stdout.write(f"Transition logs: {nb_logs}, PASS IAE: {len(self.approvals)}")
+
+    def create_pe_approvals(self):
+        count = self.scaled(self.NB_PE_APPROVALS)
+        pe_approvals = []
+        for i in range(count):
+            # Some of them belong to generated job seekers.
+            job_seeker = random.choice(self.job_seekers) if i % 10 == 0 else None
+            kwargs = {}
+            if job_seeker:
+                kwargs = {
+                    "pole_emploi_id": job_seeker.pole_emploi_id,
+                    "birthdate": job_seeker.birthdate,
+                    "first_name": PoleEmploiApproval.format_name_as_pole_emploi(job_seeker.first_name),
+                    "last_name": PoleEmploiApproval.format_name_as_pole_emploi(job_seeker.last_name),
+                }
+            start_at = datetime.date.today() - datetime.timedelta(days=random.randint(0, 5 * 365))
+            pe_approvals.append(PoleEmploiApprovalFactory.build(start_at=start_at, **kwargs))
+        PoleEmploiApproval.objects.bulk_create(pe_approvals, batch_size=self.BATCH_SIZE)
+        self.stdout.write(f"PE approvals: {count}")
+
+    def sample(self, queryset, count):
+        """
+        Returns the pks of (up to) `count` random objects of `queryset`.
+        """
+        pks = list(queryset.order_by("pk").values_list("pk", flat=True))
+        return random.sample(pks, min(count, len(pks)))
+
+    def handle(self, scale, seed=None, **options):
+        if settings.ITOU_ENVIRONMENT == "PROD":
+            raise CommandError("This command generates fake data and must not be run in production.")
+        if scale <= 0:
+            raise CommandError("`--scale` must be positive.")
+
+        random.seed(seed)
+        # Random values of factories (names, addresses…).
+        factory.random.reseed_random(seed)
+        self.scale = scale
+        # Unique per run (even with the same seed), to generate unique emails, SIRETs and ASP IDs.
+        self.run_id = uuid.uuid4().hex[:8]
+        self.run_number = int(self.run_id, 16) % 900 + 100
+        self.first_asp_id = self.run_number * 10_000_000
+        self.password = make_password(DEFAULT_PASSWORD)
+        # Picked with `random` rather than `order_by("?")`, so that they depend on the seed.
+        city_pks = self.sample(City.objects.exclude(coords=None), 500)
+        cities = City.objects.in_bulk(city_pks)
+        self.cities = [cities[pk] for pk in city_pks]
+        self.appellation_pks = self.sample(Appellation.objects.all(), 1000)
+        if not self.cities:
+            self.stdout.write("No cities: SIAEs won't be found by the search (import cities first).")
+
+        self.create_siaes()
+        self.create_prescriber_organizations()
+        self.create_job_seekers()
+        self.create_job_applications()
+        self.create_pe_approvals()
+
+        # Update the statistics of the planner.
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write("Done.")
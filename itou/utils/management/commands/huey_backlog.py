@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from huey.contrib.djhuey import HUEY
+
+from itou.utils.queues import get_queue
+
+
+class Command(BaseCommand):
+    """
+    Show the backlog of Huey queues (default queue and named queues)
+    and the metrics of their tasks (see `itou.utils.queues.ItouHuey`).
+
+    To run the command:
+        django-admin huey_backlog
+        django-admin huey_backlog --reset-metrics
+    """
+
+    help = "Show the backlog and task metrics of Huey queues."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset-metrics", dest="reset_metrics", action="store_true", help="Reset metrics after showing them"
+        )
+
+    def show_queue(self, label, queue):
+        self.stdout.write(f"Queue {label} ({queue.name}):")
+        self.stdout.write(f"  pending: {queue.pending_count()}, scheduled: {queue.scheduled_count()}")
+
+        for task_name, metrics in sorted(queue.get_metrics().items()):
+            executed = metrics.get("executed", 0)
+            # Latency is recorded when a task starts, duration when it ends
+            started = executed or 1
+            self.stdout.write(
+                f"  {task_name}: {executed:.0f} executed, "
+                f"{metrics.get('errors', 0):.0f} errors, "
+                f"{metrics.get('retries', 0):.0f} retries, "
+                f"avg duration {metrics.get('duration', 0) / started:.3f}s, "
+                f"avg latency {metrics.get('latency', 0) / started:.3f}s, "
+                f"{metrics.get('db_connections', 0):.0f} DB connections opened "
+                f"in {metrics.get('db_connect_duration', 0):.3f}s"
+            )
+
+    def handle(self, reset_metrics=False, **options):
+        queues = [("default", HUEY)] + [(name, get_queue(name)) for name in settings.HUEY_QUEUES]
+
+        for label, queue in queues:
+            self.show_queue(label, queue)
+            if reset_metrics:
+                queue.reset_metrics()
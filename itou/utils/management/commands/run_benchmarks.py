@@ -0,0 +1,176 @@
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core import management
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from itou.cities.models import City
+from itou.job_applications.models import JobApplication
+from itou.prescribers.models import PrescriberOrganization
+from itou.siaes.models import Siae
+from itou.users.models import User
+from itou.utils.profiling.queries import QueryProfile
+
+
+class Command(BaseCommand):
+    """
+    Time key endpoints and commands on the current database, ideally filled by
+    `generate_large_dataset`, and write the results as JSON to compare them across commits.
+
+    Endpoints are requested with the test client, as the users with the most data.
+    Each benchmark is run `--repeat` times; min, median and max durations and
+    the number of SQL queries of the last run are reported.
+
+    To run the benchmarks:
+        django-admin run_benchmarks --output=benchmarks.json
+        django-admin run_benchmarks --only=list_for_siae --only=search_siaes --repeat=10
+        django-admin run_benchmarks --output=after.json --compare=before.json
+    """
+
+    help = "Time key endpoints and commands."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", dest="repeat", type=int, default=5, help="Number of runs of each benchmark")
+        parser.add_argument(
+            "--only", dest="only", action="append", help="Only run this benchmark (can be given several times)"
+        )
+        parser.add_argument("--output", dest="output", help="Write the results to this JSON file")
+        parser.add_argument("--compare", dest="compare", help="Compare the results with this JSON file")
+
+    def get_client(self, user):
+        # `ALLOWED_HOSTS` of dev settings contain `localhost`, not the default `testserver`.
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(user)
+        return client
+
+    def get_benchmarks(self):
+        """
+        Returns a dict {benchmark name: function}.
+        Benchmarks needing missing data (e.g. no cities for the search) are left out.
+        """
+        benchmarks = {}
+
+        siae = Siae.objects.annotate(nb=Count("job_applications_received")).order_by("-nb").first()
+        siae_member = siae.members.first() if siae else None
+        if siae_member:
+            siae_client = self.get_client(siae_member)
+            month = timezone.localdate().strftime("%Y-%m")
+            benchmarks["dashboard"] = lambda: siae_client.get(reverse("dashboard:index"))
+            benchmarks["list_for_siae"] = lambda: siae_client.get(reverse("apply:list_for_siae"))
+            benchmarks["list_for_siae_exports"] = lambda: siae_client.get(reverse("apply:list_for_siae_exports"))
+            benchmarks["list_for_siae_exports_download"] = lambda: b"".join(
+                siae_client.get(reverse("apply:list_for_siae_exports_download", args=[month])).streaming_content
+            )
+
+        organization = PrescriberOrganization.objects.annotate(nb=Count("jobapplication")).order_by("-nb").first()
+        prescriber = organization.members.first() if organization else None
+        if prescriber:
+            prescriber_client = self.get_client(prescriber)
+            benchmarks["list_for_prescriber"] = lambda: prescriber_client.get(reverse("apply:list_for_prescriber"))
+
+        job_seeker = (
+            User.objects.filter(is_job_seeker=True).annotate(nb=Count("job_applications")).order_by("-nb").first()
+        )
+        if job_seeker:
+            job_seeker_client = self.get_client(job_seeker)
+            benchmarks["list_for_job_seeker"] = lambda: job_seeker_client.get(reverse("apply:list_for_job_seeker"))
+
+        city = City.objects.filter(department__in=Siae.objects.values("department")).exclude(coords=None).first()
+        if city:
+            anonymous_client = Client(HTTP_HOST="localhost")
+            benchmarks["search_siaes"] = lambda: anonymous_client.get(
+                reverse("search:siaes_results"), {"city": city.slug, "distance": 50}
+            )
+
+        benchmarks["export_approvals"] = lambda: management.call_command("export_approvals", stdout=io.StringIO())
+        if settings.METABASE_HOST:
+            benchmarks["populate_metabase"] = lambda: management.call_command(
+                "populate_metabase", dry_run=True, stdout=io.StringIO()
+            )
+
+        return benchmarks
+
+    def run_benchmark(self, function, repeat):
+        durations = []
+        for _ in range(repeat):
+            profile = QueryProfile()
+            started_at = time.perf_counter()
+            with connection.execute_wrapper(profile):
+                function()
+            durations.append(time.perf_counter() - started_at)
+        return {
+            "min": min(durations),
+            "median": statistics.median(durations),
+            "max": max(durations),
+            "queries": profile.count,
+            "db_time": profile.duration,
+        }
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.ROOT_DIR
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, results, path):
+        with open(path) as f:
+            previous_results = json.load(f)["results"]
+        self.stdout.write(f"Compared with {path} (median):")
+        for name, result in results.items():
+            previous = previous_results.get(name)
+            if previous:
+                ratio = result["median"] / previous["median"]
+                self.stdout.write(
+                    f"  {name}: {previous['median'] * 1000:.1f}ms -> {result['median'] * 1000:.1f}ms (x{ratio:.2f}), "
+                    f"{previous['queries']} -> {result['queries']} queries"
+                )
+
+    def handle(self, repeat, only=None, output=None, compare=None, **options):
+        if repeat < 1:
+            raise CommandError("`--repeat` must be positive.")
+
+        benchmarks = self.get_benchmarks()
+        if only:
+            unknown = set(only) - set(benchmarks)
+            if unknown:
+                raise CommandError(f"Unknown or unavailable benchmarks: {', '.join(sorted(unknown))}.")
+            benchmarks = {name: benchmarks[name] for name in only}
+
+        results = {}
+        for name, function in benchmarks.items():
+            result = results[name] = self.run_benchmark(function, repeat)
+            self.stdout.write(
+                f"{name}: {result['median'] * 1000:.1f}ms (median of {repeat}), {result['queries']} queries"
+            )
+
+        if output:
+            data = {
+                "commit": self.get_commit(),
+                "date": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "repeat": repeat,
+                "dataset": {
+                    "siaes": Siae.objects.count(),
+                    "job_seekers": User.objects.filter(is_job_seeker=True).count(),
+                    "job_applications": JobApplication.objects.count(),
+                },
+                "results": results,
+            }
+            with open(output, "w") as f:
+                json.dump(data, f, indent=2)
+            self.stdout.write(f"Results written to {output}")
+
+        if compare:
+            self.compare(results, compare)
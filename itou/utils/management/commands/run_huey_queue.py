@@ -0,0 +1,52 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules
+from huey.consumer_options import ConsumerConfig
+
+from itou.utils.queues import get_queue
+
+
+class Command(BaseCommand):
+    """
+    Run the consumer of a named Huey queue (see `settings.HUEY_QUEUES`).
+
+    The default queue is still consumed by `run_huey`.
+
+    To run the command:
+        django-admin run_huey_queue emails
+        django-admin run_huey_queue external_data --workers=8
+    """
+
+    help = "Run the consumer of a named Huey queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("queue", choices=list(settings.HUEY_QUEUES), help="Name of the queue")
+        parser.add_argument("--workers", dest="workers", type=int, help="Override the number of workers")
+        parser.add_argument(
+            "--worker-type", dest="worker_type", choices=["thread", "process"], help="Override the type of workers"
+        )
+
+    def handle(self, queue, workers=None, worker_type=None, **options):
+        consumer_options = dict(settings.HUEY_QUEUES[queue])
+        if workers is not None:
+            consumer_options["workers"] = workers
+        if worker_type is not None:
+            consumer_options["worker_type"] = worker_type
+
+        config = ConsumerConfig(**consumer_options)
+        try:
+            config.validate()
+        except ValueError as e:
+            raise CommandError(e)
+
+        # Register tasks defined in `tasks.py` modules, as `run_huey` does.
+        autodiscover_modules("tasks")
+
+        logger = logging.getLogger("huey")
+        if not logger.handlers:
+            config.setup_logger(logger)
+
+        self.stdout.write(f"Starting consumer of queue {queue}: {config.workers} {config.worker_type} worker(s)")
+        get_queue(queue).create_consumer(**config.values).run()
@@ -0,0 +1,67 @@
+import signal
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """
+    Run the consumers of all Huey queues, each in its own process:
+    - the default queue (`django-admin run_huey`),
+    - the named queues of `settings.HUEY_QUEUES` (`django-admin run_huey_queue <name>`).
+
+    Workers are run in prod with this command (see `settings.HUEY`).
+
+    SIGTERM and SIGINT are forwarded to all consumers. If a consumer stops on its own,
+    the others are stopped and the command fails, so that the worker is restarted.
+
+    To run the command:
+        django-admin run_huey_workers
+    """
+
+    help = "Run the consumers of the default Huey queue and of all named queues."
+
+    # Interval between two checks of the consumer processes, in seconds.
+    POLL_INTERVAL = 1
+
+    def get_consumer_commands(self, options):
+        commands = [["run_huey"]] + [["run_huey_queue", name] for name in settings.HUEY_QUEUES]
+        extra_args = [f"--settings={options['settings']}"] if options.get("settings") else []
+        return [[sys.executable, "-m", "django", *command, *extra_args] for command in commands]
+
+    def handle(self, **options):
+        commands = self.get_consumer_commands(options)
+        processes = [subprocess.Popen(command) for command in commands]
+        stopping = False
+
+        def stop(signum, frame=None):
+            nonlocal stopping
+            stopping = True
+            for process in processes:
+                if process.poll() is None:
+                    process.send_signal(signum)
+
+        previous_handlers = {signum: signal.signal(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        failed = None
+        try:
+            while not stopping and all(process.poll() is None for process in processes):
+                time.sleep(self.POLL_INTERVAL)
+            if not stopping:
+                failed = next(
+                    (command, process.returncode)
+                    for command, process in zip(commands, processes)
+                    if process.poll() is not None
+                )
+                stop(signal.SIGTERM)
+            for process in processes:
+                process.wait()
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+        if failed:
+            command, returncode = failed
+            raise CommandError(f"Consumer `{' '.join(command[3:])}` stopped with code {returncode}.")
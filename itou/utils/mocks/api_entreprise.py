@@ -2,6 +2,8 @@
 Result for a call to:
 https://entreprise.api.gouv.fr/v2/etablissements/26570134200148
 """
+import httpx
+
 
 ETABLISSEMENT_API_RESULT_MOCK = {
     "etablissement": {
@@ -44,3 +46,26 @@ ETABLISSEMENT_API_RESULT_MOCK = {
     },
     "gateway_error": False,
 }
+
+
+class ApiEntrepriseMockTransport(httpx.MockTransport):
+    """
+    Local API Entreprise, see `itou.utils.apis.api_entreprise.ApiEntrepriseClient`.
+
+    Answers `ETABLISSEMENT_API_RESULT_MOCK` for its SIRET and a 422 error for other SIRETs,
+    or `status_code` for all of them if given. Received requests are kept in `requests`.
+    """
+
+    def __init__(self, status_code=None):
+        self.status_code = status_code
+        self.requests = []
+        super().__init__(self.respond)
+
+    def respond(self, request):
+        self.requests.append(request)
+        if self.status_code:
+            return httpx.Response(self.status_code, json={})
+        siret = request.url.path.rsplit("/", 1)[-1]
+        if siret == ETABLISSEMENT_API_RESULT_MOCK["etablissement"]["siret"]:
+            return httpx.Response(200, json=ETABLISSEMENT_API_RESULT_MOCK)
+        return httpx.Response(422, json={"errors": ["Le numéro de siret n'est pas correctement formatté"]})
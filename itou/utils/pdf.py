@@ -1,7 +1,15 @@
+import functools
+import hashlib
 import io
+import os
 
 import httpx
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.utils.module_loading import import_string
+
+from itou.utils import queues
 
 
 class HtmlToPdf:
@@ -61,3 +69,125 @@ class HtmlToPdf:
         if self.autoclose:
             self.file.close()
         return self
+
+
+# Renderers
+# ---------
+# `settings.PDF_RENDERER` is the dotted path of the renderer class.
+
+
+class PdfShiftRenderer:
+    """
+    Render HTML with the PDF Shift API.
+    """
+
+    def render(self, html):
+        return HtmlToPdf.html_to_bytes(html)
+
+
+class LocalRenderer:
+    """
+    Stand-in of `PdfShiftRenderer` for tests and local development: no API call,
+    returns a one-page PDF containing the hash of the HTML.
+    """
+
+    def render(self, html):
+        text = f"Document de test {hashlib.sha256(html.encode()).hexdigest()}".encode()
+        content = b"BT /F1 12 Tf 50 780 Td (%s) Tj ET" % text
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R "
+            b"/Resources << /Font << /F1 5 0 R >> >> >>",
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        ]
+        pdf = b"%PDF-1.4\n"
+        offsets = []
+        for number, obj in enumerate(objects, 1):
+            offsets.append(len(pdf))
+            pdf += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+        xref_offset = len(pdf)
+        pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+        return pdf
+
+
+def get_pdf_renderer():
+    return import_string(settings.PDF_RENDERER)()
+
+
+# Storage
+# -------
+# Rendered documents are stored by content: the path contains the hash of the HTML,
+# so a document is rendered again only when its content changes.
+#
+# Documents are rendered by a Huey task of the "exports" queue: the storage
+# (`settings.PDF_STORAGE_CLASS`) must be shared by web and worker instances.
+# They're deleted after `settings.PDF_RETENTION_DAYS` days (see the `delete_old_pdfs` command).
+
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_storage():
+    return import_string(settings.PDF_STORAGE_CLASS)(**settings.PDF_STORAGE_OPTIONS)
+
+
+def get_pdf_path(folder, html):
+    return f"{folder}/{hashlib.sha256(html.encode()).hexdigest()}.pdf"
+
+
+def get_rendering_key(path):
+    """
+    Cache key of the marker set while the document at `path` is being rendered.
+    """
+    return f"pdf_rendering:{path}"
+
+
+@queues.task("exports")
+def render_pdf(html, path):
+    """
+    Render `html` and store the PDF at `path`, unless it's already done.
+    Other documents of the folder (i.e. former versions) are deleted.
+    """
+    storage = get_pdf_storage()
+    try:
+        if storage.exists(path):
+            return path
+
+        storage.save(path, ContentFile(get_pdf_renderer().render(html)))
+
+        folder, filename = os.path.split(path)
+        for other_filename in storage.listdir(folder)[1]:
+            if other_filename != filename:
+                storage.delete(os.path.join(folder, other_filename))
+    finally:
+        cache.delete(get_rendering_key(path))
+
+    return path
+
+
+def get_or_render_pdf(html, folder):
+    """
+    Return the stored PDF document (an opened file) of `html`.
+
+    If it does not exist yet, `None` is returned and the document is rendered by a Huey
+    task, to be served by a later call. A marker is kept in the cache during the rendering
+    (for up to `settings.PDF_RENDERING_TIMEOUT` seconds): the task is enqueued once.
+    """
+    storage = get_pdf_storage()
+    path = get_pdf_path(folder, html)
+
+    if not storage.exists(path):
+        # `add()` returns `None` (not `False`) when the cache is unavailable: enqueue the task anyway.
+        if cache.add(get_rendering_key(path), True, settings.PDF_RENDERING_TIMEOUT) is not False:
+            render_pdf(html, path)
+        # The document is ready right away only if Huey runs in immediate mode.
+        if not storage.exists(path):
+            return None
+
+    try:
+        return storage.open(path)
+    except FileNotFoundError:
+        # Deleted in the meantime by the rendering of a newer version of the document.
+        return None
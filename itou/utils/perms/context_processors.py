@@ -1,9 +1,10 @@
 from collections import OrderedDict
 
-from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.urls import reverse
 
+from itou.utils.perms.organization_context import OrganizationContext
+
 
 def get_current_organization_and_perms(request):
     """
@@ -21,49 +22,22 @@ def get_current_organization_and_perms(request):
     current_user = request.user
 
     if current_user.is_authenticated:
+        organization_context = OrganizationContext.get(request)
+
         # SIAE ?
-        siae_pk = request.session.get(settings.ITOU_SESSION_CURRENT_SIAE_KEY)
-        if siae_pk:
-            # Sorry I could not find an elegant DNRY one-query solution ¯\_(ツ)_/¯
-            user_siae_set_pks = request.user.siae_set.active_or_in_grace_period().values_list("pk", flat=True)
-            # SIAE members can be deactivated, hence filtering on `membership.is_active`
-            memberships = (
-                request.user.siaemembership_set.active()
-                .select_related("siae")
-                .filter(siae__pk__in=user_siae_set_pks)
-                .order_by("created_at")
-                .all()
-            )
-            user_siaes = [membership.siae for membership in memberships]
-            for membership in memberships:
-                if membership.siae_id == siae_pk:
-                    siae = membership.siae
-                    user_is_siae_admin = membership.is_siae_admin
-                    break
+        if organization_context.current_siae_pk:
+            user_siaes = organization_context.siaes
+            siae = organization_context.current_siae
+            user_is_siae_admin = organization_context.is_siae_admin
             if siae is None:
                 if request.path != reverse("account_logout"):
                     raise PermissionDenied
 
         # Prescriber organization ?
-        prescriber_org_pk = request.session.get(settings.ITOU_SESSION_CURRENT_PRESCRIBER_ORG_KEY)
-
-        if prescriber_org_pk:
-            # Membership can now be deactivated, hence filtering on `membership.is_active` (same as SIAE above)
-            memberships = (
-                current_user.prescribermembership_set.filter(is_active=True)
-                .order_by("created_at")
-                .select_related("organization")
-            )
-
-            for membership in memberships:
-                # Same as above:
-                # In order to avoid an extra SQL query, fetch related organizations
-                # and artifially reconstruct the list of organizations the user belongs to
-                # (and other stuff while at it)
-                user_prescriberorganizations.append(membership.organization)
-                if membership.organization.pk == prescriber_org_pk:
-                    prescriber_organization = membership.organization
-                    user_is_prescriber_org_admin = membership.is_admin
+        if organization_context.current_prescriber_organization_pk:
+            user_prescriberorganizations = organization_context.prescriber_organizations
+            prescriber_organization = organization_context.current_prescriber_organization
+            user_is_prescriber_org_admin = organization_context.is_prescriber_organization_admin
 
     context = {
         "current_prescriber_organization": prescriber_organization,
@@ -4,6 +4,9 @@ from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils import safestring
 
+from itou.siaes.models import Siae
+from itou.utils.perms.organization_context import OrganizationContext
+
 
 class ItouCurrentOrganizationMiddleware:
     """
@@ -21,11 +24,13 @@ class ItouCurrentOrganizationMiddleware:
         user = request.user
 
         if user.is_authenticated:
+            organization_context = OrganizationContext.get(request)
+
             if user.is_siae_staff:
                 current_siae_pk = request.session.get(settings.ITOU_SESSION_CURRENT_SIAE_KEY)
-                siae_set = user.siae_set.filter(siaemembership__is_active=True).active_or_in_grace_period()
 
-                if not siae_set.filter(pk=current_siae_pk).exists():
+                if current_siae_pk not in organization_context.siae_pks:
+                    siae_set = Siae.objects.filter(pk__in=organization_context.siae_pks)
                     # User is no longer an active member of siae stored in session,
                     # or siae stored in session no longer exists.
                     # Let's automatically switch to another siae when possible,
@@ -33,14 +38,10 @@ class ItouCurrentOrganizationMiddleware:
                     first_siae = siae_set.active().first() or siae_set.first()
                     if first_siae:
                         request.session[settings.ITOU_SESSION_CURRENT_SIAE_KEY] = first_siae.pk
-                    elif (
-                        request.path
-                        not in [
-                            reverse("account_logout"),
-                            reverse("account_login"),
-                        ]
-                        and not request.path.startswith("/invitations/")
-                    ):
+                    elif request.path not in [
+                        reverse("account_logout"),
+                        reverse("account_login"),
+                    ] and not request.path.startswith("/invitations/"):
                         # SIAE user has no active SIAE and thus must not be able to access any page,
                         # thus we force a logout with a few exceptions:
                         # - logout (to avoid infinite redirect loop)
@@ -71,13 +72,12 @@ class ItouCurrentOrganizationMiddleware:
                 # Prescriber users can now select an organization
                 # (if they are member of several prescriber organizations)
                 current_prescriber_org_key = request.session.get(settings.ITOU_SESSION_CURRENT_PRESCRIBER_ORG_KEY)
-                if user.is_prescriber_with_org:
+                if organization_context.prescriber_organization_pks:
                     if not current_prescriber_org_key:
                         # Choose first prescriber organization for user if none is selected yet
                         # (f.i. after login)
-                        request.session[settings.ITOU_SESSION_CURRENT_PRESCRIBER_ORG_KEY] = (
-                            user.prescribermembership_set.filter(is_active=True).first().organization.pk
-                        )
+                        first_org_pk = organization_context.prescriber_organization_pks[0]
+                        request.session[settings.ITOU_SESSION_CURRENT_PRESCRIBER_ORG_KEY] = first_org_pk
                 elif current_prescriber_org_key:
                     # If the user is an "orienteur"
                     # => No need to track the current org in session (none)
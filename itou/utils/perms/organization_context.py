@@ -0,0 +1,158 @@
+"""
+Organizations of the current user (SIAEs or prescriber organizations) and the current
+one, computed once per request and shared by `ItouCurrentOrganizationMiddleware`, the
+`get_current_organization_and_perms` context processor, `get_current_siae_or_404`
+and `get_current_org_or_404`.
+
+Memberships are stored in the session for a short time along with a version of the
+user's memberships, kept in the cache. The version is changed (see
+`itou.utils.perms.signals`) whenever a membership, an organization or a convention
+of the user is written, so that the session copy is discarded.
+Organizations themselves are fetched with a single query, at most once per request.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from itou.prescribers.models import PrescriberOrganization
+from itou.siaes.models import Siae
+
+
+class OrganizationContext:
+
+    SESSION_KEY = "organization_context"
+    # Short enough to limit the impact of writes that don't send signals (e.g. `QuerySet.update()`).
+    SESSION_TIMEOUT = 5 * 60  # in seconds.
+
+    def __init__(self, request, data, siaes=None, prescriber_organizations=None):
+        self.request = request
+        self.data = data
+        # Organizations already fetched while computing `data`.
+        if siaes is not None:
+            self.__dict__["siaes"] = siaes
+        if prescriber_organizations is not None:
+            self.__dict__["prescriber_organizations"] = prescriber_organizations
+
+    @staticmethod
+    def get_version_cache_key(user_pk):
+        return f"organization_context_version:{user_pk}"
+
+    @classmethod
+    def get_version(cls, user_pk):
+        return cache.get_or_set(cls.get_version_cache_key(user_pk), uuid.uuid4().hex, None)
+
+    @classmethod
+    def invalidate(cls, user_pks):
+        cache.delete_many([cls.get_version_cache_key(user_pk) for user_pk in user_pks])
+
+    @classmethod
+    def get(cls, request):
+        """
+        Returns the context of the request's user, computing it only if it's neither
+        memoised on the request nor stored (and up to date) in the session.
+        """
+        context = getattr(request, "_organization_context", None)
+        if context is not None:
+            return context
+
+        user = request.user
+        version = cls.get_version(user.pk)
+        data = request.session.get(cls.SESSION_KEY)
+
+        if data and data["user_pk"] == user.pk and data["version"] == version and data["expires_at"] > time.time():
+            context = cls(request, data)
+        else:
+            context = cls.compute(request, version)
+            request.session[cls.SESSION_KEY] = context.data
+
+        request._organization_context = context
+        return context
+
+    @classmethod
+    def compute(cls, request, version):
+        user = request.user
+        siaes = []
+        prescriber_organizations = []
+        data = {
+            "user_pk": user.pk,
+            "version": version,
+            "expires_at": time.time() + cls.SESSION_TIMEOUT,
+            # Lists of [organization pk, user is admin], by membership creation date.
+            "siaes": [],
+            "prescriber_organizations": [],
+        }
+
+        if user.is_siae_staff:
+            # SIAE members can be deactivated, hence filtering on `membership.is_active`
+            memberships = (
+                user.siaemembership_set.active()
+                .filter(siae__in=Siae.objects.active_or_in_grace_period().values("pk"))
+                .select_related("siae__convention")
+                .order_by("created_at")
+            )
+            for membership in memberships:
+                siaes.append(membership.siae)
+                data["siaes"].append([membership.siae_id, membership.is_siae_admin])
+
+        if user.is_prescriber:
+            memberships = (
+                user.prescribermembership_set.filter(is_active=True)
+                .select_related("organization")
+                .order_by("created_at")
+            )
+            for membership in memberships:
+                prescriber_organizations.append(membership.organization)
+                data["prescriber_organizations"].append([membership.organization_id, membership.is_admin])
+
+        return cls(request, data, siaes=siaes, prescriber_organizations=prescriber_organizations)
+
+    # SIAEs.
+
+    @property
+    def siae_pks(self):
+        return [pk for pk, _ in self.data["siaes"]]
+
+    @property
+    def current_siae_pk(self):
+        return self.request.session.get(settings.ITOU_SESSION_CURRENT_SIAE_KEY)
+
+    @cached_property
+    def siaes(self):
+        siaes = Siae.objects.select_related("convention").in_bulk(self.siae_pks)
+        return [siaes[pk] for pk in self.siae_pks if pk in siaes]
+
+    @property
+    def current_siae(self):
+        return next((siae for siae in self.siaes if siae.pk == self.current_siae_pk), None)
+
+    @property
+    def is_siae_admin(self):
+        return any(pk == self.current_siae_pk and is_admin for pk, is_admin in self.data["siaes"])
+
+    # Prescriber organizations.
+
+    @property
+    def prescriber_organization_pks(self):
+        return [pk for pk, _ in self.data["prescriber_organizations"]]
+
+    @property
+    def current_prescriber_organization_pk(self):
+        return self.request.session.get(settings.ITOU_SESSION_CURRENT_PRESCRIBER_ORG_KEY)
+
+    @cached_property
+    def prescriber_organizations(self):
+        organizations = PrescriberOrganization.objects.in_bulk(self.prescriber_organization_pks)
+        return [organizations[pk] for pk in self.prescriber_organization_pks if pk in organizations]
+
+    @property
+    def current_prescriber_organization(self):
+        pk = self.current_prescriber_organization_pk
+        return next((organization for organization in self.prescriber_organizations if organization.pk == pk), None)
+
+    @property
+    def is_prescriber_organization_admin(self):
+        pk = self.current_prescriber_organization_pk
+        return any(org_pk == pk and is_admin for org_pk, is_admin in self.data["prescriber_organizations"])
@@ -1,11 +1,18 @@
 from django.conf import settings
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 
 from itou.prescribers.models import PrescriberOrganization
+from itou.utils.perms.organization_context import OrganizationContext
 
 
 def get_current_org_or_404(request):
-    pk = request.session.get(settings.ITOU_SESSION_CURRENT_PRESCRIBER_ORG_KEY)
-    queryset = PrescriberOrganization.objects.member_required(request.user)
-    organization = get_object_or_404(queryset, pk=pk)
+    if request.user.is_superuser:
+        # Superusers can access any prescriber organization.
+        pk = request.session.get(settings.ITOU_SESSION_CURRENT_PRESCRIBER_ORG_KEY)
+        return get_object_or_404(PrescriberOrganization.objects.member_required(request.user), pk=pk)
+
+    organization = OrganizationContext.get(request).current_prescriber_organization
+    if organization is None:
+        raise Http404
     return organization
@@ -1,11 +1,18 @@
 from django.conf import settings
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 
 from itou.siaes.models import Siae
+from itou.utils.perms.organization_context import OrganizationContext
 
 
 def get_current_siae_or_404(request):
-    pk = request.session.get(settings.ITOU_SESSION_CURRENT_SIAE_KEY)
-    queryset = Siae.objects.member_required(request.user)
-    siae = get_object_or_404(queryset, pk=pk)
+    if request.user.is_superuser:
+        # Superusers can access any SIAE.
+        pk = request.session.get(settings.ITOU_SESSION_CURRENT_SIAE_KEY)
+        return get_object_or_404(Siae.objects.member_required(request.user), pk=pk)
+
+    siae = OrganizationContext.get(request).current_siae
+    if siae is None:
+        raise Http404
     return siae
@@ -0,0 +1,39 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from itou.prescribers.models import PrescriberMembership, PrescriberOrganization
+from itou.siaes.models import Siae, SiaeConvention, SiaeMembership
+from itou.users.models import User
+from itou.utils.perms.organization_context import OrganizationContext
+
+
+@receiver([post_save, post_delete], sender=SiaeMembership)
+@receiver([post_save, post_delete], sender=PrescriberMembership)
+def invalidate_organization_context_for_membership(sender, instance, **kwargs):
+    OrganizationContext.invalidate([instance.user_id])
+
+
+@receiver(m2m_changed, sender=Siae.members.through)
+@receiver(m2m_changed, sender=PrescriberOrganization.members.through)
+def invalidate_organization_context_for_members(sender, instance, action, reverse, pk_set, **kwargs):
+    # `organization.members.add(user)` doesn't save memberships with `Model.save()`.
+    if action in ["post_add", "post_remove"]:
+        user_pks = [instance.pk] if reverse else pk_set
+    elif action == "pre_clear":
+        user_pks = [instance.pk] if reverse else instance.members.values_list("pk", flat=True)
+    else:
+        return
+    OrganizationContext.invalidate(user_pks)
+
+
+@receiver([post_save, post_delete], sender=Siae)
+@receiver([post_save, post_delete], sender=PrescriberOrganization)
+def invalidate_organization_context_for_organization(sender, instance, **kwargs):
+    OrganizationContext.invalidate(instance.members.values_list("pk", flat=True))
+
+
+@receiver([post_save, post_delete], sender=SiaeConvention)
+def invalidate_organization_context_for_convention(sender, instance, **kwargs):
+    # The convention decides whether its SIAEs are active or in their grace period.
+    user_pks = User.objects.filter(siaemembership__siae__convention=instance).values_list("pk", flat=True)
+    OrganizationContext.invalidate(user_pks)
@@ -1,5 +1,6 @@
 from collections import namedtuple
 
+from itou.utils.perms.organization_context import OrganizationContext
 from itou.utils.perms.prescriber import get_current_org_or_404
 from itou.utils.perms.siae import get_current_siae_or_404
 
@@ -29,7 +30,7 @@ def get_user_info(request):
 
     if request.user.is_prescriber:
         kind = KIND_PRESCRIBER
-        if request.user.is_prescriber_with_org:
+        if OrganizationContext.get(request).prescriber_organization_pks:
             prescriber_organization = get_current_org_or_404(request)
 
     is_authorized_prescriber = prescriber_organization.is_authorized if prescriber_organization else False
@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+from itou.utils.profiling.queries import (
+    QueryProfile,
+    get_index_names,
+    get_query_budget,
+    get_query_plan,
+    get_scan_nodes,
+    get_sort_nodes,
+)
+
+
+class QueryBudgetAssertionsMixin:
+    """
+    Mixin for `TestCase` checking the number of SQL queries of a view against
+    the budget it declares with `itou.utils.profiling.queries.query_budget`.
+    """
+
+    def assertWithinQueryBudget(self, method, *args, **kwargs):
+        """
+        Call `method` (e.g. `self.client.get`) and fail if the view exceeds its query budget:
+
+            response = self.assertWithinQueryBudget(self.client.get, url)
+
+        Returns the response.
+        """
+        profile = QueryProfile()
+        with connection.execute_wrapper(profile):
+            response = method(*args, **kwargs)
+
+        view_name = response.resolver_match.view_name
+        budget = get_query_budget(response.resolver_match.func)
+        if budget is None:
+            self.fail(f"No query budget declared for the `{view_name}` view.")
+        if profile.count > budget:
+            duplicates = "\n".join(f"{count} x {sql}" for sql, count in profile.get_duplicates().items())
+            self.fail(
+                f"The `{view_name}` view executed {profile.count} queries, its budget is {budget}.\n"
+                f"Duplicated queries:\n{duplicates or 'none'}"
+            )
+        return response
+
+
+class QueryPlanAssertionsMixin:
+    """
+    Mixin for `TestCase` checking the plans of queries, to detect missing indexes.
+    """
+
+    @contextmanager
+    def seqscan_disabled(self):
+        """
+        On the small tables of tests, sequential scans are cheaper than index scans.
+        Disabling them lets PostgreSQL choose an index whenever one can be used.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("RESET enable_seqscan")
+
+    def assertUsesIndexScan(self, queryset, max_rows=None, index_names=None, without_sort=False):
+        """
+        Fail if the table of `queryset`'s model is scanned sequentially, or if more than
+        `max_rows` rows of this table are expected to be read.
+
+        With `index_names`, also fail if none of these indexes is used to scan the table.
+        With `without_sort`, also fail if rows of the table are sorted after being read,
+        i.e. if the order of the queryset isn't given by the index.
+        """
+        table = queryset.model._meta.db_table
+        plan = get_query_plan(queryset)
+        nodes = list(get_scan_nodes(plan, table))
+        self.assertTrue(nodes, f"`{table}` is not scanned:\n{plan}")
+        for node in nodes:
+            self.assertNotEqual(node["Node Type"], "Seq Scan", f"Sequential scan of `{table}`:\n{plan}")
+            if max_rows is not None:
+                self.assertLessEqual(node["Plan Rows"], max_rows, f"Too many rows expected from `{table}`:\n{plan}")
+        if index_names is not None:
+            used_index_names = set().union(*(get_index_names(node) for node in nodes))
+            self.assertTrue(
+                used_index_names & set(index_names),
+                f"`{table}` is not scanned with {', '.join(index_names)} (but {used_index_names}):\n{plan}",
+            )
+        if without_sort:
+            for sort_node in get_sort_nodes(plan):
+                self.assertFalse(
+                    list(get_scan_nodes(sort_node, table)), f"Rows of `{table}` are sorted after the scan:\n{plan}"
+                )
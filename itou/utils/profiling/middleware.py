@@ -0,0 +1,95 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from itou.utils.profiling.queries import QueryProfile, get_query_budget
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfilingMiddleware:
+    """
+    Record the SQL queries of each request: number of queries, duplicated queries,
+    time spent in the DB and total time, by view name. Database connections opened
+    by the request (i.e. not reused) and time spent opening them are recorded too.
+
+    Enabled with `settings.ITOU_QUERY_PROFILING`. Results are logged as JSON
+    (a warning is logged when the view exceeds its `query_budget`) and sent in a
+    `Server-Timing` header, displayed by the network tab of browsers' dev tools.
+    Streaming responses are profiled until their content is consumed, they have
+    no `Server-Timing` header (it's sent before the content).
+    """
+
+    # Number of duplicated queries logged per request.
+    MAX_LOGGED_DUPLICATES = 5
+
+    def __init__(self, get_response):
+        if not settings.ITOU_QUERY_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        started = (connection.connections_opened, connection.connect_duration, time.perf_counter())
+        with connection.execute_wrapper(profile):
+            response = self.get_response(request)
+
+        if response.streaming:
+            # The queries of streaming responses (e.g. CSV exports) are executed while their content
+            # is consumed, once headers are sent: the profile is logged at the end, without `Server-Timing`.
+            response.streaming_content = self.profile_streaming_content(
+                response.streaming_content, request, response, profile, started
+            )
+            return response
+
+        data = self.log_profile(request, response, profile, started)
+        response["Server-Timing"] = (
+            f'db;dur={data["db_ms"]};desc="{profile.count} queries", '
+            f'db-connect;dur={data["db_connect_ms"]};desc="{data["db_connections"]} connections", '
+            f'total;dur={data["total_ms"]}'
+        )
+        return response
+
+    def profile_streaming_content(self, streaming_content, request, response, profile, started):
+        try:
+            with connection.execute_wrapper(profile):
+                yield from streaming_content
+        finally:
+            self.log_profile(request, response, profile, started)
+
+    def log_profile(self, request, response, profile, started):
+        connections_opened, connect_duration, started_at = started
+        duration = time.perf_counter() - started_at
+
+        resolver_match = request.resolver_match
+        view_name = resolver_match.view_name if resolver_match else None
+        budget = get_query_budget(resolver_match.func) if resolver_match else None
+        duplicates = profile.get_duplicates()
+
+        data = {
+            "view": view_name,
+            "method": request.method,
+            "status": response.status_code,
+            "streaming": response.streaming,
+            "queries": profile.count,
+            "query_budget": budget,
+            "duplicated_queries": sum(duplicates.values()) - len(duplicates),
+            "duplicates": [
+                {"sql": fingerprint, "count": count}
+                for fingerprint, count in list(duplicates.items())[: self.MAX_LOGGED_DUPLICATES]
+            ],
+            "db_ms": round(profile.duration * 1000, 2),
+            "db_connections": connection.connections_opened - connections_opened,
+            "db_connect_ms": round((connection.connect_duration - connect_duration) * 1000, 2),
+            "total_ms": round(duration * 1000, 2),
+        }
+        if budget is not None and profile.count > budget:
+            logger.warning("Query budget exceeded: %s", json.dumps(data))
+        else:
+            logger.info("Query profile: %s", json.dumps(data))
+        return data
@@ -0,0 +1,126 @@
+"""
+SQL queries profiling, see `itou.utils.profiling.middleware.QueryProfilingMiddleware`,
+and query plans.
+"""
+import json
+import re
+import time
+from collections import Counter
+
+from django.db import connection
+
+
+# `IN (%s, %s, …)` lists have as many placeholders as values.
+_IN_PLACEHOLDERS_RE = re.compile(r"\(%s(?:, %s)*\)")
+
+
+def query_budget(max_queries):
+    """
+    Declare the maximum number of SQL queries of a view, e.g.:
+
+        @login_required
+        @query_budget(15)
+        def my_view(request):
+            ...
+
+    Checked by `QueryProfilingMiddleware` (which logs a warning when it is exceeded)
+    and by `QueryBudgetAssertionsMixin.assertWithinQueryBudget()` in tests.
+    """
+
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+
+    return decorator
+
+
+def get_query_budget(view_func):
+    # Also works with views decorated after `query_budget`: `functools.wraps` copies the attribute.
+    return getattr(view_func, "query_budget", None)
+
+
+def get_fingerprint(sql):
+    """
+    Queries differing only by their parameters have the same fingerprint.
+    """
+    return _IN_PLACEHOLDERS_RE.sub("(…)", sql)
+
+
+class QueryProfile:
+    """
+    Records SQL queries and their duration, to be installed with
+    `connection.execute_wrapper()`.
+    """
+
+    def __init__(self):
+        self.queries = []  # List of (SQL, duration in seconds).
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started_at))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def get_duplicates(self):
+        """
+        Fingerprints of queries executed several times (a sign of N+1 queries)
+        with their number of executions, most executed first.
+        """
+        counter = Counter(get_fingerprint(sql) for sql, _ in self.queries)
+        return {fingerprint: count for fingerprint, count in counter.most_common() if count > 1}
+
+
+def get_query_plan(queryset):
+    """
+    Returns the plan chosen by PostgreSQL for `queryset`, as a dict (see `EXPLAIN (FORMAT JSON)`).
+
+    `QuerySet.explain(format="json")` is not used: it returns the repr of the decoded JSON.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def get_scan_nodes(plan, table):
+    """
+    Yields the nodes of `plan` scanning `table`.
+    """
+    if plan.get("Relation Name") == table:
+        yield plan
+    for subplan in plan.get("Plans", []):
+        yield from get_scan_nodes(subplan, table)
+
+
+def get_index_names(node):
+    """
+    Returns the names of the indexes used by a scan `node`, including the ones
+    of its `Bitmap Index Scan` subnodes.
+    """
+    names = {node["Index Name"]} if "Index Name" in node else set()
+    for subplan in node.get("Plans", []):
+        if "Relation Name" not in subplan:
+            names |= get_index_names(subplan)
+    return names
+
+
+def get_sort_nodes(plan):
+    """
+    Yields the nodes of `plan` sorting rows.
+    """
+    if plan["Node Type"] in ("Sort", "Incremental Sort"):
+        yield plan
+    for subplan in plan.get("Plans", []):
+        yield from get_sort_nodes(subplan)
@@ -0,0 +1,170 @@
+"""
+Huey queues.
+
+`settings.HUEY` configures the default queue (see `huey.contrib.djhuey`).
+
+Tasks which may be slow (calls to external APIs, email delivery with long retries…)
+or CPU-bound (exports…) are routed to named queues defined in `settings.HUEY_QUEUES`,
+so that they don't starve each other: each named queue has its own storage and its own
+consumer, started with:
+    django-admin run_huey_queue <name>
+
+The worker command, `django-admin run_huey_workers`, starts the consumers of the default
+queue and of all named queues.
+
+All queues record metrics of their tasks (timing, queue latency, errors, retries and
+database connections) in their storage, see `ItouHuey.get_metrics()` and the
+`huey_backlog` command.
+
+Workers keep their database connection between tasks (`CONN_MAX_AGE`), like web workers:
+each thread (or process) of a consumer holds at most one connection, so the number of
+connections is bounded by the number of workers of `settings.HUEY_QUEUES`.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from huey import RedisHuey, signals as S
+from huey.storage import RedisStorage
+
+
+# Signals ending the execution of a task
+_END_SIGNALS = (S.SIGNAL_COMPLETE, S.SIGNAL_ERROR, S.SIGNAL_LOCKED, S.SIGNAL_INTERRUPTED, S.SIGNAL_CANCELED)
+
+
+class ItouHuey(RedisHuey):
+    """
+    `RedisHuey` recording metrics of its tasks, by task name:
+    * executed: number of executions
+    * errors: number of executions which raised an exception
+    * retries: number of executions which were retried
+    * duration: total execution time (seconds)
+    * latency: total time spent in the queue (seconds), between (re)enqueueing and execution
+    * db_connections: number of database connections opened (persistent connections are reused)
+    * db_connect_duration: total time spent opening database connections (seconds)
+
+    Metrics are stored in a Redis hash, incremented atomically by all consumers.
+    They are kept in memory when Huey runs in immediate mode (storage is not Redis).
+    """
+
+    ENQUEUED_AT_KEY = "enqueued_at:{task_id}"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._started_at = {}
+        self._local_metrics = defaultdict(Counter)
+        self._local_metrics_lock = threading.Lock()
+        self.signal(S.SIGNAL_EXECUTING)(self._on_executing)
+        self.signal(*_END_SIGNALS)(self._on_executed)
+        self.signal(S.SIGNAL_RETRYING)(self._on_retrying)
+
+    @property
+    def metrics_key(self):
+        return f"huey.metrics.{self.name}"
+
+    def enqueue(self, task):
+        self.put(self.ENQUEUED_AT_KEY.format(task_id=task.id), time.time())
+        return super().enqueue(task)
+
+    def _incr_metrics(self, task, **increments):
+        if isinstance(self.storage, RedisStorage):
+            pipeline = self.storage.conn.pipeline()
+            for metric, amount in increments.items():
+                pipeline.hincrbyfloat(self.metrics_key, f"{task.name}:{metric}", amount)
+            pipeline.execute()
+        else:
+            with self._local_metrics_lock:
+                self._local_metrics[task.name].update(increments)
+
+    def _on_executing(self, signal, task):
+        # Signals are sent by the thread executing the task, `connection` is the one of the task.
+        self._started_at[task.id] = (time.perf_counter(), connection.connections_opened, connection.connect_duration)
+        enqueued_at = self.get(self.ENQUEUED_AT_KEY.format(task_id=task.id))
+        if enqueued_at:
+            self._incr_metrics(task, latency=max(time.time() - enqueued_at, 0))
+
+    def _on_executed(self, signal, task, *args):
+        started = self._started_at.pop(task.id, None)
+        if started is None:
+            return
+        started_at, connections_opened, connect_duration = started
+        increments = {
+            "executed": 1,
+            "duration": time.perf_counter() - started_at,
+            "db_connections": connection.connections_opened - connections_opened,
+            "db_connect_duration": connection.connect_duration - connect_duration,
+        }
+        if signal == S.SIGNAL_ERROR:
+            increments["errors"] = 1
+        self._incr_metrics(task, **increments)
+
+    def _on_retrying(self, signal, task):
+        self._incr_metrics(task, retries=1)
+
+    def get_metrics(self):
+        """
+        Returns a dict: {task name: {metric: value}}
+        """
+        if isinstance(self.storage, RedisStorage):
+            metrics = defaultdict(Counter)
+            for field, value in self.storage.conn.hgetall(self.metrics_key).items():
+                task_name, metric = field.decode().rsplit(":", 1)
+                metrics[task_name][metric] = float(value)
+        else:
+            with self._local_metrics_lock:
+                metrics = {task_name: Counter(values) for task_name, values in self._local_metrics.items()}
+        return {task_name: dict(values) for task_name, values in metrics.items()}
+
+    def reset_metrics(self):
+        if isinstance(self.storage, RedisStorage):
+            self.storage.conn.delete(self.metrics_key)
+        else:
+            with self._local_metrics_lock:
+                self._local_metrics.clear()
+
+
+def _create_queue(name):
+    return ItouHuey(f"{settings.HUEY['name']}-{name}", url=settings.HUEY["url"], immediate=settings.HUEY["immediate"])
+
+
+QUEUES = {name: _create_queue(name) for name in settings.HUEY_QUEUES}
+
+
+def get_queue(name):
+    return QUEUES[name]
+
+
+def task(queue_name, *args, **kwargs):
+    """
+    Same as `huey.contrib.djhuey.task` for the `queue_name` queue.
+    """
+    return get_queue(queue_name).task(*args, **kwargs)
+
+
+def db_task(queue_name, *args, **kwargs):
+    """
+    Same as `huey.contrib.djhuey.db_task` for the `queue_name` queue.
+    """
+    queue = get_queue(queue_name)
+
+    def decorator(fn):
+        @wraps(fn)
+        def inner(*fn_args, **fn_kwargs):
+            # Like at the start and at the end of requests: close connections that are
+            # unusable or older than `CONN_MAX_AGE`, and check the others before reusing them.
+            if not queue.immediate:
+                close_old_connections()
+            try:
+                return fn(*fn_args, **fn_kwargs)
+            finally:
+                if not queue.immediate:
+                    close_old_connections()
+
+        ret = queue.task(*args, **kwargs)(inner)
+        ret.call_local = fn
+        return ret
+
+    return decorator
@@ -0,0 +1,176 @@
+"""
+Process-wide cache of referentials: small tables which almost never change
+(administrative criteria, ASP communes…) but are read all the time.
+
+Each worker loads a referential once, with a single query, into compact and immutable
+structures: a tuple of rows (tuples of values) and dict indexes of these rows.
+Model instances are built on each lookup, callers can't alter the shared rows.
+
+Referentials are read through the managers of their models, see `ReferentialManagerMixin`.
+
+Their version is stored in the cache (see `itou.utils.cache`) and changed by writes
+(see the `signals` modules of apps), once committed: workers check it every
+`CHECK_INTERVAL` seconds and reload the referential if it changed. Writes which don't
+send signals (`QuerySet.update()`, `bulk_create()`, fixtures…) must call
+`Referential.invalidate()`, or be followed by a restart of workers (e.g. a deployment).
+
+When `settings.ITOU_REFERENTIALS_CACHE` is disabled (e.g. in tests), managers don't use
+referentials: lookups run their usual queries.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from itou.utils.cache import CacheNamespace
+
+
+# Referentials by model label.
+REFERENTIALS = {}
+_REFERENTIALS_LOCK = threading.Lock()
+
+
+class ReferentialData:
+    """
+    Rows of a referential, as loaded by a worker.
+    """
+
+    __slots__ = ("version", "checked_at", "attnames", "rows", "indexes", "groups")
+
+    def __init__(self, version, attnames, rows, indexes, groups):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.attnames = attnames
+        self.rows = rows
+        self.indexes = indexes
+        self.groups = groups
+
+
+class Referential:
+
+    CHECK_INTERVAL = 60  # in seconds.
+
+    def __init__(self, model, queryset, indexes=(), groups=()):
+        self.model = model
+        self.queryset = queryset
+        # Fields with unique values (the first row wins otherwise): `get()` looks rows up by them.
+        self.indexes = indexes
+        # Other fields: `filter()` looks rows up by them.
+        self.groups = groups
+        self.namespace = CacheNamespace(f"referential:{model._meta.label_lower}")
+        self._data = None
+
+    def __repr__(self):
+        return f"<Referential: {self.model._meta.label}>"
+
+    def load(self, version):
+        attnames = tuple(field.attname for field in self.model._meta.concrete_fields)
+        rows = tuple(self.queryset.values_list(*attnames))
+        positions = {attname: i for i, attname in enumerate(attnames)}
+        positions["pk"] = positions[self.model._meta.pk.attname]
+
+        indexes = {}
+        for field in self.indexes:
+            index = indexes[field] = {}
+            for row in rows:
+                index.setdefault(row[positions[field]], row)
+
+        groups = {}
+        for field in self.groups:
+            group = {}
+            for row in rows:
+                group.setdefault(row[positions[field]], []).append(row)
+            groups[field] = {value: tuple(group_rows) for value, group_rows in group.items()}
+
+        return ReferentialData(version, attnames, rows, indexes, groups)
+
+    def get_data(self):
+        data = self._data
+        if data is None or time.monotonic() - data.checked_at > self.CHECK_INTERVAL:
+            version = self.namespace.get_generation()
+            if data is None or data.version != version:
+                data = self._data = self.load(version)
+            data.checked_at = time.monotonic()
+        return data
+
+    def invalidate(self):
+        """
+        Reload the referential in all workers, once the current transaction is committed.
+        """
+
+        def invalidate():
+            self.namespace.invalidate()
+            self._data = None
+
+        transaction.on_commit(invalidate)
+
+    def _build(self, data, row):
+        return self.model.from_db(self.queryset.db, data.attnames, row)
+
+    def all(self):
+        data = self.get_data()
+        return [self._build(data, row) for row in data.rows]
+
+    def get(self, field, value):
+        data = self.get_data()
+        row = data.indexes[field].get(value)
+        return None if row is None else self._build(data, row)
+
+    def filter(self, field, value):
+        data = self.get_data()
+        return [self._build(data, row) for row in data.groups[field].get(value, ())]
+
+
+class ReferentialManagerMixin:
+    """
+    Mixin of managers of referential models, giving access to their `Referential`.
+
+    Lookups must check `uses_referential` and fall back to their usual queries when it's false:
+    related managers (e.g. `diagnosis.administrative_criteria`) inherit from the default
+    manager of the model but return a subset of rows, and referentials can be disabled.
+    """
+
+    # See `Referential`.
+    referential_indexes = ()
+    referential_groups = ()
+
+    def get_referential_queryset(self):
+        return self.get_queryset()
+
+    @property
+    def referential(self):
+        label = self.model._meta.label
+        with _REFERENTIALS_LOCK:
+            if label not in REFERENTIALS:
+                REFERENTIALS[label] = Referential(
+                    self.model,
+                    self.get_referential_queryset(),
+                    indexes=self.referential_indexes,
+                    groups=self.referential_groups,
+                )
+        return REFERENTIALS[label]
+
+    @property
+    def uses_referential(self):
+        # Related managers are bound to an instance.
+        return settings.ITOU_REFERENTIALS_CACHE and not hasattr(self, "instance")
+
+    def all_from_referential(self):
+        """
+        Returns a list of all the objects of the referential.
+        """
+        if not self.uses_referential:
+            return list(self.get_referential_queryset())
+        return self.referential.all()
+
+    @staticmethod
+    def with_referential_rows(queryset, instances):
+        """
+        Returns `queryset` as if it had been evaluated and returned `instances` (read from the
+        referential): iterating over it doesn't query the database, chaining it (`get()`,
+        `filter()`…) does, as usual.
+        """
+        queryset._result_cache = instances
+        queryset._prefetch_done = True
+        return queryset
@@ -1,32 +1,68 @@
 import datetime
+import io
+import json
+import os
+import signal
+import tempfile
 from collections import OrderedDict
 from unittest import mock
 
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
+from django.contrib.auth.decorators import login_required
 from django.contrib.gis.geos import GEOSGeometry
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.core import mail, management
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.mail.backends.locmem import EmailBackend as LocMemEmailBackend
 from django.core.mail.message import EmailMessage
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.http import StreamingHttpResponse
 from django.template import Context, Template
-from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 from factory import Faker
 
+from itou.asp.factories import CommuneFactory
+from itou.asp.models import Commune
+from itou.eligibility.factories import EligibilityDiagnosisFactory
+from itou.eligibility.models import AdministrativeCriteria
+from itou.job_applications.models import JobApplication, JobApplicationWorkflow
 from itou.prescribers.factories import PrescriberOrganizationWithMembershipFactory
 from itou.prescribers.models import PrescriberOrganization
 from itou.siaes.factories import SiaeFactory, SiaeWithMembershipFactory
 from itou.siaes.models import Siae, SiaeMembership
-from itou.users.factories import JobSeekerFactory, PrescriberFactory
+from itou.users.factories import DEFAULT_PASSWORD, JobSeekerFactory, PrescriberFactory
 from itou.users.models import User
 from itou.utils.address.departments import department_from_postcode
-from itou.utils.apis.api_entreprise import EtablissementAPI
+from itou.utils.apis.api_entreprise import ApiEntrepriseClient, EtablissementAPI, TokenBucket
 from itou.utils.apis.geocoding import process_geocoding_data
-from itou.utils.emails import sanitize_mailjet_recipients
-from itou.utils.mocks.api_entreprise import ETABLISSEMENT_API_RESULT_MOCK
+from itou.utils.cache import NAMESPACES, CacheNamespace
+from itou.utils.emails import (
+    AsyncEmailBackend,
+    _async_send_messages,
+    get_email_delivery_stats,
+    reset_email_delivery_stats,
+    sanitize_mailjet_recipients,
+)
+from itou.utils.mocks.api_entreprise import ETABLISSEMENT_API_RESULT_MOCK, ApiEntrepriseMockTransport
 from itou.utils.mocks.geocoding import BAN_GEOCODING_API_RESULT_MOCK
 from itou.utils.password_validation import CnilCompositionPasswordValidator
+from itou.utils.pdf import get_or_render_pdf, get_pdf_path, get_pdf_storage, get_rendering_key
 from itou.utils.perms.context_processors import get_current_organization_and_perms
+from itou.utils.perms.organization_context import OrganizationContext
+from itou.utils.perms.siae import get_current_siae_or_404
 from itou.utils.perms.user import KIND_JOB_SEEKER, KIND_PRESCRIBER, KIND_SIAE_STAFF, get_user_info
+from itou.utils.profiling.assertions import QueryBudgetAssertionsMixin
+from itou.utils.profiling.middleware import QueryProfilingMiddleware
+from itou.utils.profiling.queries import QueryProfile, get_fingerprint, get_query_budget, query_budget
+from itou.utils.queues import get_queue
+from itou.utils.referentials import REFERENTIALS, Referential
 from itou.utils.resume.forms import ResumeFormMixin
 from itou.utils.templatetags import dict_filters, format_filters
 from itou.utils.tokens import SIAE_SIGNUP_MAGIC_LINK_TIMEOUT, SiaeSignupTokenGenerator
@@ -187,6 +223,215 @@ class ContextProcessorsGetCurrentOrganizationAndPermsTest(TestCase):
             self.assertDictEqual(expected, result)
 
 
+class OrganizationContextTest(TestCase):
+    """Test `itou.utils.perms.organization_context.OrganizationContext`."""
+
+    def get_request(self, user, session=None):
+        request = RequestFactory().get("/")
+        request.user = user
+        request.session = session
+        if session is None:
+            SessionMiddleware().process_request(request)
+        return request
+
+    def test_session_reuse(self):
+        siae = SiaeWithMembershipFactory()
+        user = siae.members.first()
+
+        request = self.get_request(user)
+        request.session[settings.ITOU_SESSION_CURRENT_SIAE_KEY] = siae.pk
+        with self.assertNumQueries(1):
+            context = OrganizationContext.get(request)
+            self.assertEqual(context.siae_pks, [siae.pk])
+            self.assertEqual(context.current_siae, siae)
+            self.assertTrue(context.is_siae_admin)
+
+        # Next request: memberships come from the session.
+        request = self.get_request(user, session=request.session)
+        with self.assertNumQueries(0):
+            context = OrganizationContext.get(request)
+            self.assertEqual(context.siae_pks, [siae.pk])
+            self.assertTrue(context.is_siae_admin)
+        # Organizations are fetched once.
+        with self.assertNumQueries(1):
+            self.assertEqual(context.current_siae, siae)
+            self.assertEqual(context.siaes, [siae])
+
+    def test_shared_by_request(self):
+        siae = SiaeWithMembershipFactory()
+        user = siae.members.first()
+
+        request = self.get_request(user)
+        request.session[settings.ITOU_SESSION_CURRENT_SIAE_KEY] = siae.pk
+        with self.assertNumQueries(1):
+            current_siae = get_current_siae_or_404(request)
+            result = get_current_organization_and_perms(request)
+        self.assertIs(result["current_siae"], current_siae)
+
+    def test_invalidated_by_membership_changes(self):
+        siae = SiaeWithMembershipFactory()
+        user = siae.members.first()
+
+        request = self.get_request(user)
+        request.session[settings.ITOU_SESSION_CURRENT_SIAE_KEY] = siae.pk
+        self.assertTrue(OrganizationContext.get(request).is_siae_admin)
+
+        membership = user.siaemembership_set.get()
+        membership.is_siae_admin = False
+        membership.save()
+        request = self.get_request(user, session=request.session)
+        self.assertFalse(OrganizationContext.get(request).is_siae_admin)
+
+        other_siae = SiaeFactory()
+        other_siae.members.add(user)
+        request = self.get_request(user, session=request.session)
+        self.assertEqual(OrganizationContext.get(request).siae_pks, [siae.pk, other_siae.pk])
+
+        membership.delete()
+        request = self.get_request(user, session=request.session)
+        self.assertEqual(OrganizationContext.get(request).siae_pks, [other_siae.pk])
+
+    def test_invalidated_by_prescriber_membership_changes(self):
+        organization = PrescriberOrganizationWithMembershipFactory()
+        user = organization.members.first()
+
+        request = self.get_request(user)
+        self.assertEqual(OrganizationContext.get(request).prescriber_organization_pks, [organization.pk])
+
+        user.prescribermembership_set.update(is_active=False)
+        # Writes that don't send signals are only seen when the session copy expires.
+        request = self.get_request(user, session=request.session)
+        self.assertEqual(OrganizationContext.get(request).prescriber_organization_pks, [organization.pk])
+        OrganizationContext.invalidate([user.pk])
+        request = self.get_request(user, session=request.session)
+        self.assertEqual(OrganizationContext.get(request).prescriber_organization_pks, [])
+
+    def test_other_user_session(self):
+        siae = SiaeWithMembershipFactory()
+        user = siae.members.first()
+        request = self.get_request(user)
+        OrganizationContext.get(request)
+
+        other_user = PrescriberFactory()
+        request = self.get_request(other_user, session=request.session)
+        context = OrganizationContext.get(request)
+        self.assertEqual(context.siae_pks, [])
+        self.assertEqual(context.prescriber_organization_pks, [])
+
+
+class DatabaseWrapperTest(TestCase):
+    def test_persistent_connection(self):
+        # A connection of its own, outside of the transaction of the test case.
+        wrapper = connections.create_connection("default")
+        wrapper.settings_dict = {**wrapper.settings_dict, "CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": True}
+        self.addCleanup(wrapper.close)
+
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.assertEqual(1, wrapper.connections_opened)
+        self.assertGreater(wrapper.connect_duration, 0)
+
+        # End of a request: the connection is kept, and reused.
+        wrapper.close_if_unusable_or_obsolete()
+        self.assertIsNotNone(wrapper.connection)
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.assertEqual(1, wrapper.connections_opened)
+
+        # It's replaced if the server closed it meanwhile.
+        wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(wrapper, "is_usable", return_value=False) as is_usable:
+            with wrapper.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            with wrapper.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        # Checked once, before its first use.
+        is_usable.assert_called_once()
+        self.assertEqual(2, wrapper.connections_opened)
+
+
+class QueryProfilingTest(QueryBudgetAssertionsMixin, TestCase):
+    def test_query_profile(self):
+        profile = QueryProfile()
+        with connection.execute_wrapper(profile):
+            for siae_pks in [[1], [1, 2], [1, 2, 3]]:
+                list(Siae.objects.filter(pk__in=siae_pks))
+            User.objects.count()
+
+        self.assertEqual(profile.count, 4)
+        self.assertGreater(profile.duration, 0)
+        duplicates = profile.get_duplicates()
+        self.assertEqual(list(duplicates.values()), [3])
+        self.assertIn("IN (…)", list(duplicates)[0])
+
+    def test_get_fingerprint(self):
+        self.assertEqual(
+            get_fingerprint('SELECT "id" FROM "siaes_siae" WHERE "id" IN (%s, %s) AND "kind" = %s'),
+            'SELECT "id" FROM "siaes_siae" WHERE "id" IN (…) AND "kind" = %s',
+        )
+
+    def test_query_budget(self):
+        @login_required
+        @query_budget(3)
+        def view(request):
+            pass
+
+        self.assertEqual(get_query_budget(view), 3)
+
+    @override_settings(ITOU_QUERY_PROFILING=True)
+    def test_middleware(self):
+        user = JobSeekerFactory()
+        self.client.login(username=user.email, password=DEFAULT_PASSWORD)
+
+        # Logging is disabled in tests.
+        with mock.patch("itou.utils.profiling.middleware.logger") as logger:
+            response = self.client.get(reverse("dashboard:index"))
+        self.assertEqual(response.status_code, 200)
+        logger.warning.assert_not_called()
+        message, data = logger.info.call_args.args
+        self.assertIn('"view": "dashboard:index"', data)
+        self.assertIn('"query_budget": 20', data)
+        # The connection of the test case is reused.
+        self.assertIn('"db_connections": 0', data)
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="\d+ queries", db-connect;dur=[\d.]+;desc="\d+ connections", total;dur=[\d.]+$',
+        )
+
+    @override_settings(ITOU_QUERY_PROFILING=True)
+    def test_middleware_streaming_response(self):
+        def content():
+            yield "a"
+            # Executed while the content is consumed.
+            User.objects.count()
+            yield "b"
+
+        middleware = QueryProfilingMiddleware(lambda request: StreamingHttpResponse(content()))
+        with mock.patch("itou.utils.profiling.middleware.logger") as logger:
+            response = middleware(RequestFactory().get("/"))
+            logger.info.assert_not_called()
+            self.assertEqual(b"ab", b"".join(response.streaming_content))
+        message, data = logger.info.call_args.args
+        self.assertIn('"queries": 1', data)
+        self.assertIn('"streaming": true', data)
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_middleware_disabled(self):
+        response = self.client.get(reverse("home:hp"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_assert_within_query_budget(self):
+        siae = SiaeWithMembershipFactory()
+        user = siae.members.first()
+        self.client.login(username=user.email, password=DEFAULT_PASSWORD)
+        response = self.assertWithinQueryBudget(self.client.get, reverse("dashboard:index"))
+        self.assertEqual(response.status_code, 200)
+
+        with mock.patch("itou.www.dashboard.views.dashboard.query_budget", 1):
+            with self.assertRaisesRegex(AssertionError, "executed [0-9]+ queries, its budget is 1"):
+                self.assertWithinQueryBudget(self.client.get, reverse("dashboard:index"))
+
+
 class UtilsAddressMixinTest(TestCase):
     @mock.patch("itou.utils.apis.geocoding.call_ban_geocoding_api", return_value=BAN_GEOCODING_API_RESULT_MOCK)
     def test_set_coords(self, mock_call_ban_geocoding_api):
@@ -684,6 +929,53 @@ class ApiEntrepriseTest(SimpleTestCase):
         self.assertEqual(etablissement.city, "METZ")
         self.assertFalse(etablissement.is_closed)
 
+    @override_settings(API_ENTREPRISE_BASE_URL="https://entreprise.api.gouv.fr/v2")
+    def test_client(self):
+        cache.clear()
+        transport = ApiEntrepriseMockTransport()
+        client = ApiEntrepriseClient(transport=transport)
+
+        for _ in range(2):
+            data, error = client.get_etablissement("26570134200148", "Test")
+            self.assertEqual(ETABLISSEMENT_API_RESULT_MOCK, data)
+            self.assertIsNone(error)
+        # Unknown SIRETs are cached too.
+        for _ in range(2):
+            self.assertEqual((None, client.ERROR_UNKNOWN_SIRET), client.get_etablissement("12345678900000", "Test"))
+
+        self.assertEqual(2, len(transport.requests))
+        self.assertEqual("Test", transport.requests[0].url.params["object"])
+        metrics = client.get_metrics()
+        self.assertEqual(2, metrics["calls"])
+        self.assertEqual(0, metrics["errors"])
+        self.assertEqual(2, metrics["hits"])
+        self.assertEqual(2, metrics["misses"])
+
+    @override_settings(API_ENTREPRISE_BASE_URL="https://entreprise.api.gouv.fr/v2")
+    def test_client_errors(self):
+        cache.clear()
+        transport = ApiEntrepriseMockTransport(status_code=500)
+        client = ApiEntrepriseClient(transport=transport)
+
+        # Errors are not cached.
+        for _ in range(2):
+            self.assertEqual((None, client.ERROR_CONNECTION), client.get_etablissement("26570134200148", "Test"))
+        self.assertEqual(2, len(transport.requests))
+        self.assertEqual(2, client.get_metrics()["errors"])
+
+        # Rate limited.
+        client.rate_limiter = TokenBucket(rate=0.001, capacity=0)
+        self.assertEqual((None, client.ERROR_CONNECTION), client.get_etablissement("26570134200148", "Test"))
+        self.assertEqual(2, len(transport.requests))
+        self.assertEqual(1, client.get_metrics()["rate_limited"])
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=1000, capacity=1)
+        self.assertTrue(bucket.acquire())
+        self.assertFalse(bucket.acquire())
+        # A token is available after 1ms.
+        self.assertTrue(bucket.acquire(timeout=1))
+
 
 class UtilsEmailsSplitRecipientTest(TestCase):
     """
@@ -729,6 +1021,350 @@ class UtilsEmailsSplitRecipientTest(TestCase):
         self.assertEqual(25, len(result[1].to))
 
 
+@mock.patch("itou.utils.emails.ASYNC_EMAIL_BACKEND", "django.core.mail.backends.locmem.EmailBackend")
+class AsyncEmailBackendTest(TestCase):
+    def setUp(self):
+        reset_email_delivery_stats()
+        self.addCleanup(reset_email_delivery_stats)
+
+    def test_send_messages(self):
+        messages = [
+            EmailMessage(from_email="unit-test@tests.com", body="xxx", to=[f"{i}@tests.com"], subject=f"test {i}")
+            for i in range(3)
+        ]
+        with mock.patch.object(LocMemEmailBackend, "open") as open_connection:
+            AsyncEmailBackend().send_messages(messages)
+        # A single connection is used for all messages
+        open_connection.assert_called_once()
+
+        self.assertEqual(["test 0", "test 1", "test 2"], [message.subject for message in mail.outbox])
+        stats = get_email_delivery_stats()
+        self.assertEqual(3, stats["sent"])
+        self.assertEqual(0, stats["retried"])
+        self.assertEqual(0, stats["failed"])
+
+    def test_retry_failed_messages_only(self):
+        messages = [
+            EmailMessage(from_email="unit-test@tests.com", body="xxx", to=[f"{i}@tests.com"], subject=f"test {i}")
+            for i in range(3)
+        ]
+        send_messages = LocMemEmailBackend.send_messages
+
+        def fail_on_second_message(backend, messages):
+            if messages[0].subject == "test 1":
+                raise ConnectionError()
+            return send_messages(backend, messages)
+
+        with mock.patch.object(LocMemEmailBackend, "send_messages", fail_on_second_message), mock.patch.object(
+            _async_send_messages, "schedule"
+        ) as schedule:
+            AsyncEmailBackend().send_messages(messages)
+
+        self.assertEqual(["test 0", "test 2"], [message.subject for message in mail.outbox])
+        schedule.assert_called_once()
+        retried_messages, _retries_left = schedule.call_args.args[0]
+        self.assertEqual(["test 1"], [message["subject"] for message in retried_messages])
+        stats = get_email_delivery_stats()
+        self.assertEqual(2, stats["sent"])
+        self.assertEqual(1, stats["retried"])
+
+        # Last retry
+        with mock.patch.object(LocMemEmailBackend, "send_messages", fail_on_second_message), mock.patch.object(
+            _async_send_messages, "schedule"
+        ) as schedule:
+            _async_send_messages(retried_messages, retries_left=0)
+        schedule.assert_not_called()
+        self.assertEqual(1, get_email_delivery_stats()["failed"])
+
+
+class HueyQueuesTest(SimpleTestCase):
+    def test_task_routing(self):
+        from itou.external_data.tasks import huey_import_user_pe_data
+
+        self.assertIs(get_queue("emails"), _async_send_messages.huey)
+        self.assertIs(get_queue("external_data"), huey_import_user_pe_data.huey)
+
+    def test_metrics(self):
+        queue = get_queue("exports")
+        queue.reset_metrics()
+        self.addCleanup(queue.reset_metrics)
+
+        @queue.task(retries=1)
+        def failing_task():
+            raise ValueError()
+
+        @queue.task()
+        def task():
+            return 1
+
+        self.addCleanup(failing_task.unregister)
+        self.addCleanup(task.unregister)
+
+        task()
+        task()
+        failing_task()
+
+        metrics = queue.get_metrics()
+        self.assertEqual(2, metrics[task.name]["executed"])
+        self.assertNotIn("errors", metrics[task.name])
+        self.assertGreaterEqual(metrics[task.name]["duration"], 0)
+        self.assertGreaterEqual(metrics[task.name]["latency"], 0)
+        self.assertEqual(0, metrics[task.name]["db_connections"])
+        # Executed twice (one retry)
+        self.assertEqual(2, metrics[failing_task.name]["executed"])
+        self.assertEqual(2, metrics[failing_task.name]["errors"])
+        self.assertEqual(1, metrics[failing_task.name]["retries"])
+
+    @mock.patch("itou.utils.management.commands.run_huey_workers.Command.POLL_INTERVAL", 0)
+    @mock.patch("itou.utils.management.commands.run_huey_workers.subprocess.Popen")
+    def test_run_huey_workers(self, popen_mock):
+        class FakeProcess:
+            def __init__(self, command):
+                self.command = command
+                self.returncode = None
+                self.signals = []
+
+            def poll(self):
+                return self.returncode
+
+            def send_signal(self, signum):
+                self.signals.append(signum)
+                self.returncode = 0
+
+            def wait(self):
+                return self.returncode
+
+        processes = []
+
+        def popen(command):
+            process = FakeProcess(command)
+            processes.append(process)
+            # The consumer of the `emails` queue stops on its own.
+            if command[-1] == "emails":
+                process.returncode = 1
+            return process
+
+        popen_mock.side_effect = popen
+
+        with self.assertRaisesMessage(CommandError, "Consumer `run_huey_queue emails` stopped with code 1."):
+            management.call_command("run_huey_workers")
+
+        # One consumer for the default queue and one for each named queue.
+        self.assertEqual(
+            [["run_huey"]] + [["run_huey_queue", name] for name in settings.HUEY_QUEUES],
+            [process.command[3:] for process in processes],
+        )
+        # The other consumers are stopped.
+        for process in processes:
+            expected_signals = [] if process.command[-1] == "emails" else [signal.SIGTERM]
+            self.assertEqual(expected_signals, process.signals)
+
+
+class CacheNamespaceTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.namespace = CacheNamespace("tests")
+        self.addCleanup(NAMESPACES.pop, "tests")
+
+    def test_get_or_set(self):
+        compute = mock.Mock(return_value={"value": 1})
+        self.assertEqual({"value": 1}, self.namespace.get_or_set("key", compute))
+        self.assertEqual({"value": 1}, self.namespace.get_or_set("key", compute))
+        compute.assert_called_once()
+        self.assertEqual({"hits": 1, "misses": 1}, self.namespace.get_stats())
+
+        # `None` is cached too.
+        self.assertIsNone(self.namespace.get_or_set("none", lambda: None))
+        self.assertIsNone(self.namespace.get_or_set("none", compute))
+        compute.assert_called_once()
+
+        self.namespace.reset_stats()
+        self.assertEqual({"hits": 0, "misses": 0}, self.namespace.get_stats())
+
+    def test_invalidation(self):
+        self.namespace.set("a", 1)
+        self.namespace.set("b", 2)
+        self.namespace.delete("a")
+        self.assertIsNone(self.namespace.get("a"))
+        self.assertEqual(2, self.namespace.get("b"))
+
+        self.namespace.invalidate()
+        self.assertIsNone(self.namespace.get("b"))
+
+        # Other namespaces and versions don't share keys.
+        self.namespace.set("a", 1)
+        self.addCleanup(NAMESPACES.pop, "other")
+        self.assertIsNone(CacheNamespace("other").get("a"))
+        self.namespace.version = 2
+        self.assertIsNone(self.namespace.get("a"))
+
+        with self.assertRaises(ValueError):
+            CacheNamespace("tests")
+
+    def test_stampede_protection(self):
+        # Another process is computing the value.
+        cache.add(f"{self.namespace.make_key('key')}:lock", True)
+        compute = mock.Mock(return_value=2)
+
+        def sleep(seconds):
+            # Done meanwhile.
+            cache.set(self.namespace.make_key("key"), 1)
+
+        with mock.patch("itou.utils.cache.time.sleep", side_effect=sleep):
+            self.assertEqual(1, self.namespace.get_or_set("key", compute))
+        compute.assert_not_called()
+
+        # The other process doesn't finish in time.
+        cache.add(f"{self.namespace.make_key('other_key')}:lock", True)
+        with mock.patch("itou.utils.cache.time.monotonic", side_effect=[0, CacheNamespace.LOCK_TIMEOUT + 1]):
+            self.assertEqual(2, self.namespace.get_or_set("other_key", compute))
+        compute.assert_called_once()
+
+    def test_get_or_set_without_cache_server(self):
+        # The cache server is unavailable: django-redis ignores errors, `add()` returns `None`.
+        compute = mock.Mock(return_value=1)
+        with mock.patch("itou.utils.cache.cache.add", return_value=None), mock.patch(
+            "itou.utils.cache.time.sleep"
+        ) as sleep:
+            self.assertEqual(1, self.namespace.get_or_set("key", compute))
+        compute.assert_called_once()
+        sleep.assert_not_called()
+
+
+@override_settings(ITOU_REFERENTIALS_CACHE=True)
+class ReferentialTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.clear_referentials()
+        self.addCleanup(self.clear_referentials)
+
+    @staticmethod
+    def clear_referentials():
+        for referential in REFERENTIALS.values():
+            referential._data = None
+
+    def test_administrative_criteria(self):
+        level1 = list(AdministrativeCriteria.objects.filter(level=AdministrativeCriteria.Level.LEVEL_1))
+        level2 = list(AdministrativeCriteria.objects.filter(level=AdministrativeCriteria.Level.LEVEL_2))
+        with self.assertNumQueries(1):
+            self.assertEqual(level1, list(AdministrativeCriteria.objects.level1()))
+            self.assertEqual(level2, list(AdministrativeCriteria.objects.level2()))
+            criteria = AdministrativeCriteria.objects.all_from_referential()
+        self.assertEqual(list(AdministrativeCriteria.objects.all()), criteria)
+        # Instances are built on each lookup.
+        self.assertIsNot(criteria[0], AdministrativeCriteria.objects.referential.all()[0])
+
+        # Chained querysets query the database.
+        with self.assertNumQueries(1):
+            self.assertEqual(level1[0], AdministrativeCriteria.objects.level1().get(pk=level1[0].pk))
+
+        # Related managers don't use the referential.
+        diagnosis = EligibilityDiagnosisFactory()
+        diagnosis.administrative_criteria.add(level1[0])
+        self.assertEqual([level1[0]], list(diagnosis.administrative_criteria.level1()))
+        self.assertEqual([], list(diagnosis.administrative_criteria.level2()))
+
+    def test_commune_by_insee_code(self):
+        commune = CommuneFactory()
+        with self.assertNumQueries(1):
+            self.assertEqual(commune, Commune.objects.by_insee_code(commune.code))
+            self.assertEqual(commune.name, Commune.objects.by_insee_code(commune.code).name)
+            self.assertIsNone(Commune.objects.by_insee_code("00000"))
+
+    def test_invalidation(self):
+        referential = AdministrativeCriteria.objects.referential
+        criterion = referential.all()[0]
+
+        # Written by this worker: reloaded once committed.
+        with self.captureOnCommitCallbacks(execute=True):
+            criterion.name = "Nouveau nom"
+            criterion.save()
+        self.assertEqual("Nouveau nom", referential.all()[0].name)
+
+        # Written by another worker: reloaded after the next check of the version.
+        AdministrativeCriteria.objects.filter(pk=criterion.pk).update(name="Autre nom")
+        referential.namespace.invalidate()
+        with self.assertNumQueries(0):
+            self.assertEqual("Nouveau nom", referential.all()[0].name)
+        with mock.patch.object(Referential, "CHECK_INTERVAL", -1):
+            with self.assertNumQueries(1):
+                self.assertEqual("Autre nom", referential.all()[0].name)
+            # Not reloaded while the version doesn't change.
+            with self.assertNumQueries(0):
+                referential.all()
+
+    @override_settings(ITOU_REFERENTIALS_CACHE=False)
+    def test_disabled(self):
+        # Usual queries, referentials are not loaded.
+        with self.assertNumQueries(2):
+            AdministrativeCriteria.objects.all_from_referential()
+            self.assertEqual(
+                list(AdministrativeCriteria.objects.filter(level=AdministrativeCriteria.Level.LEVEL_1)),
+                list(AdministrativeCriteria.objects.level1()),
+            )
+        with CaptureQueriesContext(connection) as context:
+            self.assertIsNone(Commune.objects.by_insee_code("00000"))
+        self.assertEqual(1, len(context.captured_queries))
+        self.assertIn('"code" = ', context.captured_queries[0]["sql"])
+        self.assertIsNone(AdministrativeCriteria.objects.referential._data)
+        self.assertIsNone(Commune.objects.referential._data)
+
+
+class PdfStorageTest(SimpleTestCase):
+    def test_get_or_render_pdf(self):
+        storage = get_pdf_storage()
+        folder = "tests/get_or_render_pdf"
+        self.addCleanup(lambda: [storage.delete(f"{folder}/{name}") for name in storage.listdir(folder)[1]])
+
+        with get_or_render_pdf("<p>v1</p>", folder) as pdf:
+            self.assertTrue(pdf.read().startswith(b"%PDF-"))
+        self.assertTrue(storage.exists(get_pdf_path(folder, "<p>v1</p>")))
+
+        # Former versions are deleted
+        get_or_render_pdf("<p>v2</p>", folder).close()
+        self.assertEqual([get_pdf_path(folder, "<p>v2</p>").split("/")[-1]], storage.listdir(folder)[1])
+
+    def test_get_or_render_pdf_being_rendered(self):
+        storage = get_pdf_storage()
+        folder = "tests/get_or_render_pdf_being_rendered"
+        path = get_pdf_path(folder, "<p>v1</p>")
+        self.addCleanup(lambda: [storage.delete(f"{folder}/{name}") for name in storage.listdir(folder)[1]])
+        self.addCleanup(cache.delete, get_rendering_key(path))
+
+        # The task is enqueued once, until it's done.
+        with mock.patch("itou.utils.pdf.render_pdf") as render_pdf:
+            self.assertIsNone(get_or_render_pdf("<p>v1</p>", folder))
+            self.assertIsNone(get_or_render_pdf("<p>v1</p>", folder))
+        render_pdf.assert_called_once_with("<p>v1</p>", path)
+        self.assertTrue(cache.get(get_rendering_key(path)))
+
+        # The cache is unavailable (`add()` returns `None`): the task is enqueued anyway.
+        with mock.patch("itou.utils.pdf.cache.add", return_value=None):
+            get_or_render_pdf("<p>v1</p>", folder).close()
+        self.assertTrue(storage.exists(path))
+        # Removed by the task.
+        self.assertIsNone(cache.get(get_rendering_key(path)))
+
+        # Deleted by the rendering of a newer version after the `exists()` check.
+        with mock.patch.object(storage, "open", side_effect=FileNotFoundError):
+            self.assertIsNone(get_or_render_pdf("<p>v1</p>", folder))
+
+    def test_delete_old_pdfs(self):
+        storage = get_pdf_storage()
+        self.addCleanup(lambda: [storage.delete(f"tests/delete_old_pdfs/{name}") for name in ["old", "new"]])
+        for name in ["old", "new"]:
+            storage.save(f"tests/delete_old_pdfs/{name}", ContentFile(b"%PDF-"))
+        modified_at = (timezone.now() - datetime.timedelta(days=settings.PDF_RETENTION_DAYS + 1)).timestamp()
+        os.utime(storage.path("tests/delete_old_pdfs/old"), (modified_at, modified_at))
+
+        management.call_command("delete_old_pdfs", "--dry-run", stdout=io.StringIO())
+        self.assertTrue(storage.exists("tests/delete_old_pdfs/old"))
+
+        management.call_command("delete_old_pdfs", stdout=io.StringIO())
+        self.assertFalse(storage.exists("tests/delete_old_pdfs/old"))
+        self.assertTrue(storage.exists("tests/delete_old_pdfs/new"))
+
+
 class ResumeFormMixinTest(TestCase):
     def test_pole_emploi_internal_resume_link(self):
         resume_link = "http://ds000-xxxx-00xx000.xxx00.pole-emploi.intra/docnums/portfolio-usager/XXXXXXXXXXX/CV.pdf?Expires=1590485264&Signature=XXXXXXXXXXXXXXXX"  # noqa E501
@@ -741,3 +1377,54 @@ class ResumeFormMixinTest(TestCase):
         form = ResumeFormMixin(data={"resume_link": resume_link})
         self.assertTrue(form.is_valid())
         self.assertFalse(form.has_error("resume_link"))
+
+
+@override_settings(ITOU_ENVIRONMENT="DEV", ALLOWED_HOSTS=["localhost"])
+class LargeDatasetAndBenchmarksTest(TestCase):
+    def test_generate_large_dataset(self):
+        management.call_command("generate_large_dataset", scale=0.001, seed=1, stdout=io.StringIO())
+
+        self.assertEqual(5, Siae.objects.count())
+        self.assertEqual(10, SiaeMembership.objects.count())
+        self.assertEqual(2, PrescriberOrganization.objects.count())
+        self.assertEqual(100, User.objects.filter(is_job_seeker=True).count())
+        self.assertEqual(500, JobApplication.objects.count())
+        # Generated users can log in.
+        self.assertTrue(User.objects.filter(is_job_seeker=True).first().check_password(DEFAULT_PASSWORD))
+
+        # Logs and denormalized fields are consistent.
+        for job_application in JobApplication.objects.exclude(state=JobApplicationWorkflow.STATE_NEW)[:50]:
+            last_log = job_application.logs.order_by("timestamp").last()
+            self.assertEqual(job_application.state, last_log.to_state)
+            self.assertEqual(job_application.last_change_at, last_log.timestamp)
+        for job_application in JobApplication.objects.filter(state=JobApplicationWorkflow.STATE_ACCEPTED):
+            self.assertEqual(job_application.job_seeker, job_application.approval.user)
+
+    @override_settings(ITOU_ENVIRONMENT="PROD")
+    def test_generate_large_dataset_in_production(self):
+        with self.assertRaises(CommandError):
+            management.call_command("generate_large_dataset", scale=0.001, stdout=io.StringIO())
+        self.assertFalse(Siae.objects.exists())
+
+    def test_run_benchmarks(self):
+        management.call_command("generate_large_dataset", scale=0.001, stdout=io.StringIO())
+
+        with tempfile.NamedTemporaryFile(mode="r", suffix=".json") as output:
+            stdout = io.StringIO()
+            management.call_command(
+                "run_benchmarks", only=["list_for_siae", "dashboard"], repeat=1, output=output.name, stdout=stdout
+            )
+            data = json.load(output)
+
+            self.assertEqual(["list_for_siae", "dashboard"], list(data["results"]))
+            self.assertEqual(500, data["dataset"]["job_applications"])
+            self.assertGreater(data["results"]["list_for_siae"]["queries"], 0)
+
+            # Comparison with a previous run.
+            management.call_command(
+                "run_benchmarks", only=["list_for_siae"], repeat=1, compare=output.name, stdout=stdout
+            )
+            self.assertIn("Compared with", stdout.getvalue())
+
+        with self.assertRaises(CommandError):
+            management.call_command("run_benchmarks", only=["unknown"], stdout=io.StringIO())
@@ -12,6 +12,7 @@ from itou.prescribers.factories import (
 )
 from itou.siaes.factories import SiaeWithMembershipAndJobsFactory
 from itou.users.factories import DEFAULT_PASSWORD
+from itou.utils.profiling.assertions import QueryBudgetAssertionsMixin
 from itou.utils.widgets import DatePickerField
 
 
@@ -132,7 +133,7 @@ class ProcessListJobSeekerTest(ProcessListTest):
 ###################################################
 
 
-class ProcessListSiaeTest(ProcessListTest):
+class ProcessListSiaeTest(QueryBudgetAssertionsMixin, ProcessListTest):
     def test_list_for_siae_view(self):
         """
         Eddie wants to see a list of job applications sent to his SIAE.
@@ -145,6 +146,10 @@ class ProcessListSiaeTest(ProcessListTest):
         # Result page should contain all SIAE's job applications.
         self.assertEqual(total_applications, self.hit_pit.job_applications_received.count())
 
+    def test_list_for_siae_view_query_budget(self):
+        self.client.login(username=self.eddie_hit_pit.email, password=DEFAULT_PASSWORD)
+        self.assertWithinQueryBudget(self.client.get, self.siae_base_url)
+
     def test_list_for_siae_view__filtered_by_one_state(self):
         """
         Eddie wants to see only accepted job applications.
@@ -289,7 +294,7 @@ class ProcessListSiaeTest(ProcessListTest):
 ####################################################
 
 
-class ProcessListPrescriberTest(ProcessListTest):
+class ProcessListPrescriberTest(QueryBudgetAssertionsMixin, ProcessListTest):
     def test_list_for_prescriber_view(self):
         """
         Connect as Thibault to see a list of job applications
@@ -303,6 +308,10 @@ class ProcessListPrescriberTest(ProcessListTest):
 
         self.assertEqual(total_applications, self.pole_emploi.jobapplication_set.count())
 
+    def test_list_for_prescriber_view_query_budget(self):
+        self.client.login(username=self.thibault_pe.email, password=DEFAULT_PASSWORD)
+        self.assertWithinQueryBudget(self.client.get, self.prescriber_base_url)
+
     def test_list_for_prescriber_exports_view(self):
         """
         Connect as Thibault to see a list of available job applications exports
@@ -289,7 +289,8 @@ class ProcessViewsTest(TestCase):
             "hiring_end_at": hiring_end_at.strftime("%d/%m/%Y"),
             **base_for_post_data,
         }
-        response = self.client.post(url_accept, data=post_data)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url_accept, data=post_data)
         self.assertEqual(response.status_code, 302)
 
         # First job application has been accepted.
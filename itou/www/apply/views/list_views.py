@@ -1,14 +1,15 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db.models import Q
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from django.utils.text import slugify
 
-from itou.job_applications.csv_export import generate_csv_export
+from itou.job_applications.csv_export import stream_csv_export
 from itou.job_applications.models import JobApplication
 from itou.utils.pagination import pager
 from itou.utils.perms.prescriber import get_current_org_or_404
 from itou.utils.perms.siae import get_current_siae_or_404
+from itou.utils.profiling.queries import query_budget
 from itou.www.apply.forms import (
     FilterJobApplicationsForm,
     PrescriberFilterJobApplicationsForm,
@@ -18,6 +19,7 @@ from itou.www.apply.forms import (
 
 @login_required
 @user_passes_test(lambda u: u.is_job_seeker, login_url="/", redirect_field_name=None)
+@query_budget(25)
 def list_for_job_seeker(request, template_name="apply/list_for_job_seeker.html"):
     """
     List of applications for a job seeker.
@@ -39,6 +41,7 @@ def list_for_job_seeker(request, template_name="apply/list_for_job_seeker.html")
 
 @login_required
 @user_passes_test(lambda u: u.is_prescriber, login_url="/", redirect_field_name=None)
+@query_budget(25)
 def list_for_prescriber(request, template_name="apply/list_for_prescriber.html"):
     """
     List of applications for a prescriber.
@@ -115,19 +118,19 @@ def list_for_prescriber_exports_download(request, month_identifier):
         job_applications = request.user.job_applications_sent
 
     year, month = month_identifier.split("-")
-    job_applications = job_applications.created_on_given_year_and_month(year, month).with_list_related_data()
+    job_applications = job_applications.created_on_given_year_and_month(year, month)
 
     filename = f"candidatures-{month_identifier}.csv"
 
-    response = HttpResponse(content_type="text/csv", charset="utf-8")
+    # Stream the export: rows are generated by batches while being sent to the client.
+    response = StreamingHttpResponse(stream_csv_export(job_applications), content_type="text/csv", charset="utf-8")
     response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
 
-    generate_csv_export(job_applications, response)
-
     return response
 
 
 @login_required
+@query_budget(25)
 def list_for_siae(request, template_name="apply/list_for_siae.html"):
     """
     List of applications for an SIAE.
@@ -179,12 +182,11 @@ def list_for_siae_exports_download(request, month_identifier):
     year, month = month_identifier.split("-")
     siae = get_current_siae_or_404(request)
     job_applications = siae.job_applications_received
-    job_applications = job_applications.created_on_given_year_and_month(year, month).with_list_related_data()
+    job_applications = job_applications.created_on_given_year_and_month(year, month)
     filename = f"candidatures-{slugify(siae.display_name)}-{month_identifier}.csv"
 
-    response = HttpResponse(content_type="text/csv", charset="utf-8")
+    # Stream the export: rows are generated by batches while being sent to the client.
+    response = StreamingHttpResponse(stream_csv_export(job_applications), content_type="text/csv", charset="utf-8")
     response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
 
-    generate_csv_export(job_applications, response)
-
     return response
@@ -9,6 +9,7 @@ from django.utils.http import urlencode
 
 from itou.approvals.models import Approval
 from itou.eligibility.models import EligibilityDiagnosis
+from itou.eligibility.snapshot import JobSeekerEligibilitySnapshot
 from itou.job_applications.notifications import (
     NewQualifiedJobAppEmployersNotification,
     NewSpontaneousJobAppEmployersNotification,
@@ -38,9 +39,12 @@ def get_approvals_wrapper(request, job_seeker):
     Returns an `ApprovalsWrapper` if possible or stop
     the job application submit process.
     This works only when the `job_seeker` is known.
+
+    The wrapper comes from a snapshot shared by all the steps of the process
+    to avoid computing it again at each step.
     """
     user_info = get_user_info(request)
-    approvals_wrapper = job_seeker.approvals_wrapper
+    approvals_wrapper = JobSeekerEligibilitySnapshot.get(job_seeker).approvals_wrapper
 
     # Ensure that an existing approval is not in waiting period.
     # Only "authorized prescribers" can bypass an approval in waiting period.
@@ -298,7 +302,7 @@ def step_eligibility(request, siae_pk, template_name="apply/submit_step_eligibil
         # Only "authorized prescribers" can perform an eligibility diagnosis.
         not user_info.is_authorized_prescriber
         # Eligibility diagnosis already performed.
-        or EligibilityDiagnosis.objects.has_considered_valid(job_seeker)
+        or JobSeekerEligibilitySnapshot.get(job_seeker).has_considered_valid_diagnosis
     )
 
     if skip:
@@ -15,6 +15,7 @@ from itou.job_applications.factories import JobApplicationFactory, JobApplicatio
 from itou.job_applications.models import JobApplication, JobApplicationWorkflow
 from itou.prescribers.factories import AuthorizedPrescriberOrganizationWithMembershipFactory
 from itou.users.factories import DEFAULT_PASSWORD
+from itou.utils.pdf import LocalRenderer
 from itou.www.approvals_views.forms import DeclareProlongationForm
 
 from .pdfshift_mock import BITES_FILE
@@ -77,6 +78,67 @@ class TestDownloadApprovalAsPDF(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("pdf", response.get("Content-Type"))
 
+    def test_pdf_is_rendered_once_per_approval_version(self, *args, **kwargs):
+        job_application = JobApplicationWithApprovalFactory()
+        siae_member = job_application.to_siae.members.first()
+        EligibilityDiagnosisFactory(job_seeker=job_application.job_seeker)
+        url = reverse("approvals:approval_as_pdf", kwargs={"job_application_id": job_application.pk})
+
+        self.client.login(username=siae_member.email, password=DEFAULT_PASSWORD)
+
+        with patch.object(LocalRenderer, "render", autospec=True, side_effect=LocalRenderer.render) as render:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            first_content = b"".join(response.streaming_content)
+
+            # Served from the storage.
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(first_content, b"".join(response.streaming_content))
+            self.assertEqual(render.call_count, 1)
+
+            # The approval has changed: the document is rendered again.
+            approval = job_application.approval
+            approval.end_at = approval.end_at - relativedelta(days=1)
+            approval.save()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(first_content, b"".join(response.streaming_content))
+            self.assertEqual(render.call_count, 2)
+
+    def test_pdf_is_rendered_per_job_application(self, *args, **kwargs):
+        # Two SIAEs hired the same job seeker with the same approval.
+        job_application = JobApplicationWithApprovalFactory()
+        other_job_application = JobApplicationWithApprovalFactory(
+            job_seeker=job_application.job_seeker, approval=job_application.approval
+        )
+        EligibilityDiagnosisFactory(job_seeker=job_application.job_seeker)
+
+        with patch.object(LocalRenderer, "render", autospec=True, side_effect=LocalRenderer.render) as render:
+            for _ in range(2):
+                for job_app in [job_application, other_job_application]:
+                    siae_member = job_app.to_siae.members.first()
+                    self.client.login(username=siae_member.email, password=DEFAULT_PASSWORD)
+                    url = reverse("approvals:approval_as_pdf", kwargs={"job_application_id": job_app.pk})
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    b"".join(response.streaming_content)
+            # Each document is rendered once, and not deleted by the rendering of the other one.
+            self.assertEqual(render.call_count, 2)
+
+    @patch("itou.www.approvals_views.views.get_or_render_pdf", return_value=None)
+    def test_pdf_rendering_in_progress(self, *args, **kwargs):
+        job_application = JobApplicationWithApprovalFactory()
+        siae_member = job_application.to_siae.members.first()
+        EligibilityDiagnosisFactory(job_seeker=job_application.job_seeker)
+
+        self.client.login(username=siae_member.email, password=DEFAULT_PASSWORD)
+        response = self.client.get(
+            reverse("approvals:approval_as_pdf", kwargs={"job_application_id": job_application.pk})
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertContains(response, "en cours de génération", status_code=202)
+
     @patch("itou.approvals.models.CommonApprovalMixin.originates_from_itou", True)
     def test_no_download_if_missing_diagnosis(self, *args, **kwargs):
         job_application = JobApplicationWithApprovalFactory()
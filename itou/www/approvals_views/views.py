@@ -11,7 +11,7 @@ from django.utils.text import slugify
 from itou.approvals.models import Approval, Suspension
 from itou.eligibility.models import EligibilityDiagnosis
 from itou.job_applications.models import JobApplication
-from itou.utils.pdf import HtmlToPdf
+from itou.utils.pdf import get_or_render_pdf
 from itou.utils.perms.siae import get_current_siae_or_404
 from itou.utils.urls import get_safe_url
 from itou.www.approvals_views.forms import DeclareProlongationForm, SuspensionForm
@@ -63,7 +63,8 @@ def approval_as_pdf(request, job_application_id, template_name="approvals/approv
             diagnosis_author_org_name = diagnosis_author_org.display_name
 
     # The PDFShift API can load styles only if it has the full URL.
-    base_url = request.build_absolute_uri("/")[:-1]
+    # Don't use the host of the request: the document would change with it.
+    base_url = f"{settings.ITOU_PROTOCOL}://{settings.ITOU_FQDN}"
 
     if settings.DEBUG:
         # Use staging or production styles when working locally
@@ -85,8 +86,15 @@ def approval_as_pdf(request, job_application_id, template_name="approvals/approv
     full_name_slug = slugify(job_application.job_seeker.get_full_name())
     filename = f"{full_name_slug}-pass-iae.pdf"
 
-    with HtmlToPdf(html, autoclose=False) as transformer:
-        return FileResponse(transformer.file, as_attachment=True, filename=filename)
+    # The document is rendered once per content (i.e. until the approval changes).
+    # It also depends on the SIAE and on the diagnosis: an approval can have several
+    # documents, one per job application.
+    pdf = get_or_render_pdf(html, folder=f"approvals/{approval.number}/{job_application.pk}")
+    if not pdf:
+        # Still being rendered, the page reloads itself.
+        return render(request, "approvals/approval_as_pdf_pending.html", status=202)
+
+    return FileResponse(pdf, as_attachment=True, filename=filename)
 
 
 @login_required
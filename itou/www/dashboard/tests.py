@@ -7,6 +7,7 @@ from itou.job_applications.factories import (
     JobApplicationSentByAuthorizedPrescriberOrganizationFactory,
     JobApplicationSentByPrescriberFactory,
 )
+from itou.job_applications.models import JobApplicationWorkflow
 from itou.job_applications.notifications import (
     NewQualifiedJobAppEmployersNotification,
     NewSpontaneousJobAppEmployersNotification,
@@ -34,6 +35,18 @@ class DashboardViewTest(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
+    def test_dashboard_job_applications_counters(self):
+        siae = SiaeWithMembershipFactory()
+        user = siae.members.first()
+        JobApplicationSentByPrescriberFactory.create_batch(2, to_siae=siae)
+        JobApplicationSentByPrescriberFactory(to_siae=siae, state=JobApplicationWorkflow.STATE_PROCESSING)
+        JobApplicationSentByPrescriberFactory(to_siae=siae, state=JobApplicationWorkflow.STATE_REFUSED)
+        self.client.login(username=user.email, password=DEFAULT_PASSWORD)
+
+        response = self.client.get(reverse("dashboard:index"))
+        counters = [category["counter"] for category in response.context["job_applications_categories"]]
+        self.assertEqual(counters, [3, 0, 1])
+
     def test_user_with_inactive_siae_can_still_login_during_grace_period(self):
         siae = SiaePendingGracePeriodFactory()
         user = SiaeStaffFactory()
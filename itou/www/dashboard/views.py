@@ -14,12 +14,14 @@ from itou.job_applications.models import JobApplication, JobApplicationWorkflow
 from itou.prescribers.models import PrescriberOrganization
 from itou.siaes.models import Siae
 from itou.utils.perms.siae import get_current_siae_or_404
+from itou.utils.profiling.queries import query_budget
 from itou.utils.tokens import resume_signer
 from itou.utils.urls import get_safe_url
 from itou.www.dashboard.forms import EditNewJobAppEmployersNotificationForm, EditUserEmailForm, EditUserInfoForm
 
 
 @login_required
+@query_budget(20)
 def dashboard(request, template_name="dashboard/dashboard.html"):
     can_show_financial_annexes = False
     job_applications_categories = []
@@ -51,9 +53,9 @@ def dashboard(request, template_name="dashboard/dashboard.html"):
                 "badge": "badge-secondary",
             },
         ]
-        job_applications = siae.job_applications_received.values("state").all()
+        counts_by_state = siae.job_applications_received.count_by_state()
         for category in job_applications_categories:
-            category["counter"] = len([ja for ja in job_applications if ja["state"] in category["states"]])
+            category["counter"] = sum(counts_by_state.get(state, 0) for state in category["states"])
             category[
                 "url"
             ] = f"{reverse('apply:list_for_siae')}?{'&'.join([f'states={c}' for c in category['states']])}"
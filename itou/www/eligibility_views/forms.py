@@ -52,7 +52,7 @@ class AdministrativeCriteriaForm(forms.Form):
         self.siae = siae
         super().__init__(**kwargs)
 
-        for criterion in AdministrativeCriteria.objects.all():
+        for criterion in AdministrativeCriteria.objects.all_from_referential():
 
             if criterion.level == AdministrativeCriteria.Level.LEVEL_1:
                 prefix = self.LEVEL_1_PREFIX